@@ -0,0 +1,140 @@
+import argparse
+import logging
+from switches.cache_algorithm import CacheAlgorithm
+from switches.lookup_engine import LookupEngine
+from benchmarks.cache_benchmark import ESTIMATORS, run_suite, write_results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the cache algorithms and lookup engines.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000],
+                        help="rule table sizes to benchmark")
+    parser.add_argument("--algorithms", nargs="+",
+                        default=[a.name for a in CacheAlgorithm if a != CacheAlgorithm.OPTIMAL],
+                        choices=[a.name for a in CacheAlgorithm])
+    parser.add_argument("--engines", nargs="+", default=[e.name for e in LookupEngine],
+                        choices=[e.name for e in LookupEngine])
+    parser.add_argument("--packets", type=int, default=20000,
+                        help="number of packets sent per run")
+    parser.add_argument("--cache-fraction", type=float, default=0.1,
+                        help="hardware cache size as a fraction of the table")
+    parser.add_argument("--chain-depth", type=int, default=3,
+                        help="depth of the overlapping rule chains")
+    parser.add_argument("--zipf", type=float, default=1.0,
+                        help="Zipf exponent of the flow popularity")
+    parser.add_argument("--refresh-interval", type=int, default=1000,
+                        help="packets between cache refreshes")
+    parser.add_argument("--estimators", nargs="*", default=[], choices=list(ESTIMATORS),
+                        help="popularity estimators to benchmark against a traffic shift")
+    parser.add_argument("--gap", action="store_true",
+                        help="compare the greedy algorithms with the optimal selection")
+    parser.add_argument("--compress", action="store_true",
+                        help="also run the cache algorithms on the compressed rule table")
+    parser.add_argument("--snapshot", action="store_true",
+                        help="compare warm starting from a snapshot with a cold start")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark_results.json",
+                        help="file the JSON results are written to")
+    return parser.parse_args()
+
+
+def main():
+    logging.basicConfig(level=logging.ERROR)
+    args = parse_args()
+
+    results = run_suite(
+        sizes=args.sizes,
+        algorithms=[CacheAlgorithm[name] for name in args.algorithms],
+        engines=[LookupEngine[name] for name in args.engines],
+        num_packets=args.packets,
+        cache_fraction=args.cache_fraction,
+        chain_depth=args.chain_depth,
+        zipf_exponent=args.zipf,
+        refresh_interval=args.refresh_interval,
+        seed=args.seed,
+        estimators=args.estimators,
+        gap=args.gap,
+        compress=args.compress,
+        snapshot=args.snapshot)
+
+    print()
+    print("Cache algorithms")
+    for result in results["cache"]:
+        print(f"  {result['num_rules']:>7} rules  {result['algorithm']:<20} "
+              f"hit rate {result['hit_rate']:.3f}  "
+              f"{result['packets_per_sec']:>10.0f} pkt/s  "
+              f"p50 {result['latency_p50_us']:.1f}us  "
+              f"p99 {result['latency_p99_us']:.1f}us  "
+              f"refresh {result['refresh_mean_ms']:.1f}ms  "
+              f"load {result['load_time_s']:.2f}s")
+
+    print()
+    print("Dependency graph memory")
+    for result in results["memory"]:
+        print(f"  {result['num_rules']:>7} rules  {result['all_dependencies']} dependencies  "
+              f"bitsets {result['closure_bytes'] / 1024:.1f}KiB  "
+              f"sets {result['closure_set_bytes'] / 1024:.1f}KiB  "
+              f"built in {result['build_time_s']:.2f}s, "
+              f"{result['bulk_build_time_s']:.2f}s in bulk")
+
+    print()
+    print("Lookup engines")
+    for result in results["lookup"]:
+        print(f"  {result['num_rules']:>7} rules  {result['lookup_engine']:<8} "
+              f"{result['packets_per_sec']:>10.0f} pkt/s  "
+              f"batched {result['batch_packets_per_sec']:>10.0f} pkt/s")
+
+    if len(results["shift"]) > 0:
+        print()
+        print("Traffic shift recovery")
+        for result in results["shift"]:
+            recovery = result["recovery_packets"]
+            print(f"  {result['num_rules']:>7} rules  {result['estimator']:<12} "
+                  f"hit rate {result['hit_rate_before']:.3f} -> {result['hit_rate_after']:.3f} "
+                  f"(reference {result['hit_rate_reference']:.3f})  "
+                  f"recovered after {'never' if recovery is None else recovery} packets")
+
+    if len(results["gap"]) > 0:
+        print()
+        print("Gap to the optimal selection")
+        for result in results["gap"]:
+            proven = "" if result["proven_optimal"] else " (search limit reached)"
+            print(f"  {result['num_rules']:>7} rules  {result['nodes']} nodes "
+                  f"in {result['time_s']:.2f}s{proven}")
+            for algorithm, stats in result["algorithms"].items():
+                print(f"      {algorithm:<20} hit rate {stats['hit_rate']:.3f}  "
+                      f"gap {stats['gap']:.3f}")
+
+    if len(results["compression"]) > 0:
+        print()
+        print("Rule compression")
+        for result in results["compression"]:
+            compression = result["compression"]
+            print(f"  {result['num_rules']:>7} rules  {result['algorithm']:<20} "
+                  f"{compression['compressed']} compressed rules "
+                  f"(ratio {compression['ratio']:.2f}, {compression['shadowed']} shadowed, "
+                  f"{compression['redundant']} redundant, {compression['merged']} merged)  "
+                  f"hit rate {result['hit_rate']:.3f}  "
+                  f"refresh {result['refresh_mean_ms']:.1f}ms")
+
+    if len(results["snapshot"]) > 0:
+        print()
+        print("Warm start from a snapshot")
+        for result in results["snapshot"]:
+            print(f"  {result['num_rules']:>7} rules  {result['algorithm']:<20} "
+                  f"{result['snapshot_bytes'] / 1024:.1f}KiB  "
+                  f"loaded in {1000 * result['warm_load_time_s']:.1f}ms "
+                  f"(cold {1000 * result['cold_load_time_s']:.1f}ms)  "
+                  f"first hit rate {result['warm_first_hit_rate']:.3f} "
+                  f"(cold {result['cold_first_hit_rate']:.3f})  "
+                  f"hit rate {result['warm_hit_rate']:.3f} "
+                  f"(cold {result['cold_hit_rate']:.3f})")
+
+    write_results(results, args.output)
+    print()
+    print("Results written to " + args.output)
+
+
+if __name__ == "__main__":
+    main()
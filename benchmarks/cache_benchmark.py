@@ -0,0 +1,397 @@
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from sortedcontainers import SortedKeyList
+from rules.rule import Rule
+from switches.basic_switch import BasicSwitch
+from switches.cache_switch import CacheSwitch
+from switches.cache_switch_config import CacheSwitchConfig
+from switches.cache_algorithm import CacheAlgorithm
+from switches.dependency_graph import DependencyGraph, bit_positions
+from switches.lookup_engine import LookupEngine
+from switches.metrics import SwitchMetrics, Histogram
+from switches.refresh_scheduler import PacketCountScheduler
+from switches.popularity import CumulativeEstimator, DecayEstimator, \
+    SlidingWindowEstimator, CountMinSketchEstimator
+from benchmarks.rule_generator import generate_rule_table
+from benchmarks.traffic_generator import zipf_traffic
+
+
+# popularity estimators by the name they are benchmarked under
+ESTIMATORS = {
+    "cumulative": CumulativeEstimator,
+    "decay": DecayEstimator,
+    "window": SlidingWindowEstimator,
+    "sketch": CountMinSketchEstimator,
+}
+
+
+def percentile(values: list, fraction: float) -> float:
+    """Get the given percentile of a list of values by nearest rank."""
+    if len(values) == 0:
+        return 0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _reset_counters(rules: list):
+    for rule in rules:
+        rule.counter = 0
+
+
+def run_cache_benchmark(algorithm: CacheAlgorithm, rules: list, traffic: list, cache_size: int,
+                        refresh_interval: int = 1000,
+                        lookup_engine: LookupEngine = LookupEngine.LINEAR,
+                        compress_rules: bool = False) -> dict:
+    """
+    Send the traffic through a cache switch holding the rules, and measure the
+    throughput, per-packet latency, refresh time and hit rate. Refreshes are
+    timed by the switch's metrics, split into selecting and installing the
+    cache. With
+    compress_rules, the cache is selected from the compressed table and the
+    compression statistics are included.
+    """
+    _reset_counters(rules)
+    switch = CacheSwitch("bench", algorithm, cache_size,
+                         config=CacheSwitchConfig(lookup_engine=lookup_engine,
+                                                  scheduler=PacketCountScheduler(refresh_interval),
+                                                  compress_rules=compress_rules))
+
+    load_time = switch.set_rules(rules)
+
+    # time every refresh triggered by the traffic, leaving the lookups untimed
+    # after the first packet
+    metrics = SwitchMetrics(sample_interval=len(traffic) + 1)
+    switch.metrics = metrics
+
+    latencies = []
+    clock = time.perf_counter_ns
+    start = time.perf_counter()
+    for packet in traffic:
+        packet_start = clock()
+        switch.packet_in(packet, 1)
+        latencies.append(clock() - packet_start)
+    elapsed = time.perf_counter() - start
+
+    packets, hits, misses = switch.get_cache_stats()
+    installs, flow_mods, _ = switch.get_flow_mod_stats()
+    refresh = metrics.refresh.get(algorithm.value, Histogram())
+    install = metrics.install
+
+    return {
+        "algorithm": algorithm.value,
+        "lookup_engine": lookup_engine.value,
+        "num_rules": len(rules),
+        "cache_size": cache_size,
+        "packets": packets,
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / packets if packets > 0 else 0,
+        "packets_per_sec": packets / elapsed if elapsed > 0 else 0,
+        "latency_p50_us": percentile(latencies, 0.5) / 1000,
+        "latency_p99_us": percentile(latencies, 0.99) / 1000,
+        "refreshes": refresh.count,
+        "refresh_mean_ms": refresh.get_stats()["mean"] / 1e6,
+        "refresh_max_ms": refresh.max / 1e6,
+        "install_mean_ms": install.get_stats()["mean"] / 1e6,
+        "load_time_s": load_time,
+        "flow_mods": flow_mods,
+        "flow_mods_per_install": flow_mods / installs if installs > 0 else 0,
+        "compress_rules": compress_rules,
+        "compression": switch.get_compression_stats(),
+    }
+
+
+def _window_hit_rates(switch: CacheSwitch, traffic: list, window: int) -> list:
+    """Send the traffic through the switch, getting the hit rate of every
+    window packets."""
+    rates = []
+    for start in range(0, len(traffic), window):
+        _, hits, _ = switch.get_cache_stats()
+        batch = traffic[start:start + window]
+        for packet in batch:
+            switch.packet_in(packet, 1)
+        rates.append((switch.get_cache_stats()[1] - hits) / len(batch))
+    return rates
+
+
+def run_shift_benchmark(estimator: str, algorithm: CacheAlgorithm, rules: list,
+                        traffic_before: list, traffic_after: list, cache_size: int,
+                        refresh_interval: int = 1000, window: int = 500,
+                        recovery_fraction: float = 0.9) -> dict:
+    """
+    Measure how quickly a cache switch using the given popularity estimator
+    recovers its hit rate when the traffic shifts. The traffic_before packets
+    are sent first, then traffic_after, and the hit rate is measured over every
+    window packets. The reference hit rate is the one a new switch reaches on
+    the second half of traffic_after having only ever seen that traffic. The
+    recovery time is the number of packets after the shift until a window
+    reaches recovery_fraction of the reference, or None if none does.
+    """
+    def new_switch(popularity):
+        _reset_counters(rules)
+        config = CacheSwitchConfig(scheduler=PacketCountScheduler(refresh_interval),
+                                   popularity=popularity)
+        switch = CacheSwitch("shift", algorithm, cache_size, config=config)
+        switch.set_rules(rules)
+        return switch
+
+    reference = _window_hit_rates(
+        new_switch(CumulativeEstimator()), traffic_after, window)
+    reference = reference[len(reference) // 2:]
+    hit_rate_reference = sum(reference) / len(reference) if reference else 0
+
+    switch = new_switch(ESTIMATORS[estimator]())
+    before = _window_hit_rates(switch, traffic_before, window)
+    after = _window_hit_rates(switch, traffic_after, window)
+
+    recovery_packets = None
+    for i, rate in enumerate(after):
+        if rate >= recovery_fraction * hit_rate_reference:
+            recovery_packets = (i + 1) * window
+            break
+
+    return {
+        "estimator": estimator,
+        "algorithm": algorithm.value,
+        "num_rules": len(rules),
+        "cache_size": cache_size,
+        "hit_rate_before": before[-1] if before else 0,
+        "hit_rate_after": after[-1] if after else 0,
+        "hit_rate_reference": hit_rate_reference,
+        "recovery_packets": recovery_packets,
+        "window_hit_rates": before + after,
+    }
+
+
+def run_snapshot_benchmark(algorithm: CacheAlgorithm, rules: list, traffic: list,
+                           cache_size: int, refresh_interval: int = 1000,
+                           window: int = 500) -> dict:
+    """
+    Measure how much a snapshot helps a restarted switch. A switch is sent
+    the first half of the traffic and saves a snapshot. One new switch is warm
+    started from the snapshot and another cold started from the rules alone,
+    and the hit rate of each is measured over the first window packets of the
+    second half of the traffic, and over all of it.
+    """
+    _reset_counters(rules)
+    half = len(traffic) // 2
+    config = CacheSwitchConfig(scheduler=PacketCountScheduler(refresh_interval))
+    switch = CacheSwitch("snapshot", algorithm, cache_size, config=config)
+    switch.set_rules(rules)
+    _window_hit_rates(switch, traffic[:half], window)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "switch.snapshot")
+        start = time.perf_counter()
+        switch.save_snapshot(path)
+        save_time = time.perf_counter() - start
+        snapshot_bytes = os.path.getsize(path)
+
+        config = CacheSwitchConfig(scheduler=PacketCountScheduler(refresh_interval))
+        warm = CacheSwitch("warm", algorithm, cache_size, config=config)
+        warm_load_time = warm.load_snapshot(path)
+
+    _reset_counters(rules)
+    config = CacheSwitchConfig(scheduler=PacketCountScheduler(refresh_interval))
+    cold = CacheSwitch("cold", algorithm, cache_size, config=config)
+    cold_load_time = cold.set_rules(rules)
+
+    warm_rates = _window_hit_rates(warm, traffic[half:], window)
+    cold_rates = _window_hit_rates(cold, traffic[half:], window)
+
+    return {
+        "algorithm": algorithm.value,
+        "num_rules": len(rules),
+        "cache_size": cache_size,
+        "snapshot_bytes": snapshot_bytes,
+        "save_time_s": save_time,
+        "warm_load_time_s": warm_load_time,
+        "cold_load_time_s": cold_load_time,
+        "warm_first_hit_rate": warm_rates[0] if warm_rates else 0,
+        "cold_first_hit_rate": cold_rates[0] if cold_rates else 0,
+        "warm_hit_rate": warm.num_hits / warm.num_packets if warm.num_packets > 0 else 0,
+        "cold_hit_rate": cold.num_hits / cold.num_packets if cold.num_packets > 0 else 0,
+    }
+
+
+def run_gap_benchmark(rules: list, traffic: list, cache_size: int,
+                      node_limit: int = 100000) -> dict:
+    """
+    Weigh the rules by the traffic, then compare the hit rate each greedy
+    algorithm's selection would get with the optimal selection.
+    """
+    _reset_counters(rules)
+    switch = BasicSwitch()
+    for rule in rules:
+        switch.add_rule(rule)
+    switch.match_rules(traffic)
+
+    planner = CacheSwitch("gap", CacheAlgorithm.OPTIMAL, cache_size)
+    planner.optimal_node_limit = node_limit
+    planner.set_rules(rules)
+
+    start = time.perf_counter()
+    gap = planner.get_selection_gap()
+    elapsed = time.perf_counter() - start
+
+    gap.update({
+        "num_rules": len(rules),
+        "cache_size": cache_size,
+        "time_s": elapsed,
+    })
+    return gap
+
+
+def run_memory_benchmark(rules: list) -> dict:
+    """
+    Build the dependency graph of the rules, adding them one at a time and
+    all at once, and measure how long each takes and how much memory the
+    closure bitsets use, compared with the same closure held as sets of rule
+    slots.
+    """
+    table = SortedKeyList([], key=Rule.sort_key)
+    start = time.perf_counter()
+    graph = DependencyGraph(table)
+    for rule in rules:
+        table.add(rule)
+        graph.add_rule(rule)
+    graph.get_views()
+    elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    graph = DependencyGraph(SortedKeyList(rules, key=Rule.sort_key))
+    _, all_dependencies = graph.get_views()
+    bulk_elapsed = time.perf_counter() - start
+
+    stats = graph.get_memory_stats()
+    # each set is only built to be measured, so they are not all held at once
+    set_bytes = sum(sys.getsizeof(set(bit_positions(bits))) for bits in all_dependencies)
+    stats.update({
+        "num_rules": len(rules),
+        "build_time_s": elapsed,
+        "bulk_build_time_s": bulk_elapsed,
+        "closure_set_bytes": set_bytes,
+    })
+    return stats
+
+
+def run_lookup_benchmark(engine: LookupEngine, rules: list, traffic: list) -> dict:
+    """Measure the throughput of a lookup engine over the full rule table."""
+    switch = BasicSwitch(engine)
+    for rule in rules:
+        switch.add_rule(rule)
+
+    # the first lookup compiles lazily built engines
+    switch.classifier.lookup_batch(traffic[:1])
+
+    start = time.perf_counter()
+    for packet in traffic:
+        switch.classifier.lookup(packet)
+    single_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    switch.classifier.lookup_batch(traffic)
+    batch_elapsed = time.perf_counter() - start
+
+    return {
+        "lookup_engine": engine.value,
+        "num_rules": len(rules),
+        "packets": len(traffic),
+        "packets_per_sec": len(traffic) / single_elapsed if single_elapsed > 0 else 0,
+        "batch_packets_per_sec": len(traffic) / batch_elapsed if batch_elapsed > 0 else 0,
+    }
+
+
+def run_suite(sizes: list, algorithms: list, engines: list, num_packets: int = 20000,
+              cache_fraction: float = 0.1, chain_depth: int = 3, zipf_exponent: float = 1.0,
+              refresh_interval: int = 1000, seed: int = 0, estimators: list = (),
+              gap: bool = False, compress: bool = False, snapshot: bool = False) -> dict:
+    """
+    Run the cache, dependency graph memory and lookup benchmarks for every
+    table size. The same rule table and traffic are used for every algorithm
+    and engine of a given size.
+    If any popularity estimators are named, each is also benchmarked against a
+    traffic shift using the first algorithm. If gap is set, the greedy
+    algorithms are compared with the optimal selection. If compress is set,
+    every algorithm is also run on the compressed rule table. If snapshot is
+    set, warm starting from a snapshot is compared with a cold start using the
+    first algorithm.
+    """
+    results = {
+        "config": {
+            "sizes": sizes,
+            "algorithms": [algorithm.value for algorithm in algorithms],
+            "lookup_engines": [engine.value for engine in engines],
+            "num_packets": num_packets,
+            "cache_fraction": cache_fraction,
+            "chain_depth": chain_depth,
+            "zipf_exponent": zipf_exponent,
+            "refresh_interval": refresh_interval,
+            "seed": seed,
+            "estimators": list(estimators),
+            "gap": gap,
+            "compress": compress,
+            "snapshot": snapshot,
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "cache": [],
+        "lookup": [],
+        "shift": [],
+        "gap": [],
+        "compression": [],
+        "snapshot": [],
+        "memory": [],
+    }
+
+    for size in sizes:
+        rules = generate_rule_table(size, chain_depth=chain_depth, seed=seed)
+        traffic = zipf_traffic(rules, num_packets,
+                               exponent=zipf_exponent, seed=seed)
+        cache_size = max(1, int(size * cache_fraction))
+
+        results["memory"].append(run_memory_benchmark(rules))
+
+        for algorithm in algorithms:
+            results["cache"].append(run_cache_benchmark(
+                algorithm, rules, traffic, cache_size, refresh_interval))
+
+        for engine in engines:
+            results["lookup"].append(
+                run_lookup_benchmark(engine, rules, traffic))
+
+        if len(estimators) > 0:
+            shifted = zipf_traffic(rules, num_packets,
+                                   exponent=zipf_exponent, seed=seed + 1)
+            for estimator in estimators:
+                results["shift"].append(run_shift_benchmark(
+                    estimator, algorithms[0], rules, traffic, shifted, cache_size,
+                    refresh_interval))
+
+        if gap:
+            results["gap"].append(run_gap_benchmark(rules, traffic, cache_size))
+
+        if compress:
+            for algorithm in algorithms:
+                results["compression"].append(run_cache_benchmark(
+                    algorithm, rules, traffic, cache_size, refresh_interval,
+                    compress_rules=True))
+
+        if snapshot:
+            results["snapshot"].append(run_snapshot_benchmark(
+                algorithms[0], rules, traffic, cache_size, refresh_interval))
+
+    return results
+
+
+def write_results(results: dict, path: str):
+    """Write benchmark results to a JSON file."""
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
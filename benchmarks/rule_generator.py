@@ -0,0 +1,77 @@
+import random
+from ipaddress import ip_network
+from rules.rule import Rule
+from rules.action import ForwardAction
+from rules.pattern import IPv4DstPattern, IPv4SrcPattern, TCPDPortPattern
+
+
+# relative frequency of destination prefix lengths, loosely following the
+# distributions seen in ClassBench filter sets
+PREFIX_LENGTHS = {
+    8: 3,
+    16: 12,
+    20: 5,
+    24: 35,
+    28: 10,
+    32: 35,
+}
+
+# well known ports used for rules that also match on a destination port
+PORTS = [22, 25, 53, 80, 123, 443, 8080]
+
+
+def _random_prefix(rng: random.Random, sites: list, prefixlen: int) -> tuple:
+    """Get a random prefix of the given length inside one of the sites."""
+    address = rng.choice(sites) | rng.getrandbits(24)
+    return address >> (32 - prefixlen) << (32 - prefixlen), prefixlen
+
+
+def generate_rule_table(num_rules: int, chain_depth: int = 3, chain_fraction: float = 0.3,
+                        port_fraction: float = 0.1, src_fraction: float = 0.1,
+                        num_sites: int = 8, seed: int = 0) -> list:
+    """
+    Generate a synthetic rule table. Every rule matches a destination prefix,
+    with prefix lengths drawn from PREFIX_LENGTHS inside a small number of /8
+    sites so that rules overlap. A chain_fraction of the rules are generated as
+    chains of chain_depth nested prefixes, producing dependency chains of that
+    depth. Some rules also match a source prefix or a destination port.
+
+    Priorities are unique and ordered by prefix length, so the table behaves
+    like a longest prefix match with extra fields.
+    """
+    rng = random.Random(seed)
+    sites = [rng.randrange(1, 224) << 24 for _ in range(num_sites)]
+    lengths = list(PREFIX_LENGTHS.keys())
+    frequencies = list(PREFIX_LENGTHS.values())
+
+    prefixes = []
+    while len(prefixes) < num_rules:
+        if chain_depth > 1 and rng.random() < chain_fraction:
+            # nested prefixes from /8 down to /32
+            step = 24 // (chain_depth - 1)
+            address = rng.choice(sites) | rng.getrandbits(24)
+            for depth in range(chain_depth):
+                prefixlen = min(32, 8 + depth * step)
+                prefixes.append(
+                    (address >> (32 - prefixlen) << (32 - prefixlen), prefixlen))
+        else:
+            prefixlen = rng.choices(lengths, frequencies)[0]
+            prefixes.append(_random_prefix(rng, sites, prefixlen))
+    prefixes = prefixes[:num_rules]
+
+    rules = []
+    order = list(range(num_rules))
+    rng.shuffle(order)
+    for i, (address, prefixlen) in enumerate(prefixes):
+        patterns = [IPv4DstPattern(ip_network((address, prefixlen)))]
+        if rng.random() < src_fraction:
+            src_length = rng.choices(lengths, frequencies)[0]
+            patterns.append(IPv4SrcPattern(ip_network(
+                _random_prefix(rng, sites, src_length))))
+        if rng.random() < port_fraction:
+            patterns.append(TCPDPortPattern(rng.choice(PORTS)))
+
+        priority = prefixlen * num_rules + order[i]
+        rules.append(Rule(patterns, ForwardAction(rng.randrange(1, 8)), priority))
+
+    return rules
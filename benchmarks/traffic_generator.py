@@ -0,0 +1,47 @@
+import random
+from itertools import accumulate
+from network.packet import Packet
+from rules.pattern import IPv4DstPattern, IPv4SrcPattern, InPortPattern, \
+    TCPDPortPattern, TCPSPortPattern
+
+
+def packet_for_rule(rule, rng: random.Random, in_port: int = 1) -> Packet:
+    """Generate a random packet that falls inside the rule's match."""
+    packet = Packet(in_port, rng.getrandbits(32), rng.getrandbits(32),
+                    rng.randrange(1024, 65536), rng.randrange(1024, 65536))
+
+    for pattern in rule.patterns:
+        if type(pattern) == IPv4DstPattern:
+            packet.ipv4_dst = pattern.network | (
+                rng.getrandbits(32) & ~pattern.mask & 0xFFFFFFFF)
+        elif type(pattern) == IPv4SrcPattern:
+            packet.ipv4_src = pattern.network | (
+                rng.getrandbits(32) & ~pattern.mask & 0xFFFFFFFF)
+        elif type(pattern) == InPortPattern:
+            packet.in_port = pattern.in_port
+        elif type(pattern) == TCPSPortPattern:
+            packet.tcp_sport = pattern.tcp_sport
+        elif type(pattern) == TCPDPortPattern:
+            packet.tcp_dport = pattern.tcp_dport
+
+    return packet
+
+
+def zipf_traffic(rules: list, num_packets: int, exponent: float = 1.0,
+                 num_flows: int = None, seed: int = 0) -> list:
+    """
+    Generate a list of packets with Zipf-distributed flow popularity. Each
+    flow is a fixed packet generated inside a randomly chosen rule, and the
+    flow of rank k is sent with probability proportional to 1 / k^exponent.
+    Packets of the same flow are the same object, so they should be treated
+    as read-only apart from their in_port.
+    """
+    rng = random.Random(seed)
+    if num_flows is None:
+        num_flows = 4 * len(rules)
+
+    flows = [packet_for_rule(rng.choice(rules), rng) for _ in range(num_flows)]
+    cumulative = list(accumulate(1 / (rank ** exponent)
+                                 for rank in range(1, num_flows + 1)))
+
+    return rng.choices(flows, cum_weights=cumulative, k=num_packets)
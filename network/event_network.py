@@ -0,0 +1,328 @@
+import heapq
+import random
+from collections import deque
+from network.network import Network
+from network.packet import Packet
+from rules.action import ActionType
+
+
+# event types, in the order they are handled when they happen at the same time
+ARRIVE_SWITCH = 0
+SWITCH_DONE = 1
+ARRIVE_HOST = 2
+CONTROLLER = 3
+HOST_SEND = 4
+
+
+def _percentile(ordered: list, fraction: float) -> float:
+    if len(ordered) == 0:
+        return 0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class EventNetwork (Network):
+    """
+    A discrete-event version of the network, where packets take time to move.
+    Links have a propagation latency and optionally a bandwidth, and send one
+    packet at a time in each direction. Switches process one packet at a time
+    in arrival order, taking hw_time for a hardware cache hit and sw_time for a
+    miss that has to go to the software switch. A switch that refreshes its
+    cache while processing a packet stalls for refresh_time, unless it
+    refreshes in the background. Packets sent to the controller reach it after
+    controller_delay.
+
+    Events are kept in a heap ordered by time. Unlike Network, sending a packet
+    only schedules it - run processes the events and advances the clock.
+    """
+
+    now: float
+    events: list
+    seq: int
+
+    # link_params[node, port] = latency, bandwidth of the link leaving the
+    # node on that port - hosts use a port of None
+    link_params: dict
+    # link_free_at[node, port] = time the link is free to send again
+    link_free_at: dict
+
+    # switch_timing[switch_name] = hw_time, sw_time, refresh_time
+    switch_timing: dict
+    switch_queues: dict
+    switch_busy: dict
+    refresh_stalls: dict
+
+    default_latency: float
+    default_bandwidth: float
+    default_timing: tuple
+    controller_delay: float
+    packet_size: int
+
+    # end-to-end latencies of a uniform sample of at most latency_samples of
+    # the packets delivered to a host, kept by reservoir sampling
+    latencies: list
+    latency_samples: int
+    _latency_rng: random.Random
+
+    # number, total and maximum of the latencies of every delivered packet
+    num_delivered: int
+    latency_total: float
+    latency_max: float
+
+    def __init__(self, default_latency: float = 0.0, default_bandwidth: float = None,
+                 hw_time: float = 0.0, sw_time: float = 0.0, refresh_time: float = 0.0,
+                 controller_delay: float = 0.0, packet_size: int = 1500,
+                 latency_samples: int = 10000, seed: int = 0):
+        """
+        Create a new event-driven network. Times are in seconds, bandwidths in
+        bits per second and the packet size in bytes. The defaults apply to
+        every link and switch that is not given its own values. At most
+        latency_samples latencies are kept for the percentiles, so a long
+        replay takes constant memory.
+        """
+        self.now = 0.0
+        self.events = []
+        self.seq = 0
+
+        self.link_params = dict()
+        self.link_free_at = dict()
+
+        self.switch_timing = dict()
+        self.switch_queues = dict()
+        self.switch_busy = dict()
+        self.refresh_stalls = dict()
+
+        self.default_latency = default_latency
+        self.default_bandwidth = default_bandwidth
+        self.default_timing = hw_time, sw_time, refresh_time
+        self.controller_delay = controller_delay
+        self.packet_size = packet_size
+
+        self.latencies = []
+        self.latency_samples = latency_samples
+        self._latency_rng = random.Random(seed)
+        self.num_delivered = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+        super().__init__()
+
+    def add_switch(self, switch_name: str, switch, hw_time: float = None,
+                   sw_time: float = None, refresh_time: float = None):
+        """Add a switch to the network, optionally with its own timing."""
+        super().add_switch(switch_name, switch)
+        default_hw, default_sw, default_refresh = self.default_timing
+        self.switch_timing[switch_name] = (
+            default_hw if hw_time is None else hw_time,
+            default_sw if sw_time is None else sw_time,
+            default_refresh if refresh_time is None else refresh_time)
+        self.switch_queues[switch_name] = deque()
+        self.switch_busy[switch_name] = False
+        self.refresh_stalls[switch_name] = 0.0
+
+    def connect_host(self, host_name: str, switch_name: str, switch_port: int,
+                     latency: float = None, bandwidth: float = None):
+        super().connect_host(host_name, switch_name, switch_port)
+        self._set_link_params(host_name, None, switch_name,
+                              switch_port, latency, bandwidth)
+
+    def add_link(self, a: str, a_port: int, b: str, b_port: int,
+                 latency: float = None, bandwidth: float = None):
+        super().add_link(a, a_port, b, b_port)
+        self._set_link_params(a, a_port, b, b_port, latency, bandwidth)
+
+    def _set_link_params(self, a: str, a_port: int, b: str, b_port: int,
+                         latency: float, bandwidth: float):
+        if latency is None:
+            latency = self.default_latency
+        if bandwidth is None:
+            bandwidth = self.default_bandwidth
+        self.link_params[a, a_port] = latency, bandwidth
+        self.link_params[b, b_port] = latency, bandwidth
+
+    def _schedule(self, time: float, event: int, *args):
+        self.seq += 1
+        heapq.heappush(self.events, (time, event, self.seq, args))
+
+    def _transmit(self, packet: Packet, node: str, port: int, sent_at: float):
+        """Send a packet out of a node's port onto the attached link."""
+        if node in self.switches:
+            dst_node, dst_port = self.links[node][port]
+        else:
+            dst_node, dst_port = self.links[node]
+
+        latency, bandwidth = self.link_params.get(
+            (node, port), (self.default_latency, self.default_bandwidth))
+
+        # the link sends one packet at a time
+        depart = max(self.now, self.link_free_at.get((node, port), 0.0))
+        if bandwidth:
+            depart += self.packet_size * 8 / bandwidth
+        self.link_free_at[node, port] = depart
+
+        if dst_port is None:
+            self._schedule(depart + latency, ARRIVE_HOST,
+                           packet, dst_node, sent_at)
+        else:
+            self._schedule(depart + latency, ARRIVE_SWITCH,
+                           packet, dst_node, dst_port, sent_at)
+
+    def send_packet(self, src_host: str, src_port: int, dst_host: str, dst_port: int,
+                    at: float = None):
+        """Schedule a packet to be sent from a host at the given time, or
+        now if no time is given."""
+        self.packets_in += 1
+
+        if src_host in self.hosts and dst_host in self.hosts and src_host in self.links:
+            packet = Packet(
+                None, self.hosts[src_host], self.hosts[dst_host], src_port, dst_port)
+            at = self.now if at is None else at
+            self._schedule(at, HOST_SEND, packet, src_host, at)
+        else:
+            self.drop_packet(None)
+
+    def inject_packet(self, packet: Packet, switch_name: str, switch_port: int,
+                      at: float = None):
+        """Schedule a packet to arrive on a switch port at the given time, or
+        now if no time is given."""
+        self.packets_in += 1
+        self._schedule(self.now if at is None else at, ARRIVE_SWITCH,
+                       packet, switch_name, switch_port, None)
+
+    def replay_trace(self, trace, interarrival: float = 0.0) -> dict:
+        """
+        Replay a trace, injecting a packet every interarrival seconds. Events
+        are processed as the trace is read, so only the packets in flight are
+        held in memory. Returns the cache report once every packet has left the
+        network.
+        """
+        host_locations = self._host_locations()
+        start = self.now
+
+        for i, (packet, switch_name, switch_port) in enumerate(trace):
+            at = start + i * interarrival
+            self.run(until=at)
+
+            if switch_name is None:
+                location = self._locate_ingress(packet, host_locations)
+                if location is None:
+                    self.packets_in += 1
+                    self.drop_packet(packet)
+                    continue
+                switch_name, switch_port = location
+
+            self.inject_packet(packet, switch_name, switch_port, at=at)
+
+        self.run()
+        return self.get_cache_report()
+
+    def run(self, until: float = None):
+        """Process events in time order, up to the given time if one is
+        given, or until no events are left."""
+        while len(self.events) > 0 and (until is None or self.events[0][0] <= until):
+            time, event, _, args = heapq.heappop(self.events)
+            self.now = time
+
+            if event == ARRIVE_SWITCH:
+                self._arrive_switch(*args)
+            elif event == SWITCH_DONE:
+                self._switch_done(*args)
+            elif event == ARRIVE_HOST:
+                self._arrive_host(*args)
+            elif event == HOST_SEND:
+                packet, host_name, sent_at = args
+                self._transmit(packet, host_name, None, sent_at)
+            else:
+                packet, switch_name = args
+                self.packet_in(packet, switch_name)
+
+        if until is not None and until > self.now:
+            self.now = until
+
+    def _arrive_switch(self, packet: Packet, switch_name: str, switch_port: int,
+                       sent_at: float):
+        if sent_at is None:
+            sent_at = self.now
+
+        if self.switch_busy[switch_name]:
+            self.switch_queues[switch_name].append(
+                (packet, switch_port, sent_at))
+        else:
+            self._process(packet, switch_name, switch_port, sent_at)
+
+    def _process(self, packet: Packet, switch_name: str, switch_port: int, sent_at: float):
+        """Look the packet up in the switch and hold the switch busy for as
+        long as the lookup takes."""
+        switch = self.switches[switch_name]
+        hw_time, sw_time, refresh_time = self.switch_timing[switch_name]
+
+        misses = getattr(switch, "num_misses", 0)
+        scheduler = getattr(switch, "scheduler", None)
+        refreshes = scheduler.num_refreshes if scheduler is not None else 0
+
+        packet.in_port = switch_port
+        action = switch.packet_in(packet, switch_port)
+
+        service = hw_time
+        if getattr(switch, "num_misses", 0) > misses:
+            service += sw_time
+        if scheduler is not None and scheduler.num_refreshes > refreshes \
+                and not switch.background_refresh:
+            service += refresh_time
+            self.refresh_stalls[switch_name] += refresh_time
+
+        self.switch_busy[switch_name] = True
+        self._schedule(self.now + service, SWITCH_DONE,
+                       packet, switch_name, action, sent_at)
+
+    def _switch_done(self, packet: Packet, switch_name: str, action, sent_at: float):
+        if action is None:
+            self.drop_packet(packet)
+        elif action.type == ActionType.FORWARD:
+            self._transmit(packet, switch_name, action.forward_port, sent_at)
+        elif action.type == ActionType.CONTROLLER:
+            self._schedule(self.now + self.controller_delay, CONTROLLER,
+                           packet, switch_name)
+        else:
+            self.drop_packet(packet)
+
+        queue = self.switch_queues[switch_name]
+        if len(queue) > 0:
+            packet, switch_port, sent_at = queue.popleft()
+            self._process(packet, switch_name, switch_port, sent_at)
+        else:
+            self.switch_busy[switch_name] = False
+
+    def _arrive_host(self, packet: Packet, host_name: str, sent_at: float):
+        packet.in_port = None
+        if host_name in self.hosts and self._host_matches(host_name, packet.ipv4_dst):
+            self.packets_arrived += 1
+            self._record_latency(self.now - sent_at)
+        else:
+            self.drop_packet(packet)
+
+    def _record_latency(self, latency: float):
+        self.num_delivered += 1
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+
+        if len(self.latencies) < self.latency_samples:
+            self.latencies.append(latency)
+        else:
+            i = self._latency_rng.randrange(self.num_delivered)
+            if i < self.latency_samples:
+                self.latencies[i] = latency
+
+    def get_latency_stats(self) -> dict:
+        """Get statistics on the end-to-end latency of delivered packets, and
+        the total time each switch spent stalled on cache refreshes. The count,
+        mean and maximum are exact, and the percentiles are taken from the
+        sampled latencies."""
+        ordered = sorted(self.latencies)
+        return {
+            "delivered": self.num_delivered,
+            "mean": self.latency_total / self.num_delivered if self.num_delivered > 0 else 0,
+            "p50": _percentile(ordered, 0.5),
+            "p99": _percentile(ordered, 0.99),
+            "max": self.latency_max,
+            "refresh_stalls": dict(self.refresh_stalls),
+        }
@@ -75,19 +75,42 @@ class Network:
             switch_name, switch_port = self.links[src_host]
             self.packet_queue.append((packet, switch_name, switch_port))
         else:
-            self.drop_packet
+            self.drop_packet(None)
 
+        self._process_queue()
+
+    def inject_packet(self, packet: Packet, switch_name: str, switch_port: int):
+        """Inject a packet into the network on the given switch port."""
+
+        self.packets_in += 1
+
+        self.packet_queue.append((packet, switch_name, switch_port))
+        self._process_queue()
+
+    def _process_queue(self, owned: set = None, outbox: list = None):
+        """
+        Move packets through the network until none are left in flight. If a
+        set of owned switches is given, packets arriving at any other switch
+        are moved to the outbox instead of being processed.
+        """
         while len(self.packet_queue) > 0:
             packet, switch_name, switch_port = self.packet_queue.pop()
 
+            # packet has arrived at a switch owned by another shard
+            if owned is not None and switch_port != None and switch_name not in owned:
+                outbox.append((packet, switch_name, switch_port))
+
             # packet has arrived at a switch
-            if switch_port != None:
+            elif switch_port != None:
                 packet.in_port = switch_port
 
                 action = self.switches[switch_name].packet_in(
                     packet, switch_port)
 
-                if action.type == ActionType.FORWARD:
+                if action is None:
+                    self.drop_packet(packet)
+
+                elif action.type == ActionType.FORWARD:
                     src_port = action.forward_port
                     dst_switch, dst_port = self.links[switch_name][src_port]
                     self.packet_queue.append((packet, dst_switch, dst_port))
@@ -101,11 +124,68 @@ class Network:
             # packet has arrived at a host
             else:
                 packet.in_port = None
-                if switch_name in self.hosts and packet.ipv4_dst.subnet_of(self.hosts[switch_name]):
+                if switch_name in self.hosts and self._host_matches(switch_name, packet.ipv4_dst):
                     self.packets_arrived += 1
                 else:
                     self.drop_packet(packet)
 
+    def _host_matches(self, host_name: str, address: int) -> bool:
+        """Returns whether an integer address belongs to the given host."""
+        host = self.hosts[host_name]
+        return (address & int(host.netmask)) == int(host.network_address)
+
+    def find_ingress(self, address: int):
+        """
+        Find the switch and port where a packet from the given address enters
+        the network, by looking for the connected host the address belongs to.
+        Returns None if no host matches.
+        """
+        for host_name, host in self.hosts.items():
+            if host_name in self.links and self._host_matches(host_name, address):
+                return self.links[host_name]
+        return None
+
+    def _host_locations(self) -> dict:
+        """Map the integer address of every connected single-address host to
+        the switch and port it is connected to."""
+        host_locations = dict()
+        for host_name, host in self.hosts.items():
+            if host_name in self.links and host.prefixlen == 32:
+                host_locations[int(host.network_address)] = self.links[host_name]
+        return host_locations
+
+    def _locate_ingress(self, packet: Packet, host_locations: dict):
+        """Find where a packet enters the network, looking up exact host
+        addresses directly and scanning for anything else."""
+        location = host_locations.get(packet.ipv4_src)
+        if location is None:
+            location = self.find_ingress(packet.ipv4_src)
+        return location
+
+    def replay_trace(self, trace) -> dict:
+        """
+        Replay a trace through the network. The trace is any iterable of
+        packet, switch name, switch port tuples, such as the generators in
+        network.trace, and is consumed one packet at a time. Packets without an
+        ingress switch are injected where the host owning their source address
+        is connected, or dropped if there is no such host. Returns the cache
+        report for the network once the trace is exhausted.
+        """
+        host_locations = self._host_locations()
+
+        for packet, switch_name, switch_port in trace:
+            if switch_name is None:
+                location = self._locate_ingress(packet, host_locations)
+                if location is None:
+                    self.packets_in += 1
+                    self.drop_packet(packet)
+                    continue
+                switch_name, switch_port = location
+
+            self.inject_packet(packet, switch_name, switch_port)
+
+        return self.get_cache_report()
+
     def packet_in(self, packet: Packet, switch_name: str):
         """Handle a packet that has been sent to the controller."""
         self.drop_packet(packet)
@@ -116,3 +196,18 @@ class Network:
     def get_cache_switch_stats(self, switch_name: str):
         if switch_name in self.switches:
             return self.switches[switch_name].get_cache_stats()
+
+    def get_cache_report(self) -> dict:
+        """Get the packets, hits, misses and hit rate of every cache switch in
+        the network."""
+        report = dict()
+        for switch_name, switch in self.switches.items():
+            if hasattr(switch, "get_cache_stats"):
+                packets, hits, misses = switch.get_cache_stats()
+                report[switch_name] = {
+                    "packets": packets,
+                    "hits": hits,
+                    "misses": misses,
+                    "hit_rate": hits / packets if packets > 0 else 0,
+                }
+        return report
@@ -1,12 +1,27 @@
-from ipaddress import IPv4Network
+from ipaddress import IPv4Address, IPv4Network
+
+
+def address_to_int(address) -> int:
+    """
+    Convert an IPv4 address to its 32-bit integer form. Networks are converted
+    to their network address, and integers are returned unchanged.
+    """
+    if address is None or isinstance(address, int):
+        return address
+    if isinstance(address, IPv4Network):
+        return int(address.network_address)
+    return int(IPv4Address(address))
 
 
 class Packet:
 
+    __slots__ = ("in_port", "ipv4_src", "ipv4_dst", "tcp_sport", "tcp_dport")
+
     in_port: int
 
-    ipv4_src: IPv4Network
-    ipv4_dst: IPv4Network
+    # addresses are stored as 32-bit integers
+    ipv4_src: int
+    ipv4_dst: int
 
     tcp_sport: int
     tcp_dport: int
@@ -14,16 +29,20 @@ class Packet:
     def __init__(
         self,
         in_port: int,
-        ipv4_src: IPv4Network,
-        ipv4_dst: IPv4Network,
+        ipv4_src,
+        ipv4_dst,
         tcp_sport: int,
         tcp_dport: int
     ):
+        """
+        Create a new packet. The addresses may be given as integers, IPv4
+        addresses, or host networks.
+        """
         self.in_port = in_port
-        self.ipv4_src = ipv4_src
-        self.ipv4_dst = ipv4_dst
+        self.ipv4_src = address_to_int(ipv4_src)
+        self.ipv4_dst = address_to_int(ipv4_dst)
         self.tcp_sport = tcp_sport
         self.tcp_dport = tcp_dport
 
     def __str__(self):
-        return f'[in_port: {self.in_port}, ipv4_src: {str(self.ipv4_src)}, ipv4_dst: {str(self.ipv4_dst)}, tcp_sport: {self.tcp_sport}, tcp_dport: {self.tcp_dport}]'
+        return f'[in_port: {self.in_port}, ipv4_src: {str(IPv4Address(self.ipv4_src))}, ipv4_dst: {str(IPv4Address(self.ipv4_dst))}, tcp_sport: {self.tcp_sport}, tcp_dport: {self.tcp_dport}]'
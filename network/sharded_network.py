@@ -0,0 +1,195 @@
+import logging
+import multiprocessing
+from itertools import islice
+from network.network import Network
+
+
+def _run_shard(conn, network_factory, owned: list):
+    """
+    Run a shard in a worker process. The shard builds its own copy of the
+    network, but only processes packets at the switches it owns, returning the
+    packets that move on to other shards after each batch.
+    """
+    network = network_factory()
+    owned = set(owned)
+
+    while True:
+        command, payload = conn.recv()
+
+        if command == "run":
+            arrived = network.packets_arrived
+            dropped = network.packets_dropped
+
+            # the queue is a stack, so push the batch in reverse to process it
+            # in order
+            network.packet_queue.extend(reversed(payload))
+            outbox = []
+            network._process_queue(owned, outbox)
+
+            conn.send((outbox, network.packets_arrived - arrived,
+                       network.packets_dropped - dropped))
+
+        elif command == "report":
+            report = network.get_cache_report()
+            conn.send({name: stats for name, stats in report.items()
+                       if name in owned})
+
+        else:
+            break
+
+    conn.close()
+
+
+class ShardedNetwork:
+    """
+    Simulates a network across a pool of worker processes. Each process owns a
+    subset of the switches and processes every packet that arrives at them, so
+    each switch's cache sees all of its traffic and its hit/miss accounting is
+    the same as in a single process simulation. Packets are exchanged between
+    shards in batches, in rounds, until none are left in flight.
+
+    Every process builds the network by calling network_factory, which must be
+    picklable and must build the same topology and rules each time. Packets
+    within a round are processed in order per shard, but may reach a switch in
+    a different order than in a single process simulation.
+    """
+
+    network_factory: object
+    num_shards: int
+    batch_size: int
+
+    # a local copy of the network, used to look up the topology
+    topology: Network
+
+    # owners[switch_name] = index of the shard that owns the switch
+    owners: dict
+
+    processes: list
+    connections: list
+
+    packets_in: int
+    packets_arrived: int
+    packets_dropped: int
+
+    def __init__(self, network_factory, num_shards: int, batch_size: int = 1024,
+                 owners: dict = None):
+        """
+        Start the shards. By default switches are assigned to shards round
+        robin in name order; owners can map switch names to shard indices
+        instead.
+        """
+        self.network_factory = network_factory
+        self.num_shards = num_shards
+        self.batch_size = batch_size
+        self.topology = network_factory()
+
+        if owners is None:
+            owners = {name: i % num_shards
+                      for i, name in enumerate(sorted(self.topology.switches))}
+        self.owners = owners
+
+        self.processes = []
+        self.connections = []
+        for shard in range(num_shards):
+            owned = [name for name, owner in owners.items() if owner == shard]
+            parent_conn, child_conn = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_run_shard, args=(child_conn, network_factory, owned), daemon=True)
+            process.start()
+            child_conn.close()
+            self.processes.append(process)
+            self.connections.append(parent_conn)
+
+        logging.info(
+            f"[sharded_network] Started {num_shards} shards for {len(owners)} switches.")
+
+        self.packets_in = 0
+        self.packets_arrived = 0
+        self.packets_dropped = 0
+
+    def inject_packets(self, items: list):
+        """
+        Inject a batch of packet, switch name, switch port tuples and run the
+        simulation until none of the packets are left in flight.
+        """
+        self.packets_in += len(items)
+
+        inboxes = [[] for _ in range(self.num_shards)]
+        for item in items:
+            inboxes[self.owners[item[1]]].append(item)
+
+        while any(len(inbox) > 0 for inbox in inboxes):
+            # start every shard with work before waiting on any of them
+            running = []
+            for shard, inbox in enumerate(inboxes):
+                if len(inbox) > 0:
+                    self.connections[shard].send(("run", inbox))
+                    running.append(shard)
+
+            inboxes = [[] for _ in range(self.num_shards)]
+            for shard in running:
+                outbox, arrived, dropped = self.connections[shard].recv()
+                self.packets_arrived += arrived
+                self.packets_dropped += dropped
+                for item in outbox:
+                    inboxes[self.owners[item[1]]].append(item)
+
+    def replay_trace(self, trace) -> dict:
+        """
+        Replay a trace through the sharded network, reading it batch_size
+        packets at a time. The trace has the same format as for
+        Network.replay_trace. Returns the cache report once the trace is
+        exhausted.
+        """
+        host_locations = self.topology._host_locations()
+        trace = iter(trace)
+
+        while True:
+            batch = list(islice(trace, self.batch_size))
+            if len(batch) == 0:
+                break
+
+            items = []
+            for packet, switch_name, switch_port in batch:
+                if switch_name is None:
+                    location = self.topology._locate_ingress(
+                        packet, host_locations)
+                    if location is None:
+                        self.packets_in += 1
+                        self.packets_dropped += 1
+                        continue
+                    switch_name, switch_port = location
+                items.append((packet, switch_name, switch_port))
+
+            self.inject_packets(items)
+
+        return self.get_cache_report()
+
+    def get_stats(self):
+        return self.packets_in, self.packets_arrived, self.packets_dropped
+
+    def get_cache_report(self) -> dict:
+        """Get the cache report of every switch, collected from the shards
+        that own them."""
+        report = dict()
+        for conn in self.connections:
+            conn.send(("report", None))
+        for conn in self.connections:
+            report.update(conn.recv())
+        return report
+
+    def close(self):
+        """Stop the shards."""
+        for conn in self.connections:
+            conn.send(("stop", None))
+            conn.close()
+        for process in self.processes:
+            process.join()
+        self.connections = []
+        self.processes = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,130 @@
+import csv
+import struct
+from network.packet import Packet, address_to_int
+
+
+# pcap link layer types that can be decoded
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_VLAN = 0x8100
+
+IP_PROTOCOL_TCP = 6
+IP_PROTOCOL_UDP = 17
+
+
+def _parse_port(value: str) -> int:
+    if value is None or value == "":
+        return None
+    return int(value)
+
+
+def read_csv_trace(path: str):
+    """
+    Stream packets from a CSV trace. The file needs a header row with the
+    columns src, dst, sport and dport, where addresses are dotted quads or
+    integers. Optional switch and port columns give the ingress switch and port
+    of each packet. Yields a packet, switch name and switch port for each row,
+    with the switch and port set to None if they are not given.
+    """
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            src = row["src"]
+            dst = row["dst"]
+            packet = Packet(
+                None,
+                int(src) if src.isdigit() else address_to_int(src),
+                int(dst) if dst.isdigit() else address_to_int(dst),
+                _parse_port(row.get("sport")),
+                _parse_port(row.get("dport")))
+
+            switch_name = row.get("switch") or None
+            switch_port = _parse_port(row.get("port"))
+            yield packet, switch_name, switch_port
+
+
+def _decode_ipv4(data: bytes, offset: int) -> Packet:
+    """Decode an IPv4 header, and the ports of a TCP or UDP header, into a
+    packet. Returns None if the data is not a valid IPv4 packet."""
+    if len(data) < offset + 20 or data[offset] >> 4 != 4:
+        return None
+
+    header_length = (data[offset] & 0x0F) * 4
+    protocol = data[offset + 9]
+    src, dst = struct.unpack_from("!II", data, offset + 12)
+
+    sport = None
+    dport = None
+    transport = offset + header_length
+    fragment_offset = struct.unpack_from("!H", data, offset + 6)[0] & 0x1FFF
+    if protocol in (IP_PROTOCOL_TCP, IP_PROTOCOL_UDP) and fragment_offset == 0 \
+            and len(data) >= transport + 4:
+        sport, dport = struct.unpack_from("!HH", data, transport)
+
+    return Packet(None, src, dst, sport, dport)
+
+
+def _decode_frame(data: bytes, linktype: int) -> Packet:
+    """Decode a captured frame into a packet, or None if it is not IPv4."""
+    if linktype == LINKTYPE_RAW:
+        return _decode_ipv4(data, 0)
+
+    if linktype == LINKTYPE_LINUX_SLL:
+        if len(data) < 16:
+            return None
+        ethertype = struct.unpack_from("!H", data, 14)[0]
+        offset = 16
+    else:
+        if len(data) < 14:
+            return None
+        ethertype = struct.unpack_from("!H", data, 12)[0]
+        offset = 14
+        while ethertype == ETHERTYPE_VLAN and len(data) >= offset + 4:
+            ethertype = struct.unpack_from("!H", data, offset + 2)[0]
+            offset += 4
+
+    if ethertype != ETHERTYPE_IPV4:
+        return None
+    return _decode_ipv4(data, offset)
+
+
+def read_pcap_trace(path: str):
+    """
+    Stream packets from a pcap file, reading one record at a time. Ethernet,
+    raw IP and Linux cooked captures are supported, and frames that are not
+    IPv4 are skipped. TCP and UDP ports are both used as the packet's ports.
+    Yields a packet and None for the switch name and port, since captures do
+    not record where packets entered the network.
+    """
+    with open(path, "rb") as f:
+        header = f.read(24)
+        if len(header) < 24:
+            return
+
+        magic = header[:4]
+        if magic in (b"\xd4\xc3\xb2\xa1", b"\x4d\x3c\xb2\xa1"):
+            endian = "<"
+        elif magic in (b"\xa1\xb2\xc3\xd4", b"\xa1\xb2\x3c\x4d"):
+            endian = ">"
+        else:
+            raise ValueError(f"{path} is not a pcap file.")
+
+        linktype = struct.unpack(endian + "I", header[20:24])[0]
+        if linktype not in (LINKTYPE_ETHERNET, LINKTYPE_RAW, LINKTYPE_LINUX_SLL):
+            raise ValueError(f"Unsupported pcap link type {linktype}.")
+
+        record_header = struct.Struct(endian + "IIII")
+        while True:
+            record = f.read(record_header.size)
+            if len(record) < record_header.size:
+                return
+            _, _, captured_length, _ = record_header.unpack(record)
+            data = f.read(captured_length)
+            if len(data) < captured_length:
+                return
+
+            packet = _decode_frame(data, linktype)
+            if packet is not None:
+                yield packet, None, None
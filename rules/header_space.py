@@ -0,0 +1,131 @@
+from rules.pattern import IPv4DstPattern, IPv4SrcPattern, InPortPattern, \
+    TCPDPortPattern, TCPSPortPattern
+
+
+# the header fields, from the lowest bits of the vector up - each is the
+# pattern type matching it, the attribute holding its value, and its width
+FIELDS = (
+    (InPortPattern, "in_port", 32),
+    (IPv4SrcPattern, "network", 32),
+    (IPv4DstPattern, "network", 32),
+    (TCPSPortPattern, "tcp_sport", 16),
+    (TCPDPortPattern, "tcp_dport", 16),
+)
+
+# offsets[pattern type] = offset, width and attribute of the field the
+# pattern matches
+OFFSETS = dict()
+_offset = 0
+for _pattern_type, _attribute, _width in FIELDS:
+    OFFSETS[_pattern_type] = _offset, _width, _attribute
+    _offset += _width
+WIDTH = _offset
+
+
+class Ternary:
+    """
+    A ternary bit vector over the packet header, matching every header whose
+    bits equal value wherever mask is set. Intersection, subsumption and
+    difference are exact bitwise operations.
+    """
+
+    __slots__ = ("value", "mask")
+
+    # the bits to match, zero wherever mask is clear
+    value: int
+    # the bits that must match - the others are wildcards
+    mask: int
+
+    def __init__(self, value: int = 0, mask: int = 0):
+        self.value = value & mask
+        self.mask = mask
+
+    @staticmethod
+    def from_rule(rule):
+        """
+        Get the header space a rule matches. Returns None if the rule's
+        patterns contradict each other, so it can match no packet.
+        """
+        value = 0
+        mask = 0
+        for pattern in rule.patterns:
+            offset, width, attribute = OFFSETS[type(pattern)]
+            field_value = getattr(pattern, attribute)
+            if type(pattern) == IPv4SrcPattern or type(pattern) == IPv4DstPattern:
+                field_mask = pattern.mask
+            else:
+                field_mask = (1 << width) - 1
+                if field_value >> width != 0:
+                    raise ValueError(
+                        f"{type(pattern).__name__} value {field_value} does not fit in {width} bits.")
+
+            field_value <<= offset
+            field_mask <<= offset
+            if (value ^ field_value) & mask & field_mask != 0:
+                return None
+            value |= field_value
+            mask |= field_mask
+
+        return Ternary(value, mask)
+
+    def intersects(self, other) -> bool:
+        """Returns whether any header matches both vectors."""
+        return (self.value ^ other.value) & self.mask & other.mask == 0
+
+    def intersection(self, other):
+        """Get the vector matching the headers both match, or None if there
+        are none."""
+        if not self.intersects(other):
+            return None
+        return Ternary(self.value | other.value, self.mask | other.mask)
+
+    def subsumes(self, other) -> bool:
+        """Returns whether every header matching other also matches this."""
+        return self.mask & ~other.mask == 0 and (self.value ^ other.value) & self.mask == 0
+
+    def subtract(self, other) -> list:
+        """
+        Get the headers matching this vector but not other, as a list of
+        disjoint vectors. Each bit other fixes that this leaves as a wildcard
+        splits off one vector, so there are at most that many.
+        """
+        if (self.value ^ other.value) & self.mask & other.mask:
+            return [self]
+
+        pieces = []
+        value = self.value
+        mask = self.mask
+        free = other.mask & ~self.mask
+        while free:
+            bit = free & -free
+            free ^= bit
+            # headers that differ from other at this bit, and agree with it
+            # at every bit split on before
+            pieces.append(Ternary(value | (~other.value & bit), mask | bit))
+            value |= other.value & bit
+            mask |= bit
+        return pieces
+
+
+def subtract(region: list, other: Ternary) -> list:
+    """Subtract a vector from a region given as a list of disjoint vectors."""
+    remaining = []
+    for cube in region:
+        remaining.extend(cube.subtract(other))
+    return remaining
+
+
+def is_shadowed(cube: Ternary, others: list, max_cubes: int = 1024) -> bool:
+    """
+    Returns whether every header matching cube also matches at least one of
+    the others. Returns False if the remaining region grows beyond max_cubes
+    vectors before the answer is known.
+    """
+    region = [cube]
+    for other in others:
+        region = subtract(region, other)
+        if len(region) == 0:
+            return True
+        if len(region) > max_cubes:
+            return False
+    return False
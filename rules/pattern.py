@@ -33,32 +33,48 @@ class IPv4SrcPattern (Pattern):
 
     ipv4_src: IPv4Network
 
+    # the prefix as 32-bit integers, precomputed for matching
+    network: int
+    mask: int
+    prefixlen: int
+
     def __init__(self, ipv4_src: IPv4Network):
         self.ipv4_src = ipv4_src
+        self.network = int(ipv4_src.network_address)
+        self.mask = int(ipv4_src.netmask)
+        self.prefixlen = ipv4_src.prefixlen
 
     def matches(self, packet: Packet) -> bool:
-        return packet.ipv4_src.subnet_of(self.ipv4_src)
+        return (packet.ipv4_src & self.mask) == self.network
 
     def intersects(self, pattern: Pattern) -> bool:
         if type(pattern) != type(self):
             return True
-        return self.ipv4_src.subnet_of(pattern.ipv4_src) or pattern.ipv4_src.subnet_of(self.ipv4_src)
+        return (self.network ^ pattern.network) & self.mask & pattern.mask == 0
 
 
 class IPv4DstPattern (Pattern):
 
     ipv4_dst: IPv4Network
 
-    def __init__(self, ipv4_dst):
+    # the prefix as 32-bit integers, precomputed for matching
+    network: int
+    mask: int
+    prefixlen: int
+
+    def __init__(self, ipv4_dst: IPv4Network):
         self.ipv4_dst = ipv4_dst
+        self.network = int(ipv4_dst.network_address)
+        self.mask = int(ipv4_dst.netmask)
+        self.prefixlen = ipv4_dst.prefixlen
 
     def matches(self, packet: Packet) -> bool:
-        return packet.ipv4_dst.subnet_of(self.ipv4_dst)
+        return (packet.ipv4_dst & self.mask) == self.network
 
     def intersects(self, pattern: Pattern) -> bool:
         if type(pattern) != type(self):
             return True
-        return self.ipv4_dst.subnet_of(pattern.ipv4_dst) or pattern.ipv4_dst.subnet_of(self.ipv4_dst)
+        return (self.network ^ pattern.network) & self.mask & pattern.mask == 0
 
 
 class TCPSPortPattern (Pattern):
@@ -1,7 +1,24 @@
+import threading
 from enum import Enum
 
 from rules.action import Action, ActionType, SoftwareSwitchAction
 from network.packet import Packet
+from rules.header_space import Ternary, is_shadowed
+
+
+# the next rule id to give out - ids increase in order of creation, and are
+# kept above every id given explicitly so the two never collide
+_next_id = 0
+_id_lock = threading.Lock()
+
+
+def _take_id(rule_id: int = None) -> int:
+    global _next_id
+    with _id_lock:
+        if rule_id is None:
+            rule_id = _next_id
+        _next_id = max(_next_id, rule_id + 1)
+    return rule_id
 
 
 class Rule:
@@ -10,14 +27,23 @@ class Rule:
     action: Action
     priority: int
 
+    # stable identifier - among rules of equal priority, the one with the
+    # highest id takes precedence
+    id: int
+
     counter: int
 
-    def __init__(self, patterns, action: Action, priority: int):
+    def __init__(self, patterns, action: Action, priority: int, rule_id: int = None):
         self.patterns = patterns
         self.action = action
         self.priority = priority
+        self.id = _take_id(rule_id)
         self.counter = 0
 
+    def sort_key(self) -> tuple:
+        """The key rule tables are sorted by - by priority, then by id."""
+        return self.priority, self.id
+
     def matches(self, packet: Packet) -> bool:
         for pattern in self.patterns:
             if not pattern.matches(packet):
@@ -34,8 +60,44 @@ class Rule:
                     return False
         return True
 
-    def increment_counter(self):
-        self.counter += 1
+    def subsumes(self, rule) -> bool:
+        """Returns whether every packet matching the given rule also matches
+        this rule. Rules holding values too wide for the header space cannot
+        be compared, and give False."""
+        try:
+            cube = Ternary.from_rule(rule)
+            if cube is None:
+                return True
+            own_cube = Ternary.from_rule(self)
+        except ValueError:
+            return False
+        return own_cube is not None and own_cube.subsumes(cube)
+
+    def is_shadowed_by(self, rules) -> bool:
+        """Returns whether every packet matching this rule also matches at
+        least one of the given rules. Rules holding values too wide for the
+        header space cannot be compared - this rule is then not shadowed, and
+        any of the given rules is skipped."""
+        try:
+            cube = Ternary.from_rule(self)
+        except ValueError:
+            return False
+        if cube is None:
+            return True
+
+        cubes = []
+        for rule in rules:
+            try:
+                other = Ternary.from_rule(rule)
+            except ValueError:
+                continue
+            if other is not None:
+                cubes.append(other)
+        return is_shadowed(cube, cubes)
+
+    def increment_counter(self, amount: int = 1):
+        self.counter += amount
 
     def create_cover_rule(self):
-        return Rule(self.patterns, SoftwareSwitchAction(), self.priority)
+        # the cover rule takes the rule's place, so it keeps the same id
+        return Rule(self.patterns, SoftwareSwitchAction(), self.priority, self.id)
@@ -0,0 +1,82 @@
+import json
+from ipaddress import IPv4Network
+from rules.rule import Rule
+from rules.action import ActionType, ControllerAction, DropAction, ForwardAction, \
+    SoftwareSwitchAction
+from rules.pattern import IPv4DstPattern, IPv4SrcPattern, InPortPattern, \
+    TCPDPortPattern, TCPSPortPattern
+
+
+# the attribute holding the value of each pattern type, which it is saved
+# under
+PATTERN_FIELDS = {
+    InPortPattern: "in_port",
+    IPv4SrcPattern: "ipv4_src",
+    IPv4DstPattern: "ipv4_dst",
+    TCPSPortPattern: "tcp_sport",
+    TCPDPortPattern: "tcp_dport",
+}
+
+PATTERN_TYPES = {field: pattern_type for pattern_type, field in PATTERN_FIELDS.items()}
+
+# the actions that take no arguments
+ACTION_TYPES = {
+    ActionType.DROP: DropAction,
+    ActionType.CONTROLLER: ControllerAction,
+    ActionType.SOFTWARE_SWITCH: SoftwareSwitchAction,
+}
+
+
+def rule_to_dict(rule: Rule) -> dict:
+    """Get a rule as a dictionary that can be written as JSON."""
+    patterns = []
+    for pattern in rule.patterns:
+        field = PATTERN_FIELDS[type(pattern)]
+        value = getattr(pattern, field)
+        if isinstance(value, IPv4Network):
+            value = str(value)
+        patterns.append({"field": field, "value": value})
+
+    action = {"type": rule.action.type.name}
+    if rule.action.type == ActionType.FORWARD:
+        action["port"] = rule.action.forward_port
+
+    return {"patterns": patterns, "action": action, "priority": rule.priority}
+
+
+def rule_from_dict(data: dict) -> Rule:
+    """Create a rule from a dictionary made by rule_to_dict."""
+    patterns = []
+    for pattern in data["patterns"]:
+        pattern_type = PATTERN_TYPES[pattern["field"]]
+        value = pattern["value"]
+        if pattern_type == IPv4SrcPattern or pattern_type == IPv4DstPattern:
+            value = IPv4Network(value)
+        patterns.append(pattern_type(value))
+
+    action_type = ActionType[data["action"]["type"]]
+    if action_type == ActionType.FORWARD:
+        action = ForwardAction(data["action"]["port"])
+    else:
+        action = ACTION_TYPES[action_type]()
+
+    return Rule(patterns, action, data["priority"])
+
+
+def write_rules(rules, path: str):
+    """
+    Write a rule table to a JSON file. Ids are not saved, but rules are
+    written in ascending order of Rule.sort_key, so rules of equal priority
+    keep their order when read back.
+    """
+    with open(path, "w") as f:
+        json.dump({"rules": [rule_to_dict(rule) for rule in sorted(rules, key=Rule.sort_key)]},
+                  f, indent=1)
+
+
+def read_rules(path: str) -> list:
+    """Read a rule table written by write_rules. Each rule is given a new
+    id."""
+    with open(path) as f:
+        data = json.load(f)
+    return [rule_from_dict(rule) for rule in data["rules"]]
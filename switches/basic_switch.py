@@ -1,27 +1,48 @@
+from collections import Counter
 from sortedcontainers import SortedKeyList
 from rules.rule import Rule
 from network.packet import Packet
 from rules.action import Action
 from switches.switch import Switch
+from switches.classifier import Classifier, LinearClassifier
+from switches.trie_classifier import TrieClassifier
+from switches.vector_classifier import VectorClassifier
+from switches.lookup_engine import LookupEngine
 
 
 class BasicSwitch (Switch):
 
     rules: SortedKeyList
 
-    def __init__(self):
-        self.rules = SortedKeyList([], key=lambda r: r.priority)
+    engine: LookupEngine
+    classifier: Classifier
+
+    def __init__(self, engine: LookupEngine = LookupEngine.LINEAR):
+        self.rules = SortedKeyList([], key=Rule.sort_key)
+
+        self.engine = engine
+        if engine == LookupEngine.TRIE:
+            self.classifier = TrieClassifier()
+        elif engine == LookupEngine.VECTOR:
+            self.classifier = VectorClassifier()
+        else:
+            self.classifier = LinearClassifier(self.rules)
 
     def add_rule(self, rule: Rule):
         self.rules.add(rule)
+        self.classifier.add_rule(rule)
 
     def remove_rule(self, rule: Rule):
         self.rules.remove(rule)
+        self.classifier.remove_rule(rule)
 
     def set_rules(self, new_rules: set):
-        self.rules = SortedKeyList([], key=lambda r: r.priority)
+        self.rules.clear()
+        self.classifier.clear()
+        # sorting the table in one go is cheaper than inserting each rule
+        self.rules.update(new_rules)
         for rule in new_rules:
-            self.rules.add(rule)
+            self.classifier.add_rule(rule)
 
     def _get_action(self, packet: Packet):
         """
@@ -29,14 +50,36 @@ class BasicSwitch (Switch):
         If no rule matches, this will return None.
         """
         action: Action = None
-        for rule in self.rules.__reversed__():
-            if rule.matches(packet):
-                action = rule.action
-                rule.increment_counter()
-                break
+        rule = self.match_rule(packet)
+        if rule is not None:
+            action = rule.action
 
         return action
 
+    def match_rule(self, packet: Packet) -> Rule:
+        """
+        Get the highest priority rule matching the packet and update its
+        counter. If no rule matches, this will return None.
+        """
+        rule = self.classifier.lookup(packet)
+        if rule is not None:
+            rule.increment_counter()
+        return rule
+
+    def match_rules(self, packets: list) -> list:
+        """
+        Get the highest priority matching rule for each packet in a batch,
+        updating the rule counters once per rule rather than once per packet.
+        Packets that match no rule get None.
+        """
+        rules = self.classifier.lookup_batch(packets)
+
+        for rule, count in Counter(rules).items():
+            if rule is not None:
+                rule.increment_counter(count)
+
+        return rules
+
     def packet_in(self, packet: Packet, port: int = None) -> Action:
         if port != None:
             packet.in_port = port
@@ -44,3 +87,11 @@ class BasicSwitch (Switch):
         action = self._get_action(packet)
 
         return action
+
+    def packets_in(self, packets: list, port: int = None) -> list:
+        """Send a batch of packets into the switch and get their actions."""
+        if port != None:
+            for packet in packets:
+                packet.in_port = port
+
+        return [None if rule is None else rule.action for rule in self.match_rules(packets)]
@@ -5,3 +5,5 @@ class CacheAlgorithm(Enum):
     DEPENDENT_SET = "Dependent Set"
     COVER_SET = "Cover Set"
     MIXED_SET = "Mixed Set"
+    LAZY_DEPENDENT_SET = "Lazy Dependent Set"
+    OPTIMAL = "Optimal"
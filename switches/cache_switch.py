@@ -1,11 +1,28 @@
+import heapq
 import logging
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
 from sortedcontainers import SortedKeyList
 from switches.switch import Switch
 from switches.basic_switch import BasicSwitch
+from switches.dependency_graph import DependencyGraph, bit_positions, to_bits
+from switches.flow_cache import FlowCache
+from switches.metrics import SwitchMetrics
+from switches.optimal_selection import select_optimal
+from switches.popularity import PopularityEstimator, CumulativeEstimator
+from switches.partitioned_switch import PartitionedSwitch
+from switches.refresh_scheduler import RefreshScheduler, PacketCountScheduler
+from switches.rule_compression import RuleCompressor
 from rules.rule import Rule
+from rules.rule_io import read_rules
+from switches.rule_transaction import RuleTransaction, apply_rules
+from switches.snapshot import read_snapshot, write_snapshot, take_snapshot, restore_snapshot
 from rules.action import Action, ActionType
 from network.packet import Packet
 from switches.cache_algorithm import CacheAlgorithm
+from switches.cache_switch_config import CacheSwitchConfig
 
 
 class CacheSwitch (Switch):
@@ -13,173 +30,374 @@ class CacheSwitch (Switch):
     name: str
     algorithm: CacheAlgorithm
 
+    # the optional features the switch was created with
+    config: CacheSwitchConfig
+
     hw_switch: BasicSwitch
     hw_switch_size: int
 
-    sw_switch: BasicSwitch
+    # a single software switch, or a PartitionedSwitch spreading the rules
+    # across several
+    sw_switch: Switch
+
+    # the rules currently installed in the hardware switch - cover_rules maps
+    # each covered rule to the cover rule installed for it
+    cached_rules: set
+    cover_rules: dict
 
+    # exact-match cache of recently seen flows, or None if disabled
+    flow_cache: FlowCache
+
+    # the rule table, sorted by Rule.sort_key, and each rule by its id
     all_rules: SortedKeyList
+    rules_by_id: dict
+
+    dependencies: DependencyGraph
+
+    # compresses the rules before the cache is selected from them, or None if
+    # disabled
+    compressor: RuleCompressor
+
+    # the table the cache is selected from, sorted by Rule.sort_key -
+    # all_rules, or its compressed copy
+    cache_table: SortedKeyList
+
+    scheduler: RefreshScheduler
+
+    # gives the rule weights the cache is selected by
+    popularity: PopularityEstimator
+
+    # search limit of the optimal algorithm, and the number of nodes it
+    # searched and whether it proved its selection optimal the last time
+    optimal_node_limit: int
+    last_optimal_search: tuple
+
+    # timing histograms, or None if disabled
+    metrics: SwitchMetrics
+
+    # whether every packet is logged
+    log_packets: bool
+
+    # background recomputation of the cache
+    background_refresh: bool
+    _executor: ThreadPoolExecutor
+    _refresh_future: Future
+    _refresh_snapshot: tuple
+    _refresh_requested: bool
+
+    # incremented whenever the rule table changes
+    _table_version: int
 
     num_packets: int
     num_misses: int
     num_hits: int
 
-    def __init__(self, name: str, algorithm: CacheAlgorithm, hw_switch_size: int):
-        """Create a new cache switch."""
+    num_cache_installs: int
+    num_flow_mods: int
+    last_flow_mods: int
+
+    # flow-mods sent for new and deleted rules since the last installation,
+    # which are counted into its last_flow_mods by the next one
+    _interim_flow_mods: int
+
+    # seconds taken by the last bulk load, or None if there has been none
+    last_load_time: float
+
+    # fraction of the table a committed batch may change before the graph is
+    # rebuilt from scratch rather than updated rule by rule
+    bulk_update_fraction: float
+
+    # held while packets are processed and while the table is updated, so
+    # packets never see a batch of updates half applied
+    _lock: threading.RLock
+
+    def __init__(self, name: str, algorithm: CacheAlgorithm, hw_switch_size: int,
+                 config: CacheSwitchConfig = None):
+        """
+        Create a new cache switch. The optional features - the lookup engine,
+        refresh scheduling, the flow cache, partitioned software switches,
+        metrics, popularity estimation, exact dependencies and rule
+        compression - are set in the config, which defaults to a plain cache
+        switch refreshed every ten packets.
+        """
         logging.info(
             f"[cache_switch][{name}] Creating a new cache switch.")
 
+        if config is None:
+            config = CacheSwitchConfig()
+
         self.name = name
         self.algorithm = algorithm
+        self.config = config
 
-        self.hw_switch = BasicSwitch()
+        self.hw_switch = BasicSwitch(config.lookup_engine)
         self.hw_switch_size = hw_switch_size
 
-        self.sw_switch = BasicSwitch()
+        if config.num_sw_switches > 1:
+            self.sw_switch = PartitionedSwitch(
+                config.num_sw_switches, config.sw_partition, config.lookup_engine)
+        else:
+            self.sw_switch = BasicSwitch(config.lookup_engine)
+
+        self.cached_rules = set()
+        self.cover_rules = dict()
+
+        self.flow_cache = None
+        if config.flow_cache_size > 0:
+            self.flow_cache = FlowCache(config.flow_cache_size)
 
         # ascending order of priority - iterate in reverse
-        self.all_rules = SortedKeyList([], key=lambda r: r.priority)
+        self.all_rules = SortedKeyList([], key=Rule.sort_key)
+        self.rules_by_id = dict()
+
+        self.compressor = None
+        self.cache_table = self.all_rules
+        if config.compress_rules:
+            self.compressor = RuleCompressor(self.all_rules)
+            self.cache_table = SortedKeyList([], key=Rule.sort_key)
+
+        self.dependencies = DependencyGraph(
+            self.cache_table, exact=config.exact_dependencies)
+
+        self.scheduler = config.scheduler
+        if self.scheduler is None:
+            self.scheduler = PacketCountScheduler(10)
+
+        self.popularity = config.popularity
+        if self.popularity is None:
+            self.popularity = CumulativeEstimator()
+
+        self.optimal_node_limit = 100000
+        self.last_optimal_search = None
+
+        self.metrics = config.metrics
+        self.log_packets = config.log_packets
+
+        self.background_refresh = config.background_refresh
+        self._executor = None
+        self._refresh_future = None
+        self._refresh_snapshot = None
+        self._refresh_requested = False
+        self._table_version = 0
 
         self.num_packets = 0
         self.num_hits = 0
         self.num_misses = 0
 
-    def _depends_on(self, a: int, b: int) -> bool:
-        """
-        Returns whether rule a depends on rule b. In other words, if a depends
-        b, then if a is cached, b must also be cached.
-        """
-        # b must have a higher priority, thus must be greater
-        if a >= b:
-            return False
+        self.num_cache_installs = 0
+        self.num_flow_mods = 0
+        self.last_flow_mods = 0
+        self._interim_flow_mods = 0
 
-        return self.all_rules[a].intersects(self.all_rules[b])
+        self.last_load_time = None
+        self.bulk_update_fraction = 0.25
+        self._lock = threading.RLock()
 
     def _construct_dependency_graph(self):
-        """Construct the dependency graph."""
+        """
+        Get the dependency graph. The graph is maintained incrementally as
+        rules are added and removed, so this only rebuilds the views when the
+        table has changed since the last call. Rules are indexed by their slot
+        in the graph, which stays the same while they are in the table.
+        """
         logging.info(
             f"[cache_switch][{self.name}] Constructing the dependency graph.")
 
-        # get a list of dependencies
-        # dependency_graph[i] is the set of rules that i directly depends on
-        dependency_graph = {}
-        # all_dependencies[i] is the set of all rules that i depends on - if i
-        # is cached these rules must also be cached
-        all_dependencies = {}
-        for i in reversed(range(len(self.all_rules))):
-            i_depends_on = set()
-            all_i_depends_on = set()
-            for j in reversed(range(i + 1, len(self.all_rules))):
-                # check if i depends on j
-                if self._depends_on(i, j):
-                    i_depends_on.add(j)
-                    all_i_depends_on.add(j)
-                    all_i_depends_on.update(all_dependencies[j])
-            dependency_graph[i] = i_depends_on
-            all_dependencies[i] = all_i_depends_on
-
-        return dependency_graph, all_dependencies
+        return self.dependencies.get_views()
 
     def _get_weights(self):
-        """Get the weights."""
+        """Get the weights, indexed by the slot of each rule in the
+        dependency graph. Free slots have no weight."""
         logging.info(f"[cache_switch][{self.name}] Getting weights.")
 
-        weights = []
-        for rule in self.all_rules:
-            weights.append(rule.counter)
-        return weights
+        weights = self.get_rule_weights()
+        return [weights.get(rule, 0) for rule in self.dependencies.slot_rules]
+
+    def get_rule_weights(self) -> dict:
+        """Get the weight of each rule the cache is selected from, as given
+        by the popularity estimator."""
+        return dict(zip(self.cache_table, self.popularity.get_weights(self.cache_table)))
 
-    def _update_cache_dependent_set(self):
+    def _select_dependent_set(self, weights: list, dependency_graph: dict, all_dependencies: dict):
         """
-        Updates the rules in the hardware switch cache using the dependent set
-        algorithm as described in the paper. This update function uses a basic 
-        algorithm that respects rule depencies but does not create new rules to 
-        cover groups of rarely used ones. 
+        Selects the rules to cache in the hardware switch using the dependent
+        set algorithm as described in the paper. This selection function uses a
+        basic algorithm that respects rule depencies but does not create new
+        rules to cover groups of rarely used ones. Returns the indices of the
+        rules to cache and of the rules to cover.
         """
         logging.info(
-            f"[cache_switch][{self.name}] Updating cached rules - dependent set.")
+            f"[cache_switch][{self.name}] Selecting cached rules - dependent set.")
 
-        dependency_graph, all_dependencies = self._construct_dependency_graph()
         # cost(i) = len(all_dependencies[i])
 
-        weights = self._get_weights()
-
-        logging.debug(f"[cache_switch][{self.name}] Dependency graph: " +
-                      str(dependency_graph))
-        logging.debug(f"[cache_switch][{self.name}] All dependencies: " +
-                      str(all_dependencies))
-        logging.debug(f"[cache_switch][{self.name}] Weights: " + str(weights))
+        logging.debug(f"[cache_switch][{self.name}] Dependency graph: %s",
+                      dependency_graph)
+        logging.debug(f"[cache_switch][{self.name}] All dependencies: %s",
+                      all_dependencies)
+        logging.debug(f"[cache_switch][{self.name}] Weights: %s", weights)
 
         # Heuristic for Budgeted Maximum Coverage Problem
 
         # In each stage we will choose a rule to add the maximizes the total
-        # weight of the set to the combined rule cost.
-        cached_rules = set()
+        # weight of the set to the combined rule cost. The cached rules are
+        # kept as a bitset, so the cost of a rule is the number of bits its
+        # dependencies add to it.
+        cached_rules = 0
+        num_cached = 0
         weight = 0
 
-        while len(cached_rules) < self.hw_switch_size:
-            to_add = set()
+        dependents = self._dependents(all_dependencies)
+        uncached_weights = self._uncached_weights(weights, all_dependencies)
+
+        while num_cached < self.hw_switch_size:
+            to_add = 0
             weight_to_add = 0
             ratio = -1
 
-            for i in range(len(self.all_rules)):
-                if i not in cached_rules:
-                    possible_to_add = {i}
-                    possible_weight_to_add = weights[i]
-                    for j in all_dependencies[i]:
-                        if j not in cached_rules:
-                            possible_to_add.add(j)
-                            possible_weight_to_add += weights[j]
+            for i in dependency_graph:
+                bit = 1 << i
+                if not cached_rules & bit:
+                    possible_to_add = all_dependencies[i] & ~cached_rules | bit
+                    cost = possible_to_add.bit_count()
 
                     # make sure we haven't exceeded the cost
-                    if (len(cached_rules) + len(possible_to_add) > self.hw_switch_size):
+                    if num_cached + cost > self.hw_switch_size:
                         continue
 
                     # check if this produces the best ratio so far
-                    new_ratio = (weight + possible_weight_to_add) / \
-                        (len(cached_rules) + len(possible_to_add))
+                    new_ratio = (weight + uncached_weights[i]) / \
+                        (num_cached + cost)
 
-                    if new_ratio > ratio and len(cached_rules) + len(to_add) <= self.hw_switch_size:
+                    if new_ratio > ratio:
                         to_add = possible_to_add
-                        weight_to_add = possible_weight_to_add
+                        weight_to_add = uncached_weights[i]
                         ratio = new_ratio
 
             if ratio == -1:
                 break
 
             # add the rules
-            cached_rules.update(to_add)
+            cached_rules |= to_add
+            num_cached += to_add.bit_count()
             weight += weight_to_add
+            self._update_uncached_weights(
+                uncached_weights, weights, dependents, to_add)
 
-        # update the caches
+        cached_rules = set(bit_positions(cached_rules))
+        logging.debug(
+            f"[cache_switch][{self.name}] New cache rules: %s", cached_rules)
+
+        return cached_rules, set()
+
+    @staticmethod
+    def _dependents(all_dependencies: list) -> list:
+        """Get the indices of all the rules that depend on each rule."""
+        dependents = [[] for _ in all_dependencies]
+        for i, i_depends_on in enumerate(all_dependencies):
+            for j in bit_positions(i_depends_on):
+                dependents[j].append(i)
+        return dependents
+
+    @staticmethod
+    def _uncached_weights(weights: list, all_dependencies: list) -> list:
+        """Get the weight of each rule along with all the rules it depends
+        on, while nothing is cached."""
+        return [weights[i] + sum(weights[j] for j in bit_positions(i_depends_on))
+                for i, i_depends_on in enumerate(all_dependencies)]
+
+    @staticmethod
+    def _update_uncached_weights(uncached_weights: list, weights: list, dependents: list,
+                                 newly_cached: int):
+        """Take the weights of newly cached rules out of the uncached weights
+        of the rules depending on them."""
+        for j in bit_positions(newly_cached):
+            for i in dependents[j]:
+                uncached_weights[i] -= weights[j]
+
+    def _select_lazy_dependent_set(self, weights: list, dependency_graph: dict, all_dependencies: dict):
+        """
+        Selects the rules to cache using a lazy greedy version of the dependent
+        set algorithm. Each step caches the rule whose uncached dependent set
+        has the highest weight per hardware entry, as in the budgeted maximum
+        coverage greedy. Scores are kept in a heap rather than being recomputed
+        for every rule on every step - caching a set of rules only changes the
+        scores of the rules that depend on them, so only those are rescored and
+        pushed again, and their older heap entries are skipped as stale when
+        popped. Returns the indices of the rules to cache and of the rules to
+        cover.
+        """
+        logging.info(
+            f"[cache_switch][{self.name}] Selecting cached rules - lazy dependent set.")
+
+        # dependents[j] is the list of all rules that depend on j
+        dependents = self._dependents(all_dependencies)
+        uncached_weights = self._uncached_weights(weights, all_dependencies)
+
+        cached_rules = 0
+        num_cached = 0
+        # version[i] is bumped whenever rule i's score changes
+        version = [0] * len(weights)
+
+        def score(i: int):
+            to_add = all_dependencies[i] & ~cached_rules | 1 << i
+            return uncached_weights[i] / to_add.bit_count(), to_add
+
+        heap = []
+        for i in dependency_graph:
+            ratio, to_add = score(i)
+            heap.append((-ratio, i, 0, to_add))
+        heapq.heapify(heap)
+
+        while len(heap) > 0 and num_cached < self.hw_switch_size:
+            _, i, i_version, to_add = heapq.heappop(heap)
+            if cached_rules >> i & 1 or i_version != version[i]:
+                continue
+
+            # the set only shrinks as dependencies are cached, which bumps the
+            # version, so a set that does not fit now can be dropped
+            cost = to_add.bit_count()
+            if num_cached + cost > self.hw_switch_size:
+                continue
+
+            cached_rules |= to_add
+            num_cached += cost
+            self._update_uncached_weights(
+                uncached_weights, weights, dependents, to_add)
+
+            affected = set()
+            for j in bit_positions(to_add):
+                affected.update(dependents[j])
+            for k in affected:
+                if not cached_rules >> k & 1:
+                    version[k] += 1
+                    ratio, k_to_add = score(k)
+                    heapq.heappush(heap, (-ratio, k, version[k], k_to_add))
+
+        cached_rules = set(bit_positions(cached_rules))
         logging.debug(
-            f"[cache_switch][{self.name}] New cache rules: " + str(cached_rules))
-        new_cache_rules = set()
-        for ind in cached_rules:
-            new_cache_rules.add(self.all_rules[ind])
+            f"[cache_switch][{self.name}] New cache rules: %s", cached_rules)
 
-        self.hw_switch.set_rules(new_cache_rules)
+        return cached_rules, set()
 
-    def _update_cache_cover_set(self):
+    def _select_cover_set(self, weights: list, dependency_graph: dict, all_dependencies: dict):
         """
-        This method updates the rules in the hardware switch cache using the 
-        cover set algorithm as described in the paper. Unlike the dependent-set 
-        algorithm, this algorithm does add new rules to the cache to cover 
-        groups of rarely used rules. 
+        This method selects the rules to cache in the hardware switch using the
+        cover set algorithm as described in the paper. Unlike the dependent-set
+        algorithm, this algorithm does add new rules to the cache to cover
+        groups of rarely used rules. Returns the indices of the rules to cache
+        and of the rules to cover.
         """
         logging.info(
-            f"[cache_switch][{self.name}] Updating cached rules - cover set.")
+            f"[cache_switch][{self.name}] Selecting cached rules - cover set.")
 
-        dependency_graph, all_dependencies = self._construct_dependency_graph()
         # cost(i) = len(all_dependencies[i])
 
-        weights = self._get_weights()
-
-        logging.debug(f"[cache_switch][{self.name}] Dependency graph: " +
-                      str(dependency_graph))
-        logging.debug(f"[cache_switch][{self.name}] All dependencies: " +
-                      str(all_dependencies))
-        logging.debug(f"[cache_switch][{self.name}] Weights: " + str(weights))
+        logging.debug(f"[cache_switch][{self.name}] Dependency graph: %s",
+                      dependency_graph)
+        logging.debug(f"[cache_switch][{self.name}] All dependencies: %s",
+                      all_dependencies)
+        logging.debug(f"[cache_switch][{self.name}] Weights: %s", weights)
 
         # Cache rules using cover-set algorithm
         cached_rules = set()
@@ -192,7 +410,7 @@ class CacheSwitch (Switch):
             to_add_cover = set()
             weight_to_add = -1
 
-            for i in range(len(self.all_rules)):
+            for i in dependency_graph:
                 if i not in cached_rules and weights[i] > weight_to_add:
                     # create the cover set
                     possible_to_add_cached = set()
@@ -223,191 +441,920 @@ class CacheSwitch (Switch):
             weight += weight_to_add
 
         logging.debug(
-            f"[cache_switch][{self.name}] New cache rules: " + str(cached_rules))
+            f"[cache_switch][{self.name}] New cache rules: %s", cached_rules)
         logging.debug(
-            f"[cache_switch][{self.name}] New cover rules: " + str(cover_rules))
-
-        new_cache_rules = set()
-        for ind in cached_rules:
-            new_cache_rules.add(self.all_rules[ind])
-        for ind in cover_rules:
-            new_cache_rules.add(self.all_rules[ind].create_cover_rule())
+            f"[cache_switch][{self.name}] New cover rules: %s", cover_rules)
 
-        self.hw_switch.set_rules(new_cache_rules)
+        return cached_rules, cover_rules
 
-    def _update_cache_mixed_set(self):
+    def _select_mixed_set(self, weights: list, dependency_graph: dict, all_dependencies: dict):
         """
-        This method updates the rules in the hardware switch cache using the 
+        This method selects the rules to cache in the hardware switch using the
         mixed set algorithm as described in the paper. This combines the use
         of cover rules from the cover-set algorithm with the greedy approach
-        of the dependent-set algorithm to achieve an implementation that 
-        attempts to capture the benefits of both algorithms. 
+        of the dependent-set algorithm to achieve an implementation that
+        attempts to capture the benefits of both algorithms. Returns the
+        indices of the rules to cache and of the rules to cover.
         """
         logging.info(
-            f"[cache_switch][{self.name}] Updating cached rules - mixed set.")
+            f"[cache_switch][{self.name}] Selecting cached rules - mixed set.")
 
-        dependency_graph, all_dependencies = self._construct_dependency_graph()
         # cost(i) = len(all_dependencies[i])
 
-        weights = self._get_weights()
-
-        logging.debug(f"[cache_switch][{self.name}] Dependency graph: " +
-                      str(dependency_graph))
-        logging.debug(f"[cache_switch][{self.name}] All dependencies: " +
-                      str(all_dependencies))
-        logging.debug(f"[cache_switch][{self.name}] Weights: " + str(weights))
-
-        # Cache rules using mixed-set algorithm
-        cached_rules = set()
-        cover_rules = set()
+        logging.debug(f"[cache_switch][{self.name}] Dependency graph: %s",
+                      dependency_graph)
+        logging.debug(f"[cache_switch][{self.name}] All dependencies: %s",
+                      all_dependencies)
+        logging.debug(f"[cache_switch][{self.name}] Weights: %s", weights)
+
+        # Cache rules using mixed-set algorithm - the cached and cover rules
+        # are kept as bitsets
+        cached_rules = 0
+        cover_rules = 0
+        num_used = 0
         weight = 0
 
-        while len(cached_rules) + len(cover_rules) < self.hw_switch_size:
-            to_add_cached = set()
-            to_remove_cover = set()
-            to_add_cover = set()
+        dependents = self._dependents(all_dependencies)
+        uncached_weights = self._uncached_weights(weights, all_dependencies)
+        direct_dependencies = {i: to_bits(i_depends_on)
+                               for i, i_depends_on in dependency_graph.items()}
+
+        while num_used < self.hw_switch_size:
+            to_add_cached = 0
+            to_remove_cover = 0
+            to_add_cover = 0
             weight_to_add = 0
             ratio = -1
 
-            for i in range(len(self.all_rules)):
+            for i in dependency_graph:
+                bit = 1 << i
+                if cached_rules & bit:
+                    continue
 
                 # dependent set part
-                if i not in cached_rules:
-                    # create dependent set
-                    possible_to_add_cached = {i}
-                    possible_to_remove_cover = set()
-                    if i in cover_rules:
-                        possible_to_remove_cover.add(i)
-                    possible_to_add_cover = set()
-                    possible_weight_to_add = weights[i]
+                possible_to_add_cached = all_dependencies[i] & ~cached_rules | bit
+                possible_to_remove_cover = possible_to_add_cached & cover_rules
+                cost = num_used + possible_to_add_cached.bit_count() - \
+                    possible_to_remove_cover.bit_count()
 
-                    for j in all_dependencies[i]:
-                        if j not in cached_rules:
-                            possible_to_add_cached.add(j)
-                            if j in cover_rules:
-                                possible_to_remove_cover.add(j)
-                            possible_weight_to_add += weights[j]
+                # make sure we havent exceeded the cost
+                if cost > self.hw_switch_size:
+                    continue
 
-                    # make sure we havent exceeded the cost
-                    if len(cached_rules) + len(cover_rules) + len(possible_to_add_cached) - len(possible_to_remove_cover) + len(possible_to_add_cover) > self.hw_switch_size:
-                        continue
+                new_ratio = (weight + uncached_weights[i]) / cost
+                if new_ratio > ratio:
+                    to_add_cached = possible_to_add_cached
+                    to_remove_cover = possible_to_remove_cover
+                    to_add_cover = 0
+                    weight_to_add = uncached_weights[i]
+                    ratio = new_ratio
 
-                    new_ratio = (weight + possible_weight_to_add) / (len(cached_rules) + len(cover_rules) + len(
-                        possible_to_add_cached) + len(possible_to_add_cover) - len(possible_to_remove_cover))
+                # cover set part
+                possible_to_remove_cover = bit & cover_rules
+                possible_to_add_cover = direct_dependencies[i]
+                cost = num_used + 1 - possible_to_remove_cover.bit_count() + \
+                    possible_to_add_cover.bit_count()
+
+                # make sure we havent exceeded the cost
+                if cost > self.hw_switch_size:
+                    continue
+
+                new_ratio = (weight + weights[i]) / cost
+                if new_ratio > ratio:
+                    to_add_cached = bit
+                    to_remove_cover = possible_to_remove_cover
+                    to_add_cover = possible_to_add_cover
+                    weight_to_add = weights[i]
+                    ratio = new_ratio
 
-                    if new_ratio > ratio:
-                        to_add_cached = possible_to_add_cached
-                        to_remove_cover = possible_to_remove_cover
-                        to_add_cover = possible_to_add_cover
-                        weight_to_add = possible_weight_to_add
-                        ratio = new_ratio
+            if ratio == -1:
+                break
 
-                # cover set part
-                if i not in cached_rules:
-                    # create the cover set
-                    possible_to_add_cached = set()
-                    possible_to_remove_cover = set()
-                    possible_to_add_cover = set()
-                    possible_weight_to_add = weights[i]
+            self._update_uncached_weights(
+                uncached_weights, weights, dependents, to_add_cached & ~cached_rules)
+            cached_rules |= to_add_cached
+            cover_rules = cover_rules & ~to_remove_cover | to_add_cover
+            num_used = cached_rules.bit_count() + cover_rules.bit_count()
+            weight += weight_to_add
 
-                    possible_to_add_cached.add(i)
-                    if i in cover_rules:
-                        possible_to_remove_cover.add(i)
-                    possible_to_add_cover.update(dependency_graph[i])
+        cached_rules = set(bit_positions(cached_rules))
+        cover_rules = set(bit_positions(cover_rules))
+        logging.debug(
+            f"[cache_switch][{self.name}] New cache rules: %s", cached_rules)
+        logging.debug(
+            f"[cache_switch][{self.name}] New cover rules: %s", cover_rules)
 
-                    # make sure we havent exceeded the cost
-                    if len(cached_rules) + len(cover_rules) + len(possible_to_add_cached) - len(possible_to_remove_cover) + len(possible_to_add_cover) > self.hw_switch_size:
-                        continue
+        return cached_rules, cover_rules
 
-                    new_ratio = (weight + possible_weight_to_add) / (len(cached_rules) + len(cover_rules) + len(
-                        possible_to_add_cached) + len(possible_to_add_cover) - len(possible_to_remove_cover))
+    def _select_optimal(self, weights: list, dependency_graph: dict, all_dependencies: dict):
+        """
+        Selects the rules to cache that cover the most weight, searching by
+        branch and bound from the mixed set selection. This is meant for
+        offline planning on modest tables - the search is exponential in the
+        worst case, so it stops after optimal_node_limit nodes with the best
+        selection found. Returns the indices of the rules to cache and of the
+        rules to cover.
+        """
+        logging.info(
+            f"[cache_switch][{self.name}] Selecting cached rules - optimal.")
+
+        incumbent, _ = self._select_mixed_set(
+            weights, dependency_graph, all_dependencies)
+        cached_rules, cover_rules, nodes, proven = select_optimal(
+            weights, dependency_graph, self.hw_switch_size,
+            self.optimal_node_limit, incumbent)
+        self.last_optimal_search = nodes, proven
+
+        if not proven:
+            logging.warning(
+                f"[cache_switch][{self.name}] Optimal search stopped after {nodes} nodes.")
+        logging.debug(
+            f"[cache_switch][{self.name}] New cache rules: %s", cached_rules)
+        logging.debug(
+            f"[cache_switch][{self.name}] New cover rules: %s", cover_rules)
 
-                    if new_ratio > ratio:
-                        to_add_cached = possible_to_add_cached
-                        to_remove_cover = possible_to_remove_cover
-                        to_add_cover = possible_to_add_cover
-                        weight_to_add = possible_weight_to_add
-                        ratio = new_ratio
+        return cached_rules, cover_rules
 
-            if ratio == -1:
-                break
+    def _select_cache(self, weights: list, dependency_graph: dict, all_dependencies: dict):
+        """
+        Select the rules to cache using the switch's algorithm. This only reads
+        its arguments and the switch's configuration, so it is safe to run on a
+        worker thread against a snapshot of the table.
+        """
+        if self.metrics is not None:
+            start = time.perf_counter_ns()
+            selection = self._select_cache_with_algorithm(
+                self.algorithm, weights, dependency_graph, all_dependencies)
+            self.metrics.record_refresh(
+                self.algorithm, self.name, time.perf_counter_ns() - start)
+            return selection
+
+        return self._select_cache_with_algorithm(
+            self.algorithm, weights, dependency_graph, all_dependencies)
+
+    def _select_cache_with_algorithm(self, algorithm: CacheAlgorithm, weights: list,
+                                     dependency_graph: dict, all_dependencies: dict):
+        if algorithm == CacheAlgorithm.DEPENDENT_SET:
+            return self._select_dependent_set(weights, dependency_graph, all_dependencies)
+        elif algorithm == CacheAlgorithm.COVER_SET:
+            return self._select_cover_set(weights, dependency_graph, all_dependencies)
+        elif algorithm == CacheAlgorithm.MIXED_SET:
+            return self._select_mixed_set(weights, dependency_graph, all_dependencies)
+        elif algorithm == CacheAlgorithm.LAZY_DEPENDENT_SET:
+            return self._select_lazy_dependent_set(weights, dependency_graph, all_dependencies)
+        elif algorithm == CacheAlgorithm.OPTIMAL:
+            return self._select_optimal(weights, dependency_graph, all_dependencies)
+        return set(), set()
+
+    def _install_cache(self, rules, cached_rules: set, cover_rules: set):
+        """
+        Install the selected rules, given as indices into rules, in the
+        hardware switch. Only the difference from the current cache is
+        applied, with each rule inserted or deleted counting as one flow-mod.
+        A rule that is cached does not also need a cover rule.
+        """
+        if self.metrics is not None:
+            start = time.perf_counter_ns()
 
-            cached_rules.update(to_add_cached)
-            cover_rules.difference_update(to_remove_cover)
-            cover_rules.update(to_add_cover)
-            weight += weight_to_add
+        new_cached = {rules[ind] for ind in cached_rules}
+        new_covered = {rules[ind] for ind in cover_rules}
+        new_covered.difference_update(new_cached)
+
+        flow_mods = 0
+
+        # delete before inserting so the table never exceeds its size
+        for rule in self.cached_rules - new_cached:
+            self.hw_switch.remove_rule(rule)
+            flow_mods += 1
+        for rule in self.cover_rules.keys() - new_covered:
+            self.hw_switch.remove_rule(self.cover_rules.pop(rule))
+            flow_mods += 1
+
+        for rule in new_cached - self.cached_rules:
+            self.hw_switch.add_rule(rule)
+            flow_mods += 1
+        for rule in new_covered - self.cover_rules.keys():
+            cover_rule = rule.create_cover_rule()
+            self.cover_rules[rule] = cover_rule
+            self.hw_switch.add_rule(cover_rule)
+            flow_mods += 1
+
+        self.cached_rules = new_cached
+
+        if flow_mods > 0:
+            self._invalidate_flows()
 
         logging.debug(
-            f"[cache_switch][{self.name}] New cache rules: " + str(cached_rules))
-        logging.debug(
-            f"[cache_switch][{self.name}] New cover rules: " + str(cover_rules))
+            f"[cache_switch][{self.name}] Cache update used {flow_mods} flow-mods.")
 
-        new_cache_rules = set()
-        for ind in cached_rules:
-            new_cache_rules.add(self.all_rules[ind])
-        for ind in cover_rules:
-            new_cache_rules.add(self.all_rules[ind].create_cover_rule())
+        self.num_cache_installs += 1
+        self.num_flow_mods += flow_mods
+        self.last_flow_mods = flow_mods + self._interim_flow_mods
+        self._interim_flow_mods = 0
 
-        self.hw_switch.set_rules(new_cache_rules)
+        if self.metrics is not None:
+            self.metrics.record_install(
+                self.name, time.perf_counter_ns() - start)
 
     def _update_cache(self):
         logging.info(f"[cache_switch][{self.name}] Updating the cache.")
-        # [TODO] Add ability to use other cache algorithms.
-        if self.algorithm == CacheAlgorithm.DEPENDENT_SET:
-            self._update_cache_dependent_set()
-        elif self.algorithm == CacheAlgorithm.COVER_SET:
-            self._update_cache_cover_set()
-        elif self.algorithm == CacheAlgorithm.MIXED_SET:
-            self._update_cache_mixed_set()
+
+        if self.background_refresh:
+            self._start_background_refresh()
+            return
+
+        dependency_graph, all_dependencies = self._construct_dependency_graph()
+        weights = self._get_weights()
+        self.popularity.refreshed(self.cache_table)
+        cached_rules, cover_rules = self._select_cache(
+            weights, dependency_graph, all_dependencies)
+        self._install_cache(self.dependencies.slot_rules, cached_rules, cover_rules)
+
+        self.scheduler.refreshed(self)
+
+    def _start_background_refresh(self):
+        """
+        Start recomputing the cache on the worker thread from a snapshot of the
+        rules and their weights. If a recomputation is already running, another
+        one is started as soon as it finishes.
+        """
+        if self._refresh_future is not None:
+            self._refresh_requested = True
+            return
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix=f"cache_switch_{self.name}")
+
+        dependency_graph, all_dependencies = self._construct_dependency_graph()
+        weights = self._get_weights()
+        self.popularity.refreshed(self.cache_table)
+        self._refresh_snapshot = list(self.dependencies.slot_rules), self._table_version
+        self._refresh_requested = False
+        self._refresh_future = self._executor.submit(
+            self._select_cache, weights, dependency_graph, all_dependencies)
+
+        self.scheduler.refreshed(self)
+
+    def _poll_background_refresh(self, wait: bool = False):
+        """
+        Swap in the result of a finished background recomputation. Packets are
+        served from the old cache until then. Results computed from a table that
+        has since changed are discarded and recomputed.
+        """
+        future = self._refresh_future
+        if future is None or not (wait or future.done()):
+            return
+
+        cached_rules, cover_rules = future.result()
+        rules, version = self._refresh_snapshot
+        self._refresh_future = None
+        self._refresh_snapshot = None
+
+        if version == self._table_version:
+            logging.info(
+                f"[cache_switch][{self.name}] Installing the background cache update.")
+            self._install_cache(rules, cached_rules, cover_rules)
+        else:
+            self._refresh_requested = True
+
+        if self._refresh_requested:
+            self._start_background_refresh()
+
+    def wait_for_refresh(self):
+        """Block until any background recomputations have been installed."""
+        with self._lock:
+            while self._refresh_future is not None:
+                self._poll_background_refresh(wait=True)
+
+    def close(self):
+        """Stop the background refresh worker, if there is one."""
+        self.wait_for_refresh()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def _classify(self, packet: Packet) -> tuple:
+        """
+        Look the packet up in the hardware switch, and in the software switch
+        if it misses. Returns the matching hardware rule, the matching software
+        rule, and whether the packet missed the cache.
+        """
+        # check if the packet matches in the hardware switch
+        hw_rule = self.hw_switch.match_rule(packet)
+
+        # check if we need to go to a software switch
+        if hw_rule is None or hw_rule.action.type == ActionType.SOFTWARE_SWITCH:
+            return hw_rule, self.sw_switch.match_rule(packet), True
+
+        return hw_rule, None, False
+
+    def _classify_timed(self, packet: Packet) -> tuple:
+        """Classify a packet as _classify does, timing each table lookup."""
+        start = time.perf_counter_ns()
+        hw_rule = self.hw_switch.match_rule(packet)
+        self.metrics.record_lookup(
+            True, self.name, time.perf_counter_ns() - start)
+
+        if hw_rule is None or hw_rule.action.type == ActionType.SOFTWARE_SWITCH:
+            start = time.perf_counter_ns()
+            sw_rule = self.sw_switch.match_rule(packet)
+            self.metrics.record_lookup(
+                False, self.name, time.perf_counter_ns() - start)
+            return hw_rule, sw_rule, True
+
+        return hw_rule, None, False
+
+    @staticmethod
+    def _replay_counters(entry: tuple):
+        """Update the counters of the rules a flow cache entry matched, as if
+        the packet had been looked up in the tables."""
+        hw_rule, sw_rule, _ = entry
+        if hw_rule is not None:
+            hw_rule.increment_counter()
+        if sw_rule is not None:
+            sw_rule.increment_counter()
+
+    def _invalidate_flows(self):
+        if self.flow_cache is not None:
+            self.flow_cache.clear()
 
     def packet_in(self, packet: Packet, port: int) -> Action:
-        logging.info(
-            f"[cache_switch][{self.name}] Cache switch received a packet - " + str(packet))
+        with self._lock:
+            return self._packet_in(packet, port)
+
+    def _packet_in(self, packet: Packet, port: int) -> Action:
+        if self.log_packets:
+            logging.info(
+                f"[cache_switch][{self.name}] Cache switch received a packet - {packet}")
 
         packet.in_port = port
 
-        # check if the packet matches in the hardware switch
-        action = self.hw_switch.packet_in(packet)
+        if self._refresh_future is not None:
+            self._poll_background_refresh()
+
+        classify = self._classify
+        if self.metrics is not None and self.metrics.sample():
+            classify = self._classify_timed
+
+        if self.flow_cache is None:
+            hw_rule, sw_rule, miss = classify(packet)
+        else:
+            key = FlowCache.key(packet)
+            entry = self.flow_cache.get(key)
+            if entry is None:
+                entry = classify(packet)
+                self.flow_cache.put(key, entry)
+            else:
+                self._replay_counters(entry)
+            hw_rule, sw_rule, miss = entry
+
         self.num_packets += 1
 
-        # check if we need to go to a software switch
-        if action == None or action.type == ActionType.SOFTWARE_SWITCH:
-            action = self.sw_switch.packet_in(packet)
+        if miss:
+            action = None if sw_rule is None else sw_rule.action
             self.num_misses += 1
         else:
+            action = hw_rule.action
             self.num_hits += 1
 
-        if self.num_packets % 10 == 0:
+        if self.popularity.observes_packets or self.scheduler.observes_packets:
+            rule = sw_rule if miss else hw_rule
+            if miss and self.compressor is not None:
+                rule = self.compressor.representative.get(rule)
+            if rule is not None:
+                self._observe(rule, 1)
+
+        if self.scheduler.should_refresh(self, 1):
             self._update_cache()
 
         return action
 
+    def _observe(self, rule: Rule, count: int):
+        """Pass the rule count packets matched to whichever of the popularity
+        estimator and the scheduler want to see every packet."""
+        if self.popularity.observes_packets:
+            self.popularity.observe(rule, count)
+        if self.scheduler.observes_packets:
+            self.scheduler.observe(rule, count)
+
+    def packets_in(self, packets: list, port: int = None) -> list:
+        """
+        Process a batch of packets. The whole batch is classified against the
+        hardware table first, and only the misses are then sent to the software
+        switch in a single pass. Packets of flows held in the flow cache skip
+        both tables. The cache is refreshed at most once per batch, after the
+        batch has been processed.
+        """
+        with self._lock:
+            return self._packets_in(packets, port)
+
+    def _packets_in(self, packets: list, port: int = None) -> list:
+        if self.log_packets:
+            logging.info(
+                f"[cache_switch][{self.name}] Cache switch received a batch of {len(packets)} packets.")
+
+        timed = self.metrics is not None and self.metrics.sample()
+
+        if port != None:
+            for packet in packets:
+                packet.in_port = port
+
+        if self._refresh_future is not None:
+            self._poll_background_refresh()
+
+        # entries[i] = hardware rule, software rule, miss for packet i
+        entries = [None] * len(packets)
+        keys = None
+        if self.flow_cache is None:
+            pending = range(len(packets))
+            lookup_packets = packets
+        else:
+            keys = [FlowCache.key(packet) for packet in packets]
+            for i, key in enumerate(keys):
+                entry = self.flow_cache.get(key)
+                if entry is not None:
+                    self._replay_counters(entry)
+                    entries[i] = entry
+            pending = [i for i, entry in enumerate(entries) if entry is None]
+            lookup_packets = [packets[i] for i in pending]
+
+        if timed:
+            start = time.perf_counter_ns()
+        hw_rules = self.hw_switch.match_rules(lookup_packets)
+        if timed and len(lookup_packets) > 0:
+            self.metrics.record_lookup(
+                True, self.name, time.perf_counter_ns() - start, len(lookup_packets))
+
+        sw_rules = [None] * len(hw_rules)
+        misses = [k for k, rule in enumerate(hw_rules)
+                  if rule is None or rule.action.type == ActionType.SOFTWARE_SWITCH]
+        if len(misses) > 0:
+            if timed:
+                start = time.perf_counter_ns()
+            matched = self.sw_switch.match_rules(
+                [lookup_packets[k] for k in misses])
+            if timed:
+                self.metrics.record_lookup(
+                    False, self.name, time.perf_counter_ns() - start, len(misses))
+            for k, rule in zip(misses, matched):
+                sw_rules[k] = rule
+
+        missed = set(misses)
+        for k, i in enumerate(pending):
+            entries[i] = hw_rules[k], sw_rules[k], k in missed
+            if keys is not None:
+                self.flow_cache.put(keys[i], entries[i])
+
+        actions = []
+        num_misses = 0
+        for hw_rule, sw_rule, miss in entries:
+            if miss:
+                actions.append(None if sw_rule is None else sw_rule.action)
+                num_misses += 1
+            else:
+                actions.append(hw_rule.action)
+
+        if self.popularity.observes_packets or self.scheduler.observes_packets:
+            representative = dict()
+            if self.compressor is not None:
+                representative = self.compressor.representative
+            matched = Counter(representative.get(sw_rule, sw_rule) if miss else hw_rule
+                              for hw_rule, sw_rule, miss in entries)
+            for rule, count in matched.items():
+                if rule is not None:
+                    self._observe(rule, count)
+
+        self.num_packets += len(packets)
+        self.num_misses += num_misses
+        self.num_hits += len(packets) - num_misses
+
+        if self.scheduler.should_refresh(self, len(packets)):
+            self._update_cache()
+
+        return actions
+
     def add_rule(self, rule: Rule):
+        with self._lock:
+            self._insert_rule(rule)
+            self._update_cache()
+
+    def remove_rule(self, rule: Rule):
+        with self._lock:
+            self._delete_rule(rule)
+            self._update_cache()
+
+    def transaction(self) -> RuleTransaction:
+        """
+        Start a transaction, staging rule updates to apply together. Used as a
+        context manager, it commits when the block exits, or discards the
+        updates if the block raises.
+        """
+        return RuleTransaction(self)
+
+    def commit_rules(self, added: list, removed: list):
+        """
+        Add and remove a batch of rules, recomputing the cache once for the
+        whole batch rather than after every rule. Packets are not processed
+        while the batch is applied, so they see the table as it was before or
+        after it. Batches changing more than bulk_update_fraction of the table
+        rebuild the dependency graph from scratch, as set_rules does, which is
+        cheaper than updating it rule by rule.
+        """
+        logging.info(
+            f"[cache_switch][{self.name}] Committing {len(added)} added and {len(removed)} removed rules.")
+
+        with self._lock:
+            apply_rules(self, added, removed)
+
+    def _insert_rule(self, rule: Rule):
+        """Add a rule to the tables without recomputing the cache."""
         logging.info(
             f"[cache_switch][{self.name}] Adding a rule to the cache_switch.")
 
+        if rule.id in self.rules_by_id:
+            raise ValueError(f"A rule with id {rule.id} is already in the table.")
+
         self.all_rules.add(rule)
+        self.rules_by_id[rule.id] = rule
         self.sw_switch.add_rule(rule)
+        self._table_version += 1
+        self._invalidate_flows()
 
-        self._update_cache()
+        if self.compressor is None:
+            self.dependencies.add_rule(rule)
+            if self.background_refresh:
+                self._cover_new_rule(rule)
+        else:
+            self._update_compressed(*self.compressor.add_rule(rule))
 
-    def remove_rule(self, rule: Rule):
+    def _delete_rule(self, rule: Rule):
+        """Remove a rule from the tables without recomputing the cache."""
         logging.info(
             f"[cache_switch][{self.name}] Removing a rule from the cache_switch.")
 
-        self.all_rules.add(rule)
+        if self.compressor is None:
+            dependencies = self._cached_dependencies()
+            self.dependencies.remove_rule(rule)
+        self.all_rules.remove(rule)
+        del self.rules_by_id[rule.id]
         self.sw_switch.remove_rule(rule)
+        self._table_version += 1
+        self._invalidate_flows()
+
+        if self.compressor is None:
+            self._evict_rule(rule)
+            self._cover_new_dependencies(dependencies)
+        else:
+            self._update_compressed(*self.compressor.remove_rule(rule))
 
-        self._update_cache()
+    def get_rule(self, rule_id: int) -> Rule:
+        """Get the rule in the table with the given id, or None."""
+        return self.rules_by_id.get(rule_id)
+
+    def _update_compressed(self, removed: set, added: set):
+        """
+        Apply a change to the compressed table. Compressed rules that have
+        left it are evicted from the hardware switch, and new ones are covered
+        as new rules are until the cache is recomputed.
+        """
+        dependencies = self._cached_dependencies()
+        for rule in removed:
+            self.dependencies.remove_rule(rule)
+            self.cache_table.remove(rule)
+            self._evict_rule(rule)
+        self._cover_new_dependencies(dependencies)
+
+        for rule in sorted(added, key=Rule.sort_key):
+            self.cache_table.add(rule)
+            self.dependencies.add_rule(rule)
+            if self.background_refresh:
+                self._cover_new_rule(rule)
+
+    def _cover_new_rule(self, rule: Rule):
+        """
+        Until the cache is recomputed, packets matching a new rule could hit a
+        cached rule below it instead. If any cached rule overlaps the new
+        rule, a cover rule is installed for it so those packets are sent to the
+        software switch. When the hardware table is full, the overlapping
+        cached rules are replaced by their cover rules instead, which keeps
+        the table at its size.
+        """
+        overlapping = [cached_rule for cached_rule in self.cached_rules
+                       if cached_rule.sort_key() < rule.sort_key()
+                       and cached_rule.intersects(rule)]
+        if len(overlapping) == 0:
+            return
+
+        if len(self.cached_rules) + len(self.cover_rules) < self.hw_switch_size:
+            cover_rule = rule.create_cover_rule()
+            self.cover_rules[rule] = cover_rule
+            self.hw_switch.add_rule(cover_rule)
+            self._count_interim_flow_mods(1)
+            return
+
+        self._replace_with_covers(overlapping)
+
+    def _replace_with_covers(self, cached_rules):
+        """Replace cached rules by their cover rules, which takes no more room
+        in the hardware table."""
+        for cached_rule in cached_rules:
+            self.cached_rules.discard(cached_rule)
+            self.hw_switch.remove_rule(cached_rule)
+            cover_rule = cached_rule.create_cover_rule()
+            self.cover_rules[cached_rule] = cover_rule
+            self.hw_switch.add_rule(cover_rule)
+        self._count_interim_flow_mods(2 * len(cached_rules))
+
+    def _cached_dependencies(self) -> dict:
+        """
+        Get the direct dependencies of every cached rule before rules are
+        removed, if removing them can give cached rules new dependencies that
+        _cover_new_dependencies must protect. Otherwise returns an empty dict.
+        """
+        if not (self.background_refresh and self.dependencies.exact):
+            return dict()
+        return {cached_rule: set(self.dependencies.direct[cached_rule])
+                for cached_rule in self.cached_rules}
 
-    def set_rules(self, rules: set):
+    def _cover_new_dependencies(self, dependencies: dict):
+        """
+        With exact dependencies, a cached rule does not depend on a higher rule
+        whose overlap with it is matched by a rule in between. Once that rule
+        is removed, packets of the higher rule would hit the cached rule until
+        the cache is recomputed. Each such new dependency that is not in the
+        hardware switch gets a cover rule, and when the hardware table has no
+        room for them, the cached rules that gained them are replaced by their
+        cover rules instead.
+        """
+        missing = dict()
+        for cached_rule, direct in dependencies.items():
+            if cached_rule not in self.cached_rules:
+                continue
+            for higher in self.dependencies.direct[cached_rule] - direct:
+                if higher not in self.cached_rules and higher not in self.cover_rules:
+                    missing.setdefault(higher, set()).add(cached_rule)
+        if len(missing) == 0:
+            return
+
+        if len(self.cached_rules) + len(self.cover_rules) + len(missing) <= self.hw_switch_size:
+            for higher in missing:
+                cover_rule = higher.create_cover_rule()
+                self.cover_rules[higher] = cover_rule
+                self.hw_switch.add_rule(cover_rule)
+            self._count_interim_flow_mods(len(missing))
+            return
+
+        self._replace_with_covers(set().union(*missing.values()))
+
+    def _evict_rule(self, rule: Rule):
+        """
+        Remove a deleted rule from the hardware switch straight away. Without
+        exact dependencies, any cached rule that overlapped it also depends on
+        every other rule it overlaps, so the remaining cache stays correct.
+        With them, _cover_new_dependencies must be called once the graph has
+        been updated.
+        """
+        if rule in self.cached_rules:
+            self.cached_rules.discard(rule)
+            self.hw_switch.remove_rule(rule)
+            self._count_interim_flow_mods(1)
+        if rule in self.cover_rules:
+            self.hw_switch.remove_rule(self.cover_rules.pop(rule))
+            self._count_interim_flow_mods(1)
+
+    def _count_interim_flow_mods(self, flow_mods: int):
+        """Count flow-mods sent to the hardware switch between installations."""
+        self.num_flow_mods += flow_mods
+        self._interim_flow_mods += flow_mods
+
+    def set_rules(self, rules: list) -> float:
+        """
+        Replace the rule table with the given rules. Unlike adding them one at
+        a time, the tables are filled in one pass, the dependency graph (and
+        compressed table) is built once and the cache is refreshed once.
+        Cached rules that have left the table are evicted straight away.
+        Returns the time taken in seconds, which is also kept in
+        last_load_time.
+        """
         logging.info(
             f"[cache_switch][{self.name}] Setting the rules for the cache switch.")
 
-        # [TODO]
-        pass
+        with self._lock:
+            start = time.perf_counter()
+
+            rules_by_id = dict()
+            for rule in rules:
+                if rule.id in rules_by_id:
+                    raise ValueError(f"More than one rule has id {rule.id}.")
+                rules_by_id[rule.id] = rule
+
+            old_table = set(self.cache_table)
+            dependencies = self._cached_dependencies()
+
+            self.all_rules.clear()
+            self.all_rules.update(rules_by_id.values())
+            self.rules_by_id = rules_by_id
+            self.sw_switch.set_rules(self.all_rules)
+            self._table_version += 1
+            self._invalidate_flows()
+
+            if self.compressor is not None:
+                self.compressor = RuleCompressor(self.all_rules, self.compressor.max_cubes)
+                self.cache_table.clear()
+                self.cache_table.update(self.compressor.compressed)
+            self.dependencies = DependencyGraph(
+                self.cache_table, exact=self.dependencies.exact,
+                max_cubes=self.dependencies.max_cubes)
+
+            for rule in old_table.difference(self.cache_table):
+                self._evict_rule(rule)
+            self._cover_new_dependencies(dependencies)
+            if self.background_refresh:
+                for rule in self.cache_table:
+                    if rule not in old_table:
+                        self._cover_new_rule(rule)
+
+            self._update_cache()
+
+            self.last_load_time = time.perf_counter() - start
+            logging.info(
+                f"[cache_switch][{self.name}] Loaded {len(self.all_rules)} rules "
+                f"in {self.last_load_time:.3f}s.")
+
+            return self.last_load_time
+
+    def save_snapshot(self, path: str):
+        """
+        Save the rules, their counters, the dependency graph and the current
+        cache selection to a snapshot file, so a switch can be warm started
+        from it with load_snapshot. With compression, only the rules and their
+        counters are saved.
+        """
+        logging.info(
+            f"[cache_switch][{self.name}] Saving a snapshot to {path}.")
+
+        with self._lock:
+            write_snapshot(take_snapshot(self), path)
+
+    def load_snapshot(self, path: str) -> float:
+        """
+        Replace the rule table with the rules in a snapshot, resuming with
+        their saved counters and the saved cache selection, so the cache is
+        warm from the first packet, as described in snapshot.restore_snapshot.
+        Returns the time taken in seconds, which is also kept in
+        last_load_time.
+        """
+        logging.info(
+            f"[cache_switch][{self.name}] Loading a snapshot from {path}.")
+
+        with self._lock:
+            start = time.perf_counter()
+            snapshot = read_snapshot(path)
+            restore_snapshot(self, snapshot)
+
+            self.last_load_time = time.perf_counter() - start
+            logging.info(
+                f"[cache_switch][{self.name}] Loaded a snapshot of {len(self.all_rules)} rules "
+                f"in {self.last_load_time:.3f}s.")
+
+            return self.last_load_time
+
+    def load_rules(self, path: str) -> float:
+        """Replace the rule table with the rules in a file written by
+        rule_io.write_rules. Returns the time taken to install them."""
+        return self.set_rules(read_rules(path))
 
     def get_cache_stats(self):
         """Get the number of packets sent through the switch as well as the
         number of hits and misses."""
         return self.num_packets, self.num_hits, self.num_misses
+
+    def get_refresh_stats(self):
+        """Get the number of cache refreshes the scheduler triggered and the
+        number it skipped."""
+        return self.scheduler.get_stats()
+
+    def get_flow_mod_stats(self):
+        """
+        Get the number of times a new cache selection has been installed, the
+        total number of flow-mods sent to the hardware switch, and the number
+        of flow-mods used by the most recent installation, including those
+        sent for rules added or removed since the one before it.
+        """
+        return self.num_cache_installs, self.num_flow_mods, self.last_flow_mods
+
+    def get_flow_cache_stats(self):
+        """Get the number of flow cache hits, misses, evictions and
+        invalidations."""
+        if self.flow_cache is None:
+            return 0, 0, 0, 0
+        return self.flow_cache.get_stats()
+
+    def get_sw_switch_stats(self):
+        """
+        Get the number of rules, the number of misses handled, and the mean
+        lookup latency in microseconds of each software switch. Only tracked
+        when the rules are partitioned across several software switches - a
+        single software switch gives an empty list.
+        """
+        if isinstance(self.sw_switch, PartitionedSwitch):
+            return self.sw_switch.get_backend_stats()
+        return []
+
+    def get_occupancy(self):
+        """Get the number of cached rules and cover rules in the hardware
+        switch, and its size."""
+        return len(self.cached_rules), len(self.cover_rules), self.hw_switch_size
+
+    def export_rule_counters(self) -> list:
+        """
+        Get the hit counter of every rule, in descending order of priority,
+        along with whether the rule is currently cached or covered in the
+        hardware switch. With compression, a rule is cached or covered if the
+        compressed rule standing for it is, and its counter only counts the
+        packets it matched in the software switch.
+        """
+        representative = dict()
+        if self.compressor is not None:
+            representative = self.compressor.representative
+        counters = []
+        for rule in reversed(self.all_rules):
+            held = representative.get(rule, rule)
+            counters.append({
+                "id": rule.id,
+                "priority": rule.priority,
+                "counter": rule.counter,
+                "cached": held in self.cached_rules,
+                "covered": held in self.cover_rules,
+            })
+        return counters
+
+    def get_compression_stats(self) -> dict:
+        """
+        Get the number of rules in the table and in the compressed table the
+        cache is selected from, the number of rules dropped as shadowed or
+        redundant or merged into another, and the compression ratio. Without
+        compression every rule is kept.
+        """
+        if self.compressor is None:
+            return {"rules": len(self.all_rules), "compressed": len(self.all_rules),
+                    "shadowed": 0, "redundant": 0, "merged": 0, "ratio": 1.0}
+        return self.compressor.get_stats()
+
+    def get_metrics(self) -> dict:
+        """
+        Get the cache counters, the hardware switch occupancy and, if metrics
+        are enabled, the lookup, refresh and install timing histograms in
+        nanoseconds.
+        """
+        packets, hits, misses = self.get_cache_stats()
+        cached, covered, size = self.get_occupancy()
+        metrics = {
+            "packets": packets,
+            "hits": hits,
+            "misses": misses,
+            "cached_rules": cached,
+            "cover_rules": covered,
+            "hw_switch_size": size,
+        }
+        if self.metrics is not None:
+            metrics.update(self.metrics.get_stats())
+        return metrics
+
+    def get_selection_gap(self) -> dict:
+        """
+        Compare the selection of every greedy algorithm with the optimal one
+        for the current weights, without changing the cache. For each
+        algorithm, gives the hit rate its selection would have had over the
+        weighted traffic and how far below the optimum that is. Also gives the
+        nodes the optimal search used and whether it proved its optimum.
+        The table is only locked while the graph and weights are read, as the
+        selections are made from those alone.
+        """
+        with self._lock:
+            dependency_graph, all_dependencies = self._construct_dependency_graph()
+            weights = self._get_weights()
+        total = sum(weights)
+
+        def hit_rate(cached_rules: set) -> float:
+            return sum(weights[i] for i in cached_rules) / total if total > 0 else 0
+
+        optimal, _ = self._select_optimal(
+            weights, dependency_graph, all_dependencies)
+        optimal_hit_rate = hit_rate(optimal)
+
+        report = {
+            CacheAlgorithm.OPTIMAL.value: {"hit_rate": optimal_hit_rate, "gap": 0},
+        }
+        for algorithm in CacheAlgorithm:
+            if algorithm != CacheAlgorithm.OPTIMAL:
+                cached_rules, _ = self._select_cache_with_algorithm(
+                    algorithm, weights, dependency_graph, all_dependencies)
+                report[algorithm.value] = {
+                    "hit_rate": hit_rate(cached_rules),
+                    "gap": optimal_hit_rate - hit_rate(cached_rules),
+                }
+
+        nodes, proven = self.last_optimal_search
+        return {"algorithms": report, "nodes": nodes, "proven_optimal": proven}
@@ -0,0 +1,77 @@
+from switches.lookup_engine import LookupEngine
+from switches.metrics import SwitchMetrics
+from switches.popularity import PopularityEstimator
+from switches.refresh_scheduler import RefreshScheduler
+from switches.software_partition import SoftwarePartition
+
+
+class CacheSwitchConfig:
+    """
+    The optional features of a cache switch. The defaults give a plain cache
+    switch with a linear lookup engine that refreshes every ten packets. The
+    scheduler, popularity estimator and metrics keep state for a single
+    switch, so a config giving any of them must not be shared between
+    switches - the ones left as None are created by each switch.
+    """
+
+    # classifier used by both the hardware and software tables
+    lookup_engine: LookupEngine
+
+    # decides when the cache is refreshed as packets arrive, or None to
+    # refresh every ten packets
+    scheduler: RefreshScheduler
+
+    # whether the cache is recomputed on a worker thread and swapped in once
+    # it is ready
+    background_refresh: bool
+
+    # number of flows kept in an exact-match cache in front of the hardware
+    # table - 0 disables it
+    flow_cache_size: int
+
+    # number of software switches the rules are partitioned across, and how
+    num_sw_switches: int
+    sw_partition: SoftwarePartition
+
+    # timing histograms that lookups, refreshes and installs are recorded
+    # into, or None if disabled
+    metrics: SwitchMetrics
+
+    # whether every packet is logged
+    log_packets: bool
+
+    # weighs the rules when selecting the cache, or None to weigh them by
+    # their cumulative counters
+    popularity: PopularityEstimator
+
+    # whether rules only depend on the overlaps that are not shadowed by rules
+    # in between, which shrinks dependent and cover sets
+    exact_dependencies: bool
+
+    # whether shadowed and redundant rules are dropped and sibling prefixes
+    # merged before the cache is selected - the software switch keeps the
+    # original rules
+    compress_rules: bool
+
+    def __init__(self, lookup_engine: LookupEngine = LookupEngine.LINEAR,
+                 scheduler: RefreshScheduler = None,
+                 background_refresh: bool = False,
+                 flow_cache_size: int = 0,
+                 num_sw_switches: int = 1,
+                 sw_partition: SoftwarePartition = SoftwarePartition.PREFIX,
+                 metrics: SwitchMetrics = None,
+                 log_packets: bool = False,
+                 popularity: PopularityEstimator = None,
+                 exact_dependencies: bool = False,
+                 compress_rules: bool = False):
+        self.lookup_engine = lookup_engine
+        self.scheduler = scheduler
+        self.background_refresh = background_refresh
+        self.flow_cache_size = flow_cache_size
+        self.num_sw_switches = num_sw_switches
+        self.sw_partition = sw_partition
+        self.metrics = metrics
+        self.log_packets = log_packets
+        self.popularity = popularity
+        self.exact_dependencies = exact_dependencies
+        self.compress_rules = compress_rules
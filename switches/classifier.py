@@ -0,0 +1,51 @@
+from sortedcontainers import SortedKeyList
+from rules.rule import Rule
+from network.packet import Packet
+
+
+class Classifier:
+    """
+    Finds the highest priority rule in a table that matches a packet. The
+    switch owning the classifier keeps it in sync with its rule table.
+    """
+
+    def add_rule(self, rule: Rule):
+        """Add a rule to the classifier."""
+        pass
+
+    def remove_rule(self, rule: Rule):
+        """Remove a rule from the classifier."""
+        pass
+
+    def clear(self):
+        """Remove every rule from the classifier."""
+        pass
+
+    def lookup(self, packet: Packet) -> Rule:
+        """
+        Get the highest priority rule matching the packet. Among rules of equal
+        priority, the one with the highest id wins. If no rule matches, this
+        will return None.
+        """
+        pass
+
+    def lookup_batch(self, packets: list) -> list:
+        """Get the highest priority rule matching each packet in a batch."""
+        lookup = self.lookup
+        return [lookup(packet) for packet in packets]
+
+
+class LinearClassifier (Classifier):
+    """Scans the whole rule table in descending order of priority."""
+
+    # the switch's rule table, in ascending order of priority
+    rules: SortedKeyList
+
+    def __init__(self, rules: SortedKeyList):
+        self.rules = rules
+
+    def lookup(self, packet: Packet) -> Rule:
+        for rule in self.rules.__reversed__():
+            if rule.matches(packet):
+                return rule
+        return None
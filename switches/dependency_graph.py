@@ -0,0 +1,426 @@
+import sys
+from sortedcontainers import SortedKeyList
+from rules.rule import Rule
+from rules.header_space import Ternary, subtract
+
+
+def bit_positions(bits: int) -> list:
+    """Get the positions of the set bits of a bitset, in ascending order."""
+    positions = []
+    while bits:
+        low = bits & -bits
+        positions.append(low.bit_length() - 1)
+        bits ^= low
+    return positions
+
+
+def to_bits(positions) -> int:
+    """Get the bitset with the given positions set."""
+    bits = 0
+    for i in positions:
+        bits |= 1 << i
+    return bits
+
+
+def _comparable_cube(rule: Rule) -> Ternary:
+    """
+    Get the header space of a rule, if comparing it gives the same answer as
+    Rule.intersects. Rules whose patterns contradict each other, or hold
+    values too wide for the header, give None and must be compared by their
+    patterns.
+    """
+    try:
+        return Ternary.from_rule(rule)
+    except ValueError:
+        return None
+
+
+class DependencyGraph:
+    """
+    Maintains the dependency graph for a table of rules along with its
+    transitive closure. Rather than recomputing every pairwise intersection
+    whenever the cache is refreshed, the graph is updated incrementally as
+    rules are inserted into and removed from the table.
+
+    By default a rule depends directly on every higher priority rule it
+    intersects. With exact set, rules are compared as ternary header spaces,
+    and a rule only depends directly on a higher priority rule if part of
+    their overlap is not already matched by a rule between them. This gives
+    smaller dependency sets, at the cost of more work when the table changes.
+
+    Each rule is given a slot when it is added, which it keeps until it is
+    removed, and the views address rules by slot rather than by position so
+    inserting a rule does not shift the others. Closures are kept as integer
+    bitsets over the slots, so unions and counts are word-level operations.
+    Slots are reused once freed, which keeps the bitsets dense.
+    """
+
+    # the table the graph is built over, sorted by Rule.sort_key - this is
+    # shared with the owner, which must call add_rule after inserting a rule
+    # into the table and remove_rule before removing it
+    rules: SortedKeyList
+
+    # direct[r] = set of rules that r directly depends on
+    direct: dict
+
+    # dependents[r] = set of rules that directly depend on r
+    dependents: dict
+
+    # closure[r] = bitset of the slots of all rules that r depends on - if r
+    # is cached these rules must also be cached
+    closure: dict
+
+    # slots[r] = slot of r, its bit in the closure bitsets - slot_rules[s] =
+    # rule in slot s, or None if the slot is free
+    slots: dict
+    slot_rules: list
+    free_slots: list
+
+    # views of the graph by slot, rebuilt only after the table changes
+    _views: tuple
+
+    # whether dependencies exclude overlaps shadowed by rules in between
+    exact: bool
+
+    # the most vectors the unshadowed part of a rule may take before its
+    # remaining intersecting rules are all counted as dependencies
+    max_cubes: int
+
+    # cubes[r] = header space of r, or None if it matches nothing - only
+    # kept when exact is set
+    cubes: dict
+
+    def __init__(self, rules: SortedKeyList, exact: bool = False, max_cubes: int = 1024):
+        """Create a dependency graph over the given rule table."""
+        self.rules = rules
+        self.direct = dict()
+        self.dependents = dict()
+        self.closure = dict()
+        self.slots = dict()
+        self.slot_rules = []
+        self.free_slots = []
+        self._views = None
+
+        self.exact = exact
+        self.max_cubes = max_cubes
+        self.cubes = dict()
+
+        self._build()
+
+    def _build(self):
+        """
+        Build the graph for every rule already in the table at once. Rules are
+        visited from the highest priority down, so each closure is complete
+        when it is first computed and never has to be propagated to the rules
+        depending on it, as adding the rules one at a time would.
+        """
+        for rule in self.rules:
+            self._assign_slot(rule)
+            self.dependents[rule] = set()
+            if self.exact:
+                self.cubes[rule] = Ternary.from_rule(rule)
+
+        # rules are compared as header spaces where they can be, which is
+        # much cheaper than comparing every pair of their patterns - the
+        # others match everything here, and are compared by their patterns
+        rules = list(self.rules)
+        values = [0] * len(rules)
+        masks = [0] * len(rules)
+        uncomparable = set()
+        if not self.exact:
+            for pos, rule in enumerate(rules):
+                cube = _comparable_cube(rule)
+                if cube is None:
+                    uncomparable.add(rule)
+                else:
+                    values[pos] = cube.value
+                    masks[pos] = cube.mask
+
+        for pos in reversed(range(len(rules))):
+            rule = rules[pos]
+            if self.exact:
+                direct = self._exact_dependencies(rule, pos)
+            elif rule in uncomparable:
+                direct = {higher for higher in rules[pos + 1:] if rule.intersects(higher)}
+            else:
+                value = values[pos]
+                mask = masks[pos]
+                direct = {rules[i] for i in range(pos + 1, len(rules))
+                          if (value ^ values[i]) & mask & masks[i] == 0}
+                if len(uncomparable) > 0:
+                    direct = {higher for higher in direct
+                              if higher not in uncomparable or rule.intersects(higher)}
+
+            self.direct[rule] = direct
+            for higher in direct:
+                self.dependents[higher].add(rule)
+            self.closure[rule] = self._closure_of(rule)
+
+        self._views = None
+
+    def restore(self, direct: list, closures: list):
+        """
+        Fill in an empty graph for the rules already in the table from saved
+        dependencies rather than computing them. direct[i] is the positions in
+        the table of the rules the rule at position i directly depends on, and
+        closures[i] the bitset of the positions of every rule it depends on.
+        Rules are given slots in table order, so the bitsets are used as they
+        are.
+        """
+        for rule in self.rules:
+            self._assign_slot(rule)
+            self.dependents[rule] = set()
+            if self.exact:
+                self.cubes[rule] = Ternary.from_rule(rule)
+
+        rules = self.slot_rules
+        for i, rule in enumerate(rules):
+            self.direct[rule] = {rules[j] for j in direct[i]}
+            for higher in self.direct[rule]:
+                self.dependents[higher].add(rule)
+            self.closure[rule] = closures[i]
+
+        self._views = None
+
+    def add_rule(self, rule: Rule):
+        """Add a rule that has just been inserted into the table."""
+        pos = self.rules.bisect_key_left(rule.sort_key())
+        self._assign_slot(rule)
+
+        if self.exact:
+            self._add_rule_exact(rule, pos)
+            return
+
+        # the rules that the new rule depends on
+        direct = set()
+        closure = 0
+        for higher in self.rules.islice(pos + 1):
+            if rule.intersects(higher):
+                direct.add(higher)
+                self.dependents[higher].add(rule)
+                closure |= 1 << self.slots[higher] | self.closure[higher]
+
+        self.direct[rule] = direct
+        self.dependents[rule] = set()
+        self.closure[rule] = closure
+
+        # the rules that depend on the new rule
+        for lower in self.rules.islice(0, pos):
+            if lower.intersects(rule):
+                self.direct[lower].add(rule)
+                self.dependents[rule].add(lower)
+
+        # anything that can reach the new rule can now reach its dependencies
+        added = 1 << self.slots[rule] | closure
+        for ancestor in self._ancestors(rule):
+            self.closure[ancestor] |= added
+
+        self._views = None
+
+    def _assign_slot(self, rule: Rule):
+        if len(self.free_slots) > 0:
+            slot = self.free_slots.pop()
+            self.slot_rules[slot] = rule
+        else:
+            slot = len(self.slot_rules)
+            self.slot_rules.append(rule)
+        self.slots[rule] = slot
+
+    def _free_slot(self, rule: Rule):
+        slot = self.slots.pop(rule)
+        self.slot_rules[slot] = None
+        self.free_slots.append(slot)
+
+    def remove_rule(self, rule: Rule):
+        """
+        Remove a rule that is about to be removed from the table. Only the
+        closures of rules that transitively depended on it are recomputed.
+        """
+        if self.exact:
+            self._remove_rule_exact(rule)
+            self._free_slot(rule)
+            return
+
+        ancestors = self._ancestors(rule)
+
+        for higher in self.direct.pop(rule):
+            self.dependents[higher].discard(rule)
+        for lower in self.dependents.pop(rule):
+            self.direct[lower].discard(rule)
+        del self.closure[rule]
+
+        # recompute closures from the highest priority rule down so that
+        # every dependency's closure is up to date before it is used
+        ordered = sorted(ancestors, key=self.rules.index, reverse=True)
+        for ancestor in ordered:
+            self.closure[ancestor] = self._closure_of(ancestor)
+
+        self._free_slot(rule)
+        self._views = None
+
+    def _closure_of(self, rule: Rule) -> int:
+        """Get the closure of a rule from the closures of its direct
+        dependencies."""
+        closure = 0
+        for higher in self.direct[rule]:
+            closure |= 1 << self.slots[higher] | self.closure[higher]
+        return closure
+
+    def _exact_dependencies(self, rule: Rule, pos: int) -> set:
+        """
+        Find the rules that the rule at the given position directly depends
+        on, by scanning up the table and subtracting each higher priority rule
+        from the part of the rule not yet matched. A rule is a dependency if it
+        overlaps that part, and the scan stops once nothing is left. Rules that
+        are not in cubes are ignored.
+        """
+        cube = self.cubes[rule]
+        direct = set()
+        if cube is None:
+            return direct
+
+        remaining = [cube]
+        for higher in self.rules.islice(pos + 1):
+            higher_cube = self.cubes.get(higher)
+            if higher_cube is None or not cube.intersects(higher_cube):
+                continue
+
+            # the unmatched part has grown too large to track
+            if remaining is None:
+                direct.add(higher)
+                continue
+
+            # split the unmatched part into what the higher rule overlaps and
+            # what it does not
+            value = higher_cube.value
+            mask = higher_cube.mask
+            kept = []
+            overlapped = []
+            for part in remaining:
+                if (part.value ^ value) & part.mask & mask:
+                    kept.append(part)
+                else:
+                    overlapped.append(part)
+
+            if len(overlapped) > 0:
+                direct.add(higher)
+                kept.extend(subtract(overlapped, higher_cube))
+                remaining = kept
+                if len(remaining) == 0:
+                    break
+                if len(remaining) > self.max_cubes:
+                    remaining = None
+
+        return direct
+
+    def _set_direct(self, rule: Rule, direct: set):
+        for higher in self.direct.get(rule, ()):
+            self.dependents[higher].discard(rule)
+        for higher in direct:
+            self.dependents[higher].add(rule)
+        self.direct[rule] = direct
+
+    def _recompute_closures(self, changed: set):
+        """Recompute the closures of rules whose direct dependencies have
+        changed, and of every rule that transitively depends on them."""
+        affected = set(changed)
+        for rule in changed:
+            affected.update(self._ancestors(rule))
+
+        # from the highest priority rule down, so that every dependency's
+        # closure is up to date before it is used
+        for rule in sorted(affected, key=self.rules.index, reverse=True):
+            self.closure[rule] = self._closure_of(rule)
+
+    def _add_rule_exact(self, rule: Rule, pos: int):
+        """
+        Add a rule in exact mode. Lower priority rules that overlap the new
+        rule may now depend on it, and may no longer depend on the rules it
+        shadows, so their dependencies are recomputed.
+        """
+        cube = Ternary.from_rule(rule)
+        self.cubes[rule] = cube
+        self.dependents[rule] = set()
+        self.closure[rule] = 0
+        self._set_direct(rule, self._exact_dependencies(rule, pos))
+
+        changed = {rule}
+        if cube is not None:
+            for i, lower in enumerate(self.rules.islice(0, pos)):
+                lower_cube = self.cubes.get(lower)
+                if lower_cube is not None and lower_cube.intersects(cube):
+                    self._set_direct(lower, self._exact_dependencies(lower, i))
+                    changed.add(lower)
+
+        self._recompute_closures(changed)
+        self._views = None
+
+    def _remove_rule_exact(self, rule: Rule):
+        """
+        Remove a rule in exact mode. Lower priority rules that overlap the rule
+        may depend on rules it used to shadow, so their dependencies are
+        recomputed without it.
+        """
+        pos = self.rules.index(rule)
+        cube = self.cubes.pop(rule)
+
+        self._set_direct(rule, set())
+        for lower in self.dependents.pop(rule):
+            self.direct[lower].discard(rule)
+        del self.direct[rule]
+        del self.closure[rule]
+
+        changed = set()
+        if cube is not None:
+            for i, lower in enumerate(self.rules.islice(0, pos)):
+                lower_cube = self.cubes.get(lower)
+                if lower_cube is not None and lower_cube.intersects(cube):
+                    self._set_direct(lower, self._exact_dependencies(lower, i))
+                    changed.add(lower)
+
+        self._recompute_closures(changed)
+        self._views = None
+
+    def _ancestors(self, rule: Rule) -> set:
+        """Get every rule that transitively depends on the given rule."""
+        ancestors = set()
+        stack = list(self.dependents[rule])
+        while len(stack) > 0:
+            lower = stack.pop()
+            if lower not in ancestors:
+                ancestors.add(lower)
+                stack.extend(self.dependents[lower])
+        return ancestors
+
+    def get_views(self):
+        """
+        Get the dependency graph and its transitive closure keyed by the slot
+        of each rule - dependency_graph[i] is the set of slots that i directly
+        depends on, with a key for every slot in use, ordered as the table is,
+        and all_dependencies[i] the bitset of every slot it depends on, or 0
+        if slot i is free. The rule in each slot is slot_rules[i]. The views
+        are reused across calls until the table is modified.
+        """
+        if self._views is None:
+            dependency_graph = {}
+            all_dependencies = [0] * len(self.slot_rules)
+            for rule in self.rules:
+                i = self.slots[rule]
+                dependency_graph[i] = {self.slots[r] for r in self.direct[rule]}
+                all_dependencies[i] = self.closure[rule]
+
+            self._views = dependency_graph, all_dependencies
+
+        return self._views
+
+    def get_memory_stats(self) -> dict:
+        """
+        Get the number of rules, of direct dependencies and of transitive
+        dependencies, and the bytes taken by the closure bitsets.
+        """
+        return {
+            "rules": len(self.rules),
+            "direct_dependencies": sum(len(direct) for direct in self.direct.values()),
+            "all_dependencies": sum(closure.bit_count() for closure in self.closure.values()),
+            "closure_bytes": sum(sys.getsizeof(closure) for closure in self.closure.values()),
+        }
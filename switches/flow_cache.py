@@ -0,0 +1,63 @@
+from collections import OrderedDict
+from network.packet import Packet
+
+
+class FlowCache:
+    """
+    An exact-match cache keyed on a packet's in_port and header fields, with
+    least recently used eviction once it holds max_size flows. The owner is
+    responsible for clearing it whenever the result of a lookup could change.
+    """
+
+    max_size: int
+    flows: OrderedDict
+
+    hits: int
+    misses: int
+    evictions: int
+    invalidations: int
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.flows = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def key(packet: Packet) -> tuple:
+        """Get the flow key of a packet."""
+        return (packet.in_port, packet.ipv4_src, packet.ipv4_dst,
+                packet.tcp_sport, packet.tcp_dport)
+
+    def get(self, key: tuple):
+        """Get the entry cached for a flow, or None if it is not cached."""
+        entry = self.flows.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.flows.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key: tuple, entry):
+        """Cache the entry for a flow, evicting the least recently used flow
+        if the cache is full."""
+        self.flows[key] = entry
+        self.flows.move_to_end(key)
+        if len(self.flows) > self.max_size:
+            self.flows.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """Invalidate every cached flow."""
+        if len(self.flows) > 0:
+            self.flows.clear()
+            self.invalidations += 1
+
+    def get_stats(self):
+        """Get the number of hits, misses, evictions and invalidations."""
+        return self.hits, self.misses, self.evictions, self.invalidations
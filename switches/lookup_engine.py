@@ -0,0 +1,7 @@
+from enum import Enum
+
+
+class LookupEngine(Enum):
+    LINEAR = "Linear"
+    TRIE = "Trie"
+    VECTOR = "Vector"
@@ -0,0 +1,124 @@
+class Histogram:
+    """
+    A histogram of durations in nanoseconds. Values are counted in power of two
+    buckets, so recording is cheap and percentiles are accurate to within a
+    factor of two. The count, total and maximum are exact.
+    """
+
+    # buckets[i] = number of values with a bit length of i
+    buckets: list
+
+    count: int
+    total: int
+    max: int
+
+    def __init__(self):
+        self.buckets = [0] * 65
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, value: int, count: int = 1):
+        """Record a value, count times."""
+        self.buckets[min(64, value.bit_length())] += count
+        self.count += count
+        self.total += value * count
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, fraction: float) -> int:
+        """Get an upper bound on the given percentile of the values."""
+        rank = fraction * self.count
+        seen = 0
+        for i, bucket in enumerate(self.buckets):
+            seen += bucket
+            if bucket > 0 and seen >= rank:
+                return min(self.max, (1 << i) - 1)
+        return self.max
+
+    def get_stats(self) -> dict:
+        """Get the count, mean, median, 99th percentile and maximum."""
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count > 0 else 0,
+            "p50": self.percentile(0.5),
+            "p99": self.percentile(0.99),
+            "max": self.max,
+        }
+
+
+class SwitchMetrics:
+    """
+    Timing metrics for a cache switch. Lookups are only timed for one packet
+    (or batch) in every sample_interval, to keep the cost off most packets.
+    If a profiler is given, it is called with the name of the event, the
+    switch name and the duration in nanoseconds of every timed lookup, refresh
+    and install, so measurements can be forwarded to an external profiler.
+    """
+
+    sample_interval: int
+    profiler: object
+
+    hw_lookup: Histogram
+    sw_lookup: Histogram
+
+    # refresh[algorithm] = histogram of the time taken to select the cache
+    refresh: dict
+    install: Histogram
+
+    # packets left until the next sample
+    _countdown: int
+
+    def __init__(self, sample_interval: int = 1, profiler=None):
+        self.sample_interval = sample_interval
+        self.profiler = profiler
+
+        self.hw_lookup = Histogram()
+        self.sw_lookup = Histogram()
+        self.refresh = dict()
+        self.install = Histogram()
+
+        self._countdown = 0
+
+    def sample(self) -> bool:
+        """Returns whether the next packet or batch should be timed."""
+        if self._countdown > 0:
+            self._countdown -= 1
+            return False
+        self._countdown = self.sample_interval - 1
+        return True
+
+    def _profile(self, event: str, switch_name: str, duration: int):
+        if self.profiler is not None:
+            self.profiler(event, switch_name, duration)
+
+    def record_lookup(self, hardware: bool, switch_name: str, duration: int, count: int = 1):
+        """Record the time taken to look count packets up in a table."""
+        if hardware:
+            self.hw_lookup.record(duration // count, count)
+            self._profile("hw_lookup", switch_name, duration)
+        else:
+            self.sw_lookup.record(duration // count, count)
+            self._profile("sw_lookup", switch_name, duration)
+
+    def record_refresh(self, algorithm, switch_name: str, duration: int):
+        """Record the time taken to select the cache with an algorithm."""
+        if algorithm.value not in self.refresh:
+            self.refresh[algorithm.value] = Histogram()
+        self.refresh[algorithm.value].record(duration)
+        self._profile("refresh", switch_name, duration)
+
+    def record_install(self, switch_name: str, duration: int):
+        """Record the time taken to install a cache selection."""
+        self.install.record(duration)
+        self._profile("install", switch_name, duration)
+
+    def get_stats(self) -> dict:
+        """Get the statistics of every histogram, in nanoseconds."""
+        return {
+            "hw_lookup": self.hw_lookup.get_stats(),
+            "sw_lookup": self.sw_lookup.get_stats(),
+            "refresh": {algorithm: histogram.get_stats()
+                        for algorithm, histogram in self.refresh.items()},
+            "install": self.install.get_stats(),
+        }
@@ -0,0 +1,111 @@
+import sys
+
+
+def select_optimal(weights: list, dependency_graph: dict, size: int,
+                   max_nodes: int = 100000, incumbent: set = None) -> tuple:
+    """
+    Find the set of rules to cache that covers the most weight, by branch and
+    bound. A cached rule needs every rule it depends on in the hardware switch
+    too, either cached or as a cover rule, so a set of cached rules C costs
+    |C + dependencies of C| entries, which must fit in size. This allows every
+    selection the greedy algorithms can make, so its optimum bounds all of them.
+
+    Rules are branched on in descending order of weight, caching them before
+    leaving them out. A branch is pruned when caching every remaining rule
+    that is already in the switch as a cover, plus the heaviest remaining rules
+    that fit in the free entries, could not beat the best selection so far.
+    An incumbent selection, such as a greedy one, can be given to prune from
+    the start.
+
+    The search stops after max_nodes nodes. Returns the indices of the rules
+    to cache, the indices of the rules to cover, the number of nodes searched
+    and whether the selection is proven optimal.
+    """
+    # only rules with weight are worth caching, and only if they can fit
+    candidates = sorted((i for i in dependency_graph
+                         if weights[i] > 0 and len(dependency_graph[i]) < size),
+                        key=lambda i: -weights[i])
+
+    # refs[j] = number of cached rules that need j in the switch, counting j
+    # itself if it is cached
+    refs = [0] * len(weights)
+    cached = []
+
+    best_weight = -1
+    best = []
+    if incumbent is not None:
+        best_weight = sum(weights[i] for i in incumbent)
+        best = list(incumbent)
+
+    # entries in use, nodes searched, and whether the search ran out of nodes
+    num_used = 0
+    nodes = 0
+    aborted = False
+
+    def bound(pos: int, weight: float) -> float:
+        free = size - num_used
+        for i in candidates[pos:]:
+            if refs[i] > 0:
+                weight += weights[i]
+            elif free > 0:
+                weight += weights[i]
+                free -= 1
+        return weight
+
+    def search(pos: int, weight: float):
+        nonlocal best_weight, best, num_used, nodes, aborted
+
+        if aborted:
+            return
+        nodes += 1
+        if weight > best_weight:
+            best_weight = weight
+            best = list(cached)
+
+        if pos == len(candidates):
+            return
+        if nodes >= max_nodes:
+            aborted = True
+            return
+        if bound(pos, weight) <= best_weight:
+            return
+
+        i = candidates[pos]
+        needed = [i]
+        needed.extend(dependency_graph[i])
+        cost = sum(1 for j in needed if refs[j] == 0)
+
+        if num_used + cost <= size:
+            for j in needed:
+                refs[j] += 1
+            num_used += cost
+            cached.append(i)
+
+            search(pos + 1, weight + weights[i])
+
+            cached.pop()
+            num_used -= cost
+            for j in needed:
+                refs[j] -= 1
+
+            # caching a rule that takes no new entries never hurts
+            if cost == 0:
+                return
+
+        search(pos + 1, weight)
+
+    # the search recurses once per candidate
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(limit, len(candidates) + 100))
+    try:
+        search(0, 0)
+    finally:
+        sys.setrecursionlimit(limit)
+
+    cached_rules = set(best)
+    cover_rules = set()
+    for i in cached_rules:
+        cover_rules.update(dependency_graph[i])
+    cover_rules.difference_update(cached_rules)
+
+    return cached_rules, cover_rules, nodes, not aborted
@@ -0,0 +1,180 @@
+import time
+from rules.rule import Rule
+from rules.action import Action
+from rules.pattern import IPv4DstPattern
+from network.packet import Packet
+from switches.switch import Switch
+from switches.basic_switch import BasicSwitch
+from switches.lookup_engine import LookupEngine
+from switches.software_partition import SoftwarePartition
+
+
+ADDRESS_BITS = 32
+ADDRESS_SPACE = 1 << ADDRESS_BITS
+
+
+class PartitionedSwitch (Switch):
+    """
+    A software switch made of several backend switches, each holding part of
+    the rule table. Packets are dispatched on their destination address to the
+    one backend responsible for it, which holds every rule that packet could
+    match, so its lookup gives the same result as a single table would.
+
+    With prefix partitioning each backend owns a contiguous range of the
+    destination address space. With hash partitioning the destination's
+    leading hash_prefixlen bits are hashed to pick a backend. Rules whose
+    destination covers more than one backend's addresses, including rules
+    without a destination pattern, are installed in each of those backends.
+    """
+
+    partition: SoftwarePartition
+    hash_prefixlen: int
+
+    backends: list
+
+    # backend_rules[rule] = indices of the backends the rule is installed in
+    backend_rules: dict
+
+    # every rule in ascending order of priority, or None if it has to be
+    # sorted again since the table changed
+    _sorted_rules: list
+
+    # per-backend load - lookups[i] = packets looked up in backend i, and
+    # lookup_time[i] = nanoseconds spent on them
+    lookups: list
+    lookup_time: list
+
+    def __init__(self, num_backends: int, partition: SoftwarePartition = SoftwarePartition.PREFIX,
+                 engine: LookupEngine = LookupEngine.LINEAR, hash_prefixlen: int = 24):
+        self.partition = partition
+        self.hash_prefixlen = hash_prefixlen
+
+        self.backends = [BasicSwitch(engine) for _ in range(num_backends)]
+        self.backend_rules = dict()
+        self._sorted_rules = []
+
+        self.lookups = [0] * num_backends
+        self.lookup_time = [0] * num_backends
+
+    @property
+    def rules(self) -> list:
+        """Every rule in the switch, in ascending order of priority. The list
+        is only sorted again after the table has changed."""
+        if self._sorted_rules is None:
+            self._sorted_rules = sorted(self.backend_rules, key=Rule.sort_key)
+        return self._sorted_rules
+
+    def _hash(self, prefix: int) -> int:
+        # multiplicative hashing, so neighbouring prefixes spread out
+        return ((prefix * 2654435761) & 0xFFFFFFFF) % len(self.backends)
+
+    def _backend_for(self, address: int) -> int:
+        """Get the index of the backend responsible for an address. Packets
+        without a destination can only match rules without a destination
+        pattern, which every backend holds, so they go to the first one."""
+        if address is None:
+            return 0
+        if self.partition == SoftwarePartition.HASH:
+            return self._hash(address >> (ADDRESS_BITS - self.hash_prefixlen))
+        return address * len(self.backends) >> ADDRESS_BITS
+
+    def _backends_for_rule(self, rule: Rule) -> list:
+        """Get the indices of every backend that could be sent a packet
+        matching the rule."""
+        num_backends = len(self.backends)
+
+        dst = None
+        for pattern in rule.patterns:
+            if type(pattern) == IPv4DstPattern:
+                dst = pattern
+        if dst is None:
+            return list(range(num_backends))
+
+        if self.partition == SoftwarePartition.HASH:
+            if dst.prefixlen < self.hash_prefixlen:
+                return list(range(num_backends))
+            return [self._hash(dst.network >> (ADDRESS_BITS - self.hash_prefixlen))]
+
+        last = dst.network | (~dst.mask & (ADDRESS_SPACE - 1))
+        return list(range(self._backend_for(dst.network), self._backend_for(last) + 1))
+
+    def add_rule(self, rule: Rule):
+        indices = self._backends_for_rule(rule)
+        self.backend_rules[rule] = indices
+        self._sorted_rules = None
+        for i in indices:
+            self.backends[i].add_rule(rule)
+
+    def remove_rule(self, rule: Rule):
+        for i in self.backend_rules.pop(rule):
+            self.backends[i].remove_rule(rule)
+        self._sorted_rules = None
+
+    def set_rules(self, new_rules: set):
+        self.backend_rules = dict()
+        self._sorted_rules = None
+        for backend in self.backends:
+            backend.set_rules([])
+        for rule in new_rules:
+            self.add_rule(rule)
+
+    def match_rule(self, packet: Packet) -> Rule:
+        """
+        Get the highest priority rule matching the packet from the backend
+        responsible for it, updating its counter. If no rule matches, this
+        will return None.
+        """
+        i = self._backend_for(packet.ipv4_dst)
+
+        start = time.perf_counter_ns()
+        rule = self.backends[i].match_rule(packet)
+        self.lookup_time[i] += time.perf_counter_ns() - start
+        self.lookups[i] += 1
+
+        return rule
+
+    def match_rules(self, packets: list) -> list:
+        """
+        Get the highest priority matching rule for each packet in a batch. The
+        batch is split by backend and each part is looked up in one pass.
+        """
+        groups = dict()
+        for k, packet in enumerate(packets):
+            groups.setdefault(self._backend_for(packet.ipv4_dst), []).append(k)
+
+        rules = [None] * len(packets)
+        for i, indices in groups.items():
+            start = time.perf_counter_ns()
+            matched = self.backends[i].match_rules([packets[k] for k in indices])
+            self.lookup_time[i] += time.perf_counter_ns() - start
+            self.lookups[i] += len(indices)
+
+            for k, rule in zip(indices, matched):
+                rules[k] = rule
+
+        return rules
+
+    def packet_in(self, packet: Packet, port: int = None) -> Action:
+        if port != None:
+            packet.in_port = port
+
+        rule = self.match_rule(packet)
+        return None if rule is None else rule.action
+
+    def packets_in(self, packets: list, port: int = None) -> list:
+        if port != None:
+            for packet in packets:
+                packet.in_port = port
+
+        return [None if rule is None else rule.action for rule in self.match_rules(packets)]
+
+    def get_backend_stats(self) -> list:
+        """
+        Get the number of rules, the number of packets looked up, and the mean
+        lookup latency in microseconds of each backend.
+        """
+        stats = []
+        for backend, lookups, lookup_time in zip(self.backends, self.lookups, self.lookup_time):
+            stats.append((len(backend.rules), lookups,
+                          lookup_time / lookups / 1000 if lookups > 0 else 0))
+        return stats
@@ -0,0 +1,185 @@
+import random
+from collections import deque
+
+
+# a Mersenne prime, for universal hashing
+HASH_PRIME = (1 << 61) - 1
+
+
+class PopularityEstimator:
+    """
+    Estimates how popular each rule is, giving the weights the cache
+    algorithms select rules by. Most estimators work from the rule counters,
+    looking at how much each has grown since the last refresh. An estimator
+    keeps state for a single switch, so each switch needs its own.
+    """
+
+    # whether the switch needs to call observe for every packet
+    observes_packets = False
+
+    def get_weights(self, rules) -> list:
+        """Get the weight of each rule, in the order given."""
+        pass
+
+    def observe(self, rule, count: int = 1):
+        """Called for the rule each packet matched, if observes_packets is
+        set."""
+        pass
+
+    def refreshed(self, rules):
+        """Called whenever the switch refreshes its cache, with the rules in
+        its table."""
+        pass
+
+    def reset(self):
+        """Forget everything seen so far, so the estimators that work from
+        the rule counters only go by the counters. Called when the switch
+        replaces its rules with new rule objects, such as when loading a
+        snapshot."""
+        pass
+
+
+class CumulativeEstimator (PopularityEstimator):
+    """Weighs each rule by every packet it has ever matched."""
+
+    def get_weights(self, rules) -> list:
+        return [rule.counter for rule in rules]
+
+
+class DecayEstimator (PopularityEstimator):
+    """
+    Weighs each rule by an exponentially decaying count of its packets. Every
+    refresh, the count accumulated so far is multiplied by decay, so a packet
+    seen n refreshes ago counts decay^n as much as a new one.
+    """
+
+    decay: float
+
+    # scores[rule] = decayed count up to the last refresh
+    scores: dict
+    # last_counters[rule] = rule counter at the last refresh
+    last_counters: dict
+
+    def __init__(self, decay: float = 0.5):
+        self.decay = decay
+        self.scores = dict()
+        self.last_counters = dict()
+
+    def get_weights(self, rules) -> list:
+        return [self.scores.get(rule, 0) + rule.counter - self.last_counters.get(rule, 0)
+                for rule in rules]
+
+    def refreshed(self, rules):
+        weights = self.get_weights(rules)
+        self.scores = {rule: weight * self.decay
+                       for rule, weight in zip(rules, weights) if weight > 0}
+        self.last_counters = {rule: rule.counter for rule in rules}
+
+    def reset(self):
+        self.scores = dict()
+        self.last_counters = dict()
+
+
+class SlidingWindowEstimator (PopularityEstimator):
+    """
+    Weighs each rule by the packets it matched over the last window refreshes,
+    forgetting anything older.
+    """
+
+    window: int
+
+    # epochs[i] = packets each rule matched between two refreshes, oldest
+    # first, for the last window - 1 refreshes
+    epochs: deque
+    # totals[rule] = packets the rule matched over all the epochs
+    totals: dict
+    last_counters: dict
+
+    def __init__(self, window: int = 10):
+        self.window = window
+        self.epochs = deque()
+        self.totals = dict()
+        self.last_counters = dict()
+
+    def get_weights(self, rules) -> list:
+        return [self.totals.get(rule, 0) + rule.counter - self.last_counters.get(rule, 0)
+                for rule in rules]
+
+    def refreshed(self, rules):
+        epoch = dict()
+        for rule in rules:
+            delta = rule.counter - self.last_counters.get(rule, 0)
+            if delta > 0:
+                epoch[rule] = delta
+                self.totals[rule] = self.totals.get(rule, 0) + delta
+        self.epochs.append(epoch)
+
+        while len(self.epochs) > self.window - 1:
+            for rule, delta in self.epochs.popleft().items():
+                self.totals[rule] -= delta
+
+        # forget rules that have left the window - rules removed from the
+        # table leave it once their last epoch has passed
+        self.totals = {rule: total for rule, total in self.totals.items()
+                       if total > 0}
+        self.last_counters = {rule: rule.counter for rule in rules}
+
+    def reset(self):
+        self.epochs = deque()
+        self.totals = dict()
+        self.last_counters = dict()
+
+
+class CountMinSketchEstimator (PopularityEstimator):
+    """
+    Weighs each rule by an approximate, decaying count of its packets kept in
+    a count-min sketch. The sketch has a fixed size of width * depth counters
+    however large the table is, and can only overestimate a rule's count - by
+    at most a fraction e / width of all packets, with probability
+    1 - e^-depth. The whole sketch is multiplied by decay every refresh.
+    """
+
+    observes_packets = True
+
+    width: int
+    depth: int
+    decay: float
+
+    # cells[row][column] = decayed count of the rules hashed to the cell
+    cells: list
+    # hashes[row] = a, b of the row's hash function (a * x + b) mod p mod width
+    hashes: list
+
+    def __init__(self, width: int = 1024, depth: int = 4, decay: float = 0.5, seed: int = 0):
+        self.width = width
+        self.depth = depth
+        self.decay = decay
+        self.cells = [[0] * width for _ in range(depth)]
+
+        rng = random.Random(seed)
+        self.hashes = [(rng.randrange(1, HASH_PRIME), rng.randrange(HASH_PRIME))
+                       for _ in range(depth)]
+
+    def _columns(self, rule) -> list:
+        # keyed on the rule's id, which stays the same for as long as the rule
+        # is in the table, unlike the address of the rule object
+        key = rule.id
+        return [(a * key + b) % HASH_PRIME % self.width for a, b in self.hashes]
+
+    def observe(self, rule, count: int = 1):
+        for row, column in zip(self.cells, self._columns(rule)):
+            row[column] += count
+
+    def get_weights(self, rules) -> list:
+        weights = []
+        for rule in rules:
+            weights.append(min(row[column] for row, column in
+                               zip(self.cells, self._columns(rule))))
+        return weights
+
+    def refreshed(self, rules):
+        if self.decay != 1:
+            self.cells = [[cell * self.decay for cell in row] for row in self.cells]
+
+    def reset(self):
+        self.cells = [[0] * self.width for _ in range(self.depth)]
@@ -0,0 +1,197 @@
+import time
+
+
+class RefreshScheduler:
+    """
+    Decides when a cache switch should recompute its hardware cache. A
+    scheduler keeps state for a single switch, so each switch needs its own.
+    """
+
+    # number of refreshes the scheduler has triggered
+    num_refreshes: int
+
+    # number of times the scheduler considered refreshing and decided not to
+    num_skipped: int
+
+    # whether the switch needs to call observe for every packet
+    observes_packets = False
+
+    def __init__(self):
+        self.num_refreshes = 0
+        self.num_skipped = 0
+
+    def should_refresh(self, switch, num_packets: int) -> bool:
+        """
+        Called after the switch has processed num_packets more packets.
+        Returns whether the switch should refresh its cache now.
+        """
+        pass
+
+    def observe(self, rule, count: int = 1):
+        """Called for the rule each packet matched, if observes_packets is
+        set."""
+        pass
+
+    def refreshed(self, switch):
+        """Called whenever the switch refreshes its cache, for any reason."""
+        pass
+
+    def _decide(self, refresh: bool) -> bool:
+        if refresh:
+            self.num_refreshes += 1
+        else:
+            self.num_skipped += 1
+        return refresh
+
+    def get_stats(self):
+        """Get the number of refreshes triggered and skipped."""
+        return self.num_refreshes, self.num_skipped
+
+
+class PacketCountScheduler (RefreshScheduler):
+    """Refreshes every time the switch's packet count crosses a multiple of
+    the interval."""
+
+    interval: int
+
+    def __init__(self, interval: int = 10):
+        super().__init__()
+        self.interval = interval
+
+    def should_refresh(self, switch, num_packets: int) -> bool:
+        previous = switch.num_packets - num_packets
+        return self._decide(previous // self.interval != switch.num_packets // self.interval)
+
+
+class TimeIntervalScheduler (RefreshScheduler):
+    """Refreshes once the given number of seconds has passed since the last
+    refresh."""
+
+    interval: float
+    clock: object
+    last_refresh: float
+
+    def __init__(self, interval: float, clock=time.monotonic):
+        super().__init__()
+        self.interval = interval
+        self.clock = clock
+        self.last_refresh = clock()
+
+    def should_refresh(self, switch, num_packets: int) -> bool:
+        return self._decide(self.clock() - self.last_refresh >= self.interval)
+
+    def refreshed(self, switch):
+        self.last_refresh = self.clock()
+
+
+class AdaptiveScheduler (RefreshScheduler):
+    """
+    Re-evaluates the cache every check_interval packets, but only refreshes it
+    when doing so is likely to help. A refresh is triggered when the
+    distribution of rule weights has drifted from the one the cache was built
+    from by more than drift_threshold (measured as total variation distance),
+    or when the miss rate over the last check_interval packets has risen more
+    than miss_rate_increase above the miss rate seen right after the last
+    refresh. If max_interval is set, the cache is also refreshed whenever that
+    many packets have passed without a refresh.
+
+    The current weights are estimated as the weights at the last refresh plus
+    the packets each rule has matched since, so a check only looks at the
+    rules that have been hit rather than the whole table.
+    """
+
+    observes_packets = True
+
+    check_interval: int
+    drift_threshold: float
+    miss_rate_increase: float
+    max_interval: int
+
+    # weights[rule] = weight of the rule when the cache was last refreshed
+    weights: dict
+    total_weight: float
+
+    # hits[rule] = packets the rule has matched since the last refresh
+    hits: dict
+    total_hits: int
+
+    # miss rate over the first window after the last refresh
+    baseline_miss_rate: float
+
+    packets_since_check: int
+    packets_since_refresh: int
+    last_packets: int
+    last_misses: int
+
+    def __init__(self, check_interval: int = 10, drift_threshold: float = 0.1,
+                 miss_rate_increase: float = 0.05, max_interval: int = None):
+        super().__init__()
+        self.check_interval = check_interval
+        self.drift_threshold = drift_threshold
+        self.miss_rate_increase = miss_rate_increase
+        self.max_interval = max_interval
+
+        self.weights = dict()
+        self.total_weight = 0
+        self.hits = dict()
+        self.total_hits = 0
+        self.baseline_miss_rate = None
+        self.packets_since_check = 0
+        self.packets_since_refresh = 0
+        self.last_packets = 0
+        self.last_misses = 0
+
+    def observe(self, rule, count: int = 1):
+        self.hits[rule] = self.hits.get(rule, 0) + count
+        self.total_hits += count
+
+    def _drift(self) -> float:
+        """Get the total variation distance between the current weights and
+        the weights the cache was built from."""
+        last_total = self.total_weight
+        current_total = last_total + self.total_hits
+        if current_total == 0 or last_total == 0:
+            return 0 if current_total == last_total else 1
+
+        # a rule that has not been hit only loses share, as the total grows
+        hit_weight = 0
+        drift = 0
+        for rule, hits in self.hits.items():
+            weight = self.weights.get(rule, 0)
+            hit_weight += weight
+            drift += abs((weight + hits) / current_total - weight / last_total)
+        drift += (last_total - hit_weight) * self.total_hits / (last_total * current_total)
+        return drift / 2
+
+    def should_refresh(self, switch, num_packets: int) -> bool:
+        self.packets_since_check += num_packets
+        self.packets_since_refresh += num_packets
+        if self.packets_since_check < self.check_interval:
+            return False
+        self.packets_since_check = 0
+
+        window_packets = switch.num_packets - self.last_packets
+        window_misses = switch.num_misses - self.last_misses
+        self.last_packets = switch.num_packets
+        self.last_misses = switch.num_misses
+        miss_rate = window_misses / window_packets if window_packets > 0 else 0
+
+        if self.baseline_miss_rate is None:
+            self.baseline_miss_rate = miss_rate
+
+        if self.max_interval is not None and self.packets_since_refresh >= self.max_interval:
+            return self._decide(True)
+        if miss_rate > self.baseline_miss_rate + self.miss_rate_increase:
+            return self._decide(True)
+        return self._decide(self._drift() > self.drift_threshold)
+
+    def refreshed(self, switch):
+        self.weights = switch.get_rule_weights()
+        self.total_weight = sum(self.weights.values())
+        self.hits = dict()
+        self.total_hits = 0
+        self.baseline_miss_rate = None
+        self.packets_since_check = 0
+        self.packets_since_refresh = 0
+        self.last_packets = switch.num_packets
+        self.last_misses = switch.num_misses
@@ -0,0 +1,356 @@
+from ipaddress import IPv4Network
+from sortedcontainers import SortedKeyList
+from rules.rule import Rule
+from rules.action import Action
+from rules.pattern import IPv4DstPattern, IPv4SrcPattern
+from rules.header_space import Ternary, is_shadowed
+
+
+# pattern types holding a prefix that sibling rules can be merged on
+PREFIX_PATTERNS = (IPv4SrcPattern, IPv4DstPattern)
+
+
+def _action_key(action: Action) -> tuple:
+    return action.type, getattr(action, "forward_port", None)
+
+
+def _pattern_key(pattern) -> tuple:
+    if type(pattern) in PREFIX_PATTERNS:
+        return type(pattern).__name__, (pattern.network, pattern.prefixlen)
+    return type(pattern).__name__, tuple(sorted(vars(pattern).items()))
+
+
+class CompressedRule (Rule):
+    """
+    A rule of the compressed table, standing for one or more rules of the
+    original table. Its counter is the number of packets it matched itself in
+    the hardware switch, plus every packet the rules it stands for matched in
+    the software switch.
+    """
+
+    # the rules of the original table merged into this one, and the redundant
+    # rules whose packets it matches in their place
+    members: list
+    absorbed: list
+
+    # packets matched by this rule itself
+    hits: int
+
+    def __init__(self, patterns, action: Action, priority: int, members: list):
+        self.members = members
+        self.absorbed = []
+        # ordered among rules of equal priority as its highest member is
+        super().__init__(patterns, action, priority,
+                         max(members, key=Rule.sort_key).id)
+
+    @property
+    def counter(self) -> int:
+        return self.hits + sum(rule.counter for rule in self.members) + \
+            sum(rule.counter for rule in self.absorbed)
+
+    @counter.setter
+    def counter(self, value: int):
+        self.hits = value
+
+    def increment_counter(self, amount: int = 1):
+        self.hits += amount
+
+
+class RuleCompressor:
+    """
+    Maintains a compressed copy of a rule table, matching every packet with
+    the same action as the original does but with fewer rules. Rules that are
+    shadowed by higher priority rules are dropped. A rule is redundant, and
+    dropped too, if the next lower priority rule it intersects covers it with
+    the same action, as its packets would go to that rule anyway. Rules with
+    the same action whose patterns only differ in sibling source or
+    destination prefixes are merged into one rule on the parent prefix, as
+    long as no other rule with a priority between theirs intersects them.
+
+    When a rule is added or removed only the rules it intersects, and the
+    groups they were compressed into, are compressed again.
+    """
+
+    # the original table, sorted by Rule.sort_key - this is shared
+    # with the owner, which must call add_rule after inserting a rule into the
+    # table and remove_rule after removing it
+    rules: SortedKeyList
+
+    # the most vectors the unshadowed part of a rule may take before it is
+    # assumed not to be shadowed
+    max_cubes: int
+
+    # cubes[r] = header space of r, or None if it matches nothing
+    cubes: dict
+
+    # representative[r] = compressed rule standing for r, or None if r is
+    # shadowed
+    representative: dict
+    shadowed: set
+    redundant: set
+
+    # the rules of the compressed table
+    compressed: set
+
+    # index[key] = compressed rules with the prefix and other patterns and
+    # action in key, for finding siblings to merge with - keys[c] = keys of c
+    index: dict
+    keys: dict
+
+    def __init__(self, rules: SortedKeyList, max_cubes: int = 64):
+        """Create a compressed copy of the given rule table."""
+        self.rules = rules
+        self.max_cubes = max_cubes
+
+        self.cubes = dict()
+        self.representative = dict()
+        self.shadowed = set()
+        self.redundant = set()
+        self.compressed = set()
+        self.index = dict()
+        self.keys = dict()
+
+        # the rules already in the table are compressed in one pass, lower
+        # rules first as when a rule's group is compressed again
+        for rule in rules:
+            self.cubes[rule] = Ternary.from_rule(rule)
+        delta = set(), set()
+        for rule in rules:
+            self._place(rule, None, dict(), delta)
+
+    def add_rule(self, rule: Rule) -> tuple:
+        """
+        Compress a rule that has just been inserted into the table. Returns
+        the compressed rules that have left the compressed table, and those
+        that have joined it.
+        """
+        cube = Ternary.from_rule(rule)
+        self.cubes[rule] = cube
+        return self._update(rule, cube)
+
+    def remove_rule(self, rule: Rule) -> tuple:
+        """
+        Forget a rule that has just been removed from the table. Returns the
+        compressed rules that have left the compressed table, and those that
+        have joined it.
+        """
+        return self._update(rule, self.cubes.pop(rule))
+
+    def _forget(self, rule: Rule):
+        self.representative.pop(rule, None)
+        self.shadowed.discard(rule)
+        self.redundant.discard(rule)
+
+    def _update(self, rule: Rule, cube: Ternary) -> tuple:
+        """Compress every rule intersecting the changed rule again, along with
+        the other rules of their groups."""
+        affected = {rule}
+        if cube is not None:
+            for other in self.rules:
+                other_cube = self.cubes[other]
+                if other_cube is not None and cube.intersects(other_cube):
+                    affected.add(other)
+
+        # whether a rule is shadowed only changes if the changed rule
+        # intersects it from above
+        shadowed = {other: other in self.shadowed for other in affected
+                    if other is not rule and other.sort_key() > rule.sort_key()}
+
+        # dissolved[members] = dissolved compressed rule, reused if the same
+        # rules are merged together again
+        dissolved = dict()
+        delta = set(), set()
+        for representative in {self.representative.get(r) for r in affected}:
+            if representative is None:
+                continue
+            for other in representative.members + representative.absorbed:
+                if other not in affected:
+                    affected.add(other)
+                    shadowed[other] = False
+            dissolved[frozenset(representative.members)] = representative
+            self._retire(representative, delta)
+
+        for other in affected:
+            self._forget(other)
+        if rule not in self.cubes:
+            affected.discard(rule)
+
+        # lower rules first, so a redundant rule finds the group of the rule
+        # covering it
+        for other in sorted(affected, key=self.rules.index):
+            self._place(other, shadowed.get(other), dissolved, delta)
+
+        return delta
+
+    def _retire(self, compressed: CompressedRule, delta: tuple):
+        left, joined = delta
+        self.compressed.discard(compressed)
+        for key in self.keys.pop(compressed):
+            self.index[key].discard(compressed)
+            if len(self.index[key]) == 0:
+                del self.index[key]
+
+        if compressed in joined:
+            joined.discard(compressed)
+        else:
+            left.add(compressed)
+
+    def _admit(self, compressed: CompressedRule, delta: tuple):
+        left, joined = delta
+        self.compressed.add(compressed)
+        self.keys[compressed] = [key for key, _, _ in self._merge_keys(compressed)]
+        for key in self.keys[compressed]:
+            self.index.setdefault(key, set()).add(compressed)
+        for rule in compressed.members:
+            self.representative[rule] = compressed
+        for rule in compressed.absorbed:
+            self.representative[rule] = compressed
+
+        if compressed in left:
+            left.discard(compressed)
+        else:
+            joined.add(compressed)
+
+    @staticmethod
+    def _merge_keys(compressed: CompressedRule) -> list:
+        """
+        Get the index key of each prefix of a compressed rule, along with the
+        key its sibling would have and the position of the prefix.
+        """
+        patterns = compressed.patterns
+        action = _action_key(compressed.action)
+        merge_keys = []
+        for i, pattern in enumerate(patterns):
+            if type(pattern) not in PREFIX_PATTERNS or pattern.prefixlen == 0:
+                continue
+            others = tuple(sorted(_pattern_key(p)
+                           for j, p in enumerate(patterns) if j != i))
+            bit = 1 << (32 - pattern.prefixlen)
+            key = type(pattern), pattern.network, pattern.prefixlen, others, action
+            sibling = type(pattern), pattern.network ^ bit, pattern.prefixlen, others, action
+            merge_keys.append((key, sibling, i))
+        return merge_keys
+
+    def _place(self, rule: Rule, shadowed: bool, dissolved: dict, delta: tuple):
+        """
+        Find the compressed rule a rule belongs to. Whether the rule is
+        shadowed is worked out unless it is already known.
+        """
+        cube = self.cubes[rule]
+        pos = self.rules.index(rule)
+        if shadowed is None:
+            shadowed = cube is None or self._is_shadowed(cube, pos)
+        if shadowed:
+            self.representative[rule] = None
+            self.shadowed.add(rule)
+            return
+
+        for lower in self.rules.islice(stop=pos, reverse=True):
+            lower_cube = self.cubes[lower]
+            if lower_cube is None or not lower_cube.intersects(cube):
+                continue
+            representative = self.representative.get(lower)
+            if lower_cube.subsumes(cube) and representative is not None and \
+                    _action_key(lower.action) == _action_key(rule.action):
+                representative.absorbed.append(rule)
+                self.representative[rule] = representative
+                self.redundant.add(rule)
+                return
+            break
+
+        compressed = self._create(rule.patterns, rule.action, [rule], [], dissolved)
+        self._admit(compressed, delta)
+        self._merge(compressed, dissolved, delta)
+
+    def _is_shadowed(self, cube: Ternary, pos: int) -> bool:
+        higher = []
+        for other in self.rules.islice(pos + 1):
+            other_cube = self.cubes[other]
+            if other_cube is not None and cube.intersects(other_cube):
+                if other_cube.subsumes(cube):
+                    return True
+                higher.append(other_cube)
+        # the broadest rules first, as they leave the fewest pieces behind
+        higher.sort(key=lambda c: bin(c.mask).count("1"))
+        return is_shadowed(cube, higher, self.max_cubes)
+
+    @staticmethod
+    def _create(patterns: list, action: Action, members: list, absorbed: list,
+                dissolved: dict) -> CompressedRule:
+        compressed = dissolved.pop(frozenset(members), None)
+        if compressed is None:
+            compressed = CompressedRule(patterns, action,
+                                        max(rule.priority for rule in members), members)
+        compressed.absorbed = absorbed
+        return compressed
+
+    def _merge(self, compressed: CompressedRule, dissolved: dict, delta: tuple):
+        """Merge a compressed rule with its siblings for as long as it has
+        one."""
+        while True:
+            found = self._find_sibling(compressed)
+            if found is None:
+                return
+            sibling, i = found
+
+            pattern = compressed.patterns[i]
+            prefix = IPv4Network((pattern.network & ~(1 << (32 - pattern.prefixlen)),
+                                  pattern.prefixlen - 1))
+            patterns = list(compressed.patterns)
+            patterns[i] = type(pattern)(prefix)
+
+            merged = self._create(patterns, compressed.action,
+                                  compressed.members + sibling.members,
+                                  compressed.absorbed + sibling.absorbed, dissolved)
+            self._retire(compressed, delta)
+            self._retire(sibling, delta)
+            self._admit(merged, delta)
+            compressed = merged
+
+    def _find_sibling(self, compressed: CompressedRule):
+        """Get a compressed rule that can be merged with the given one, along
+        with the position of the prefix they differ in, or None."""
+        for _, sibling_key, i in self._merge_keys(compressed):
+            for sibling in self.index.get(sibling_key, ()):
+                if self._can_merge(compressed, sibling):
+                    return sibling, i
+        return None
+
+    def _can_merge(self, first: CompressedRule, second: CompressedRule) -> bool:
+        """
+        Two siblings can be merged if no other rule with a priority between
+        their lowest and highest members intersects either of them. The
+        merged rule takes the highest priority, so it still matches every
+        packet either of them did.
+        """
+        members = first.members + second.members
+        grouped = set(members)
+        grouped.update(first.absorbed, second.absorbed)
+
+        cubes = Ternary.from_rule(first), Ternary.from_rule(second)
+        low = min(rule.priority for rule in members)
+        high = max(rule.priority for rule in members)
+        for rule in self.rules.irange_key((low,), (high, float("inf"))):
+            if rule in grouped or self.cubes[rule] is None:
+                continue
+            if cubes[0].intersects(self.cubes[rule]) or cubes[1].intersects(self.cubes[rule]):
+                return False
+        return True
+
+    def get_stats(self) -> dict:
+        """
+        Get the number of rules in the original and compressed tables, the
+        number dropped as shadowed or redundant and the number merged into
+        another rule, and the compression ratio - the number of original rules
+        per compressed rule.
+        """
+        num_rules = len(self.rules)
+        num_compressed = len(self.compressed)
+        return {
+            "rules": num_rules,
+            "compressed": num_compressed,
+            "shadowed": len(self.shadowed),
+            "redundant": len(self.redundant),
+            "merged": sum(len(c.members) - 1 for c in self.compressed),
+            "ratio": num_rules / num_compressed if num_compressed > 0 else 1.0,
+        }
@@ -0,0 +1,96 @@
+from rules.rule import Rule
+
+
+class RuleTransaction:
+    """
+    A batch of rule updates for a cache switch. Rules added and removed
+    through the transaction are only staged, and are applied to the switch
+    together on commit, so the dependency graph and cache are updated once
+    for the whole batch. Adding a rule staged for removal, or removing one
+    staged to be added, cancels the earlier update. Used as a context manager,
+    the transaction commits when the block exits and discards the staged
+    updates if it raises.
+    """
+
+    switch: object
+
+    # the staged updates, in the order they were made - dicts are used as
+    # ordered sets
+    added: dict
+    removed: dict
+
+    def __init__(self, switch):
+        self.switch = switch
+        self.added = dict()
+        self.removed = dict()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+        return False
+
+    def add_rule(self, rule: Rule):
+        """Stage a rule to be added."""
+        if rule in self.removed:
+            del self.removed[rule]
+        else:
+            self.added[rule] = None
+
+    def remove_rule(self, rule: Rule):
+        """Stage a rule to be removed."""
+        if rule in self.added:
+            del self.added[rule]
+        else:
+            self.removed[rule] = None
+
+    def commit(self):
+        """
+        Apply the staged updates to the switch. If the switch rejects them,
+        none are applied and they stay staged.
+        """
+        self.switch.commit_rules(list(self.added), list(self.removed))
+        self.added = dict()
+        self.removed = dict()
+
+    def rollback(self):
+        """Discard the staged updates."""
+        self.added = dict()
+        self.removed = dict()
+
+
+def apply_rules(switch, added: list, removed: list):
+    """
+    Apply a batch of rule updates to a cache switch, which must hold its lock.
+    The whole batch is checked before anything is applied, so a rule removed
+    that is not in the table, or one added whose id is already taken, raises a
+    ValueError and leaves the switch as it was. Batches changing more than
+    the switch's bulk_update_fraction of the table are applied with
+    set_rules, and smaller ones rule by rule with a single cache refresh.
+    """
+    for rule in removed:
+        if switch.rules_by_id.get(rule.id) is not rule:
+            raise ValueError(f"The rule with id {rule.id} is not in the table.")
+    removed_ids = {rule.id for rule in removed}
+    added_ids = set()
+    for rule in added:
+        if rule.id in added_ids or \
+                (rule.id in switch.rules_by_id and rule.id not in removed_ids):
+            raise ValueError(f"A rule with id {rule.id} is already in the table.")
+        added_ids.add(rule.id)
+
+    if len(added) + len(removed) > switch.bulk_update_fraction * len(switch.all_rules):
+        rules = [rule for rule in switch.all_rules if rule.id not in removed_ids]
+        rules.extend(added)
+        switch.set_rules(rules)
+        return
+
+    for rule in removed:
+        switch._delete_rule(rule)
+    for rule in added:
+        switch._insert_rule(rule)
+    switch._update_cache()
@@ -0,0 +1,311 @@
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from ipaddress import IPv4Network
+from rules.rule import Rule
+from rules.action import ActionType, ForwardAction
+from rules.rule_io import ACTION_TYPES
+from switches.dependency_graph import DependencyGraph, bit_positions, to_bits
+from rules.pattern import IPv4DstPattern, IPv4SrcPattern, InPortPattern, \
+    TCPDPortPattern, TCPSPortPattern
+
+
+MAGIC = b"CFSNAPSH"
+VERSION = 1
+
+# flags of the header
+FLAG_GRAPH = 1
+FLAG_EXACT = 2
+
+# magic, version, flags, number of rules, of cached rules, of covered rules,
+# of direct dependencies, and bytes per closure
+HEADER = struct.Struct("<8sHHIIIII")
+
+# priority, counter, action type, forward port, the patterns present, in
+# port, source network and prefix length, destination network and prefix
+# length, source port and destination port
+RULE = struct.Struct("<qqBqBQIBIBQQ")
+
+# the bit of the patterns present field set for each pattern type
+PATTERN_BITS = {
+    InPortPattern: 1,
+    IPv4SrcPattern: 2,
+    IPv4DstPattern: 4,
+    TCPSPortPattern: 8,
+    TCPDPortPattern: 16,
+}
+
+
+class Snapshot:
+    """
+    The state of a cache switch as saved in a snapshot file. Rules are kept in
+    ascending order of Rule.sort_key and referred to by their position in
+    that order. The dependency graph is only saved for switches that select
+    the cache from the original table, and is None otherwise.
+    """
+
+    # the rules, with their counters
+    rules: list
+
+    # positions of the cached rules and of the rules covered in the hardware
+    # switch
+    cached: list
+    covered: list
+
+    # whether the graph holds exact dependencies
+    exact: bool
+
+    # direct[i] = positions of the rules rule i directly depends on -
+    # closures[i] = bitset of the positions of every rule it depends on
+    direct: list
+    closures: list
+
+    def __init__(self, rules: list, cached: list = (), covered: list = (),
+                 exact: bool = False, direct: list = None, closures: list = None):
+        self.rules = rules
+        self.cached = list(cached)
+        self.covered = list(covered)
+        self.exact = exact
+        self.direct = direct
+        self.closures = closures
+
+
+def _pack_rule(rule: Rule) -> bytes:
+    present = 0
+    in_port = 0
+    src = 0
+    src_prefixlen = 0
+    dst = 0
+    dst_prefixlen = 0
+    sport = 0
+    dport = 0
+    for pattern in rule.patterns:
+        bit = PATTERN_BITS[type(pattern)]
+        if present & bit:
+            raise ValueError(
+                f"Rule {rule.id} has more than one {type(pattern).__name__}.")
+        present |= bit
+
+        if type(pattern) == InPortPattern:
+            in_port = pattern.in_port
+        elif type(pattern) == IPv4SrcPattern:
+            src = pattern.network
+            src_prefixlen = pattern.prefixlen
+        elif type(pattern) == IPv4DstPattern:
+            dst = pattern.network
+            dst_prefixlen = pattern.prefixlen
+        elif type(pattern) == TCPSPortPattern:
+            sport = pattern.tcp_sport
+        else:
+            dport = pattern.tcp_dport
+
+    forward_port = -1
+    if rule.action.type == ActionType.FORWARD:
+        forward_port = rule.action.forward_port
+
+    return RULE.pack(rule.priority, rule.counter, rule.action.type.value, forward_port,
+                     present, in_port, src, src_prefixlen, dst, dst_prefixlen,
+                     sport, dport)
+
+
+def _unpack_rule(fields: tuple) -> Rule:
+    priority, counter, action_type, forward_port, present, in_port, src, \
+        src_prefixlen, dst, dst_prefixlen, sport, dport = fields
+
+    patterns = []
+    if present & PATTERN_BITS[InPortPattern]:
+        patterns.append(InPortPattern(in_port))
+    if present & PATTERN_BITS[IPv4SrcPattern]:
+        patterns.append(IPv4SrcPattern(IPv4Network((src, src_prefixlen))))
+    if present & PATTERN_BITS[IPv4DstPattern]:
+        patterns.append(IPv4DstPattern(IPv4Network((dst, dst_prefixlen))))
+    if present & PATTERN_BITS[TCPSPortPattern]:
+        patterns.append(TCPSPortPattern(sport))
+    if present & PATTERN_BITS[TCPDPortPattern]:
+        patterns.append(TCPDPortPattern(dport))
+
+    action_type = ActionType(action_type)
+    if action_type == ActionType.FORWARD:
+        action = ForwardAction(forward_port)
+    else:
+        action = ACTION_TYPES[action_type]()
+
+    rule = Rule(patterns, action, priority)
+    rule.counter = counter
+    return rule
+
+
+def _pack_positions(positions: list) -> bytes:
+    positions = array("I", positions)
+    if sys.byteorder != "little":
+        positions.byteswap()
+    return positions.tobytes()
+
+
+def _unpack_positions(data) -> list:
+    positions = array("I")
+    positions.frombytes(data)
+    if sys.byteorder != "little":
+        positions.byteswap()
+    return positions.tolist()
+
+
+def write_snapshot(snapshot: Snapshot, path: str):
+    """
+    Write a snapshot to a binary file. The file holds a fixed size header,
+    then a fixed size record per rule, the cached and covered positions, and,
+    if the graph is saved, the direct dependencies as offsets into a flat
+    list of positions followed by a fixed size bitset per closure. The whole
+    file is built before anything is written, so a rule that cannot be saved
+    (one with two patterns of the same type) raises a ValueError without
+    touching the file. It is written to a temporary file next to it which then
+    replaces it, so an existing snapshot is never left half written.
+    """
+    num_rules = len(snapshot.rules)
+    flags = 0
+    num_edges = 0
+    closure_bytes = 0
+    if snapshot.direct is not None:
+        flags |= FLAG_GRAPH
+        num_edges = sum(len(direct) for direct in snapshot.direct)
+        closure_bytes = (num_rules + 7) // 8
+    if snapshot.exact:
+        flags |= FLAG_EXACT
+
+    sections = [
+        HEADER.pack(MAGIC, VERSION, flags, num_rules, len(snapshot.cached),
+                    len(snapshot.covered), num_edges, closure_bytes),
+        b"".join(_pack_rule(rule) for rule in snapshot.rules),
+        _pack_positions(snapshot.cached),
+        _pack_positions(snapshot.covered),
+    ]
+
+    if snapshot.direct is not None:
+        offsets = [0]
+        for direct in snapshot.direct:
+            offsets.append(offsets[-1] + len(direct))
+        sections.append(_pack_positions(offsets))
+        sections.append(_pack_positions([i for direct in snapshot.direct for i in direct]))
+        sections.append(b"".join(closure.to_bytes(closure_bytes, "little")
+                                 for closure in snapshot.closures))
+
+    fd, temp_path = tempfile.mkstemp(
+        prefix=".snapshot-", dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(b"".join(sections))
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def read_snapshot(path: str) -> Snapshot:
+    """
+    Read a snapshot written by write_snapshot. The file is memory mapped
+    rather than read into memory, and the fixed size rule records are unpacked
+    straight from the mapping. Every rule is still turned into a Rule object,
+    which is most of the time a load takes. The rules are given new ids, in
+    the order they were saved in.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size < HEADER.size:
+            raise ValueError(f"{path} is not a cache switch snapshot.")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return _read_snapshot(path, data)
+
+
+def _read_snapshot(path: str, data) -> Snapshot:
+    magic, version, flags, num_rules, num_cached, num_covered, num_edges, \
+        closure_bytes = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a cache switch snapshot.")
+    if version != VERSION:
+        raise ValueError(f"{path} has snapshot version {version}, not {VERSION}.")
+
+    offset = HEADER.size
+    end = offset + num_rules * RULE.size
+    rules = [_unpack_rule(RULE.unpack_from(data, position))
+             for position in range(offset, end, RULE.size)]
+
+    offset, end = end, end + 4 * num_cached
+    cached = _unpack_positions(data[offset:end])
+    offset, end = end, end + 4 * num_covered
+    covered = _unpack_positions(data[offset:end])
+
+    snapshot = Snapshot(rules, cached, covered, exact=bool(flags & FLAG_EXACT))
+    if flags & FLAG_GRAPH:
+        offset, end = end, end + 4 * (num_rules + 1)
+        offsets = _unpack_positions(data[offset:end])
+        offset, end = end, end + 4 * num_edges
+        edges = _unpack_positions(data[offset:end])
+        snapshot.direct = [edges[offsets[i]:offsets[i + 1]] for i in range(num_rules)]
+
+        offset = end
+        snapshot.closures = []
+        for i in range(num_rules):
+            snapshot.closures.append(
+                int.from_bytes(data[offset:offset + closure_bytes], "little"))
+            offset += closure_bytes
+
+    return snapshot
+
+
+def take_snapshot(switch) -> Snapshot:
+    """
+    Get the snapshot of a cache switch, which must hold its lock. With
+    compression, only the rules and their counters are kept, as the graph and
+    cache are over the compressed table.
+    """
+    rules = list(switch.all_rules)
+    snapshot = Snapshot(rules, exact=switch.dependencies.exact)
+
+    if switch.compressor is None:
+        graph = switch.dependencies
+        positions = {rule: i for i, rule in enumerate(rules)}
+        slot_positions = [positions.get(rule) for rule in graph.slot_rules]
+        snapshot.cached = sorted(positions[rule] for rule in switch.cached_rules)
+        snapshot.covered = sorted(positions[rule] for rule in switch.cover_rules)
+        snapshot.direct = [sorted(positions[higher] for higher in graph.direct[rule])
+                           for rule in rules]
+        snapshot.closures = [
+            to_bits(slot_positions[slot] for slot in bit_positions(graph.closure[rule]))
+            for rule in rules]
+
+    return snapshot
+
+
+def restore_snapshot(switch, snapshot: Snapshot):
+    """
+    Replace the rule table of a cache switch, which must hold its lock, with
+    the rules in a snapshot. The saved graph and cache selection are used as
+    they are, unless the graph is missing or of the wrong kind for the
+    switch, in which case the table is loaded with set_rules and the cache
+    selected from the saved counters. The popularity estimator is reset, as
+    its state is keyed on the rules being replaced.
+    """
+    switch.popularity.reset()
+
+    if snapshot.direct is None or switch.compressor is not None or \
+            snapshot.exact != switch.dependencies.exact:
+        switch.set_rules(snapshot.rules)
+        return
+
+    switch.all_rules.clear()
+    switch.dependencies = DependencyGraph(
+        switch.all_rules, exact=switch.dependencies.exact,
+        max_cubes=switch.dependencies.max_cubes)
+    switch.all_rules.update(snapshot.rules)
+    switch.rules_by_id = {rule.id: rule for rule in snapshot.rules}
+    switch.sw_switch.set_rules(switch.all_rules)
+    switch._table_version += 1
+    switch._invalidate_flows()
+
+    switch.dependencies.restore(snapshot.direct, snapshot.closures)
+    switch._install_cache(switch.dependencies.slot_rules,
+                          set(snapshot.cached), set(snapshot.covered))
+    switch.scheduler.refreshed(switch)
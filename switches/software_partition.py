@@ -0,0 +1,6 @@
+from enum import Enum
+
+
+class SoftwarePartition(Enum):
+    PREFIX = "Prefix"
+    HASH = "Hash"
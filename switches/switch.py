@@ -20,3 +20,10 @@ class Switch:
     def packet_in(self, packet: Packet, port: int = None) -> Action:
         """Send a packet intot the switch on the given port."""
         pass
+
+    def packets_in(self, packets: list, port: int = None) -> list:
+        """
+        Send a batch of packets into the switch. If a port is given, every
+        packet arrives on that port. Returns the action for each packet.
+        """
+        pass
@@ -0,0 +1,144 @@
+from sortedcontainers import SortedList
+from rules.rule import Rule
+from rules.pattern import IPv4DstPattern, IPv4SrcPattern, InPortPattern, \
+    TCPDPortPattern, TCPSPortPattern
+from network.packet import Packet
+from switches.classifier import Classifier
+
+
+class _TrieNode:
+
+    __slots__ = ("children", "bucket")
+
+    def __init__(self):
+        self.children = [None, None]
+        self.bucket = None
+
+
+class TrieClassifier (Classifier):
+    """
+    Indexes each rule by one of its fields so that a lookup only has to check
+    the few rules that could possibly match. Rules are indexed by their
+    destination prefix, their source prefix, or one of their exact-match fields,
+    in that order of preference. Prefixes are stored in binary tries and walked
+    along the packet's address, while exact-match fields are stored in hash
+    tables. Rules that have none of these fields are kept in a wildcard bucket.
+
+    Each bucket holds its rules in descending order of priority, so a lookup
+    stops scanning a bucket at its first match, and skips it entirely once a
+    better match has been found elsewhere.
+    """
+
+    dst_trie: _TrieNode
+    src_trie: _TrieNode
+
+    # exact[pattern_type][value] = bucket of rules
+    exact: dict
+
+    wildcard: SortedList
+
+    # entries[rule] = sort key, bucket - used for removal
+    entries: dict
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.dst_trie = _TrieNode()
+        self.src_trie = _TrieNode()
+        self.exact = {
+            InPortPattern: dict(),
+            TCPDPortPattern: dict(),
+            TCPSPortPattern: dict(),
+        }
+        self.wildcard = SortedList()
+        self.entries = dict()
+
+    def _get_bucket(self, rule: Rule) -> SortedList:
+        """Find or create the bucket that a rule is indexed in."""
+        for trie, pattern_type in ((self.dst_trie, IPv4DstPattern), (self.src_trie, IPv4SrcPattern)):
+            for pattern in rule.patterns:
+                if type(pattern) == pattern_type and pattern.prefixlen > 0:
+                    return self._get_trie_bucket(trie, pattern)
+
+        for pattern_type, table in self.exact.items():
+            for pattern in rule.patterns:
+                if type(pattern) == pattern_type:
+                    value = self._exact_value(pattern)
+                    if value not in table:
+                        table[value] = SortedList()
+                    return table[value]
+
+        return self.wildcard
+
+    def _get_trie_bucket(self, trie: _TrieNode, pattern) -> SortedList:
+        node = trie
+        for depth in range(pattern.prefixlen):
+            bit = (pattern.network >> (31 - depth)) & 1
+            if node.children[bit] is None:
+                node.children[bit] = _TrieNode()
+            node = node.children[bit]
+
+        if node.bucket is None:
+            node.bucket = SortedList()
+        return node.bucket
+
+    @staticmethod
+    def _exact_value(pattern) -> int:
+        if type(pattern) == InPortPattern:
+            return pattern.in_port
+        if type(pattern) == TCPDPortPattern:
+            return pattern.tcp_dport
+        return pattern.tcp_sport
+
+    def add_rule(self, rule: Rule):
+        # sorts in descending order of priority, then of id
+        key = (-rule.priority, -rule.id)
+        bucket = self._get_bucket(rule)
+        bucket.add((key, rule))
+        self.entries[rule] = key, bucket
+
+    def remove_rule(self, rule: Rule):
+        key, bucket = self.entries.pop(rule)
+        bucket.remove((key, rule))
+
+    def _candidate_buckets(self, packet: Packet) -> list:
+        """Get every bucket that could hold a rule matching the packet."""
+        buckets = []
+
+        for trie, address in ((self.dst_trie, packet.ipv4_dst), (self.src_trie, packet.ipv4_src)):
+            if address is None:
+                continue
+            node = trie
+            for depth in range(32):
+                node = node.children[(address >> (31 - depth)) & 1]
+                if node is None:
+                    break
+                if node.bucket:
+                    buckets.append(node.bucket)
+
+        for value, table in ((packet.in_port, self.exact[InPortPattern]),
+                             (packet.tcp_dport, self.exact[TCPDPortPattern]),
+                             (packet.tcp_sport, self.exact[TCPSPortPattern])):
+            bucket = table.get(value)
+            if bucket:
+                buckets.append(bucket)
+
+        if self.wildcard:
+            buckets.append(self.wildcard)
+
+        return buckets
+
+    def lookup(self, packet: Packet) -> Rule:
+        best_key = None
+        best_rule = None
+        for bucket in self._candidate_buckets(packet):
+            for key, rule in bucket:
+                if best_key is not None and key >= best_key:
+                    break
+                if rule.matches(packet):
+                    best_key = key
+                    best_rule = rule
+                    break
+
+        return best_rule
@@ -0,0 +1,172 @@
+from sortedcontainers import SortedKeyList
+from rules.rule import Rule
+from rules.pattern import IPv4DstPattern, IPv4SrcPattern, InPortPattern, \
+    TCPSPortPattern
+from network.packet import Packet
+from switches.classifier import Classifier
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# the packet fields the rule table is compiled over, in array order
+FIELDS = ("in_port", "ipv4_src", "ipv4_dst", "tcp_sport", "tcp_dport")
+
+# used in place of missing packet fields - a missing field only matches
+# rules that wildcard it, which is checked separately from the masked compare
+MISSING = -1
+
+# the largest number of packet/rule comparisons made in a single step
+CHUNK_CELLS = 1 << 22
+
+
+def _pattern_ternary(pattern) -> tuple:
+    """Get the field index, value and mask matched by a pattern."""
+    if type(pattern) == InPortPattern:
+        return 0, pattern.in_port, -1
+    if type(pattern) == IPv4SrcPattern:
+        return 1, pattern.network, pattern.mask
+    if type(pattern) == IPv4DstPattern:
+        return 2, pattern.network, pattern.mask
+    if type(pattern) == TCPSPortPattern:
+        return 3, pattern.tcp_sport, -1
+    return 4, pattern.tcp_dport, -1
+
+
+def _matches(rule: Rule, packet: Packet) -> bool:
+    """Check a rule against a packet the way the compiled table does, with
+    missing packet fields only matching wildcarded patterns."""
+    for pattern in rule.patterns:
+        field, value, mask = _pattern_ternary(pattern)
+        packet_value = getattr(packet, FIELDS[field])
+        if packet_value is None:
+            if mask != 0:
+                return False
+        elif (packet_value & mask) != (value & mask):
+            return False
+    return True
+
+
+class VectorClassifier (Classifier):
+    """
+    Compiles the rule table into NumPy arrays holding a value and a mask for
+    every field, and matches whole batches of packets against every rule at
+    once with vectorized mask-and-compare operations. Wildcarded fields have a
+    mask of zero, and exact-match fields have a mask of all ones.
+
+    This is intended for bulk classification, such as offline trace replay.
+    The arrays are recompiled lazily on the first batch lookup after the table
+    changes. A single-packet lookup against a changed table scans the rules
+    instead, leaving the recompile to the next batch, so a table updated
+    between single packets is never recompiled for each of them.
+    """
+
+    # rules in ascending order of priority, then of id
+    rules: SortedKeyList
+
+    # the compiled table - None when it needs recompiling
+    compiled_rules: list
+    values: object
+    masks: object
+    valid: object
+    # wildcards[field, i] = whether rule i matches any value of the field,
+    # including a missing one
+    wildcards: object
+
+    def __init__(self):
+        if np is None:
+            raise ImportError(
+                "The vector lookup engine requires numpy to be installed.")
+        self.clear()
+
+    def clear(self):
+        self.rules = SortedKeyList([], key=Rule.sort_key)
+        self.compiled_rules = None
+
+    def add_rule(self, rule: Rule):
+        self.rules.add(rule)
+        self.compiled_rules = None
+
+    def remove_rule(self, rule: Rule):
+        self.rules.remove(rule)
+        self.compiled_rules = None
+
+    def _compile(self):
+        """Compile the rule table into value and mask arrays."""
+        num_rules = len(self.rules)
+        values = np.zeros((len(FIELDS), num_rules), dtype=np.int64)
+        masks = np.zeros((len(FIELDS), num_rules), dtype=np.int64)
+        valid = np.ones(num_rules, dtype=bool)
+
+        for i, rule in enumerate(self.rules):
+            for pattern in rule.patterns:
+                field, value, mask = _pattern_ternary(pattern)
+                # a rule matching one field twice needs both patterns to agree
+                if (int(values[field, i]) ^ value) & int(masks[field, i]) & mask:
+                    valid[i] = False
+                values[field, i] |= value & mask
+                masks[field, i] |= mask
+
+        self.values = values
+        self.masks = masks
+        self.valid = valid
+        self.wildcards = masks == 0
+        self.compiled_rules = list(self.rules)
+
+    def match_indices(self, in_port, ipv4_src, ipv4_dst, tcp_sport, tcp_dport):
+        """
+        Match a batch of packets given as integer arrays, one per field, with
+        missing values given as -1. Returns an array holding, for each packet,
+        the index in compiled_rules of the highest priority matching rule, or
+        -1 if no rule matches. Rule counters are not updated.
+        """
+        if self.compiled_rules is None:
+            self._compile()
+
+        columns = [np.asarray(column, dtype=np.int64)
+                   for column in (in_port, ipv4_src, ipv4_dst, tcp_sport, tcp_dport)]
+        # fields that are missing from some packets - None if none are
+        missing = [column == MISSING for column in columns]
+        missing = [None if not is_missing.any() else is_missing for is_missing in missing]
+        num_packets = len(columns[0])
+        num_rules = len(self.compiled_rules)
+
+        winners = np.full(num_packets, -1, dtype=np.int64)
+        if num_rules == 0:
+            return winners
+
+        chunk = max(1, CHUNK_CELLS // num_rules)
+        for start in range(0, num_packets, chunk):
+            end = min(start + chunk, num_packets)
+            matched = np.broadcast_to(self.valid, (end - start, num_rules)).copy()
+            for field, column in enumerate(columns):
+                matched &= (column[start:end, None] & self.masks[field]) \
+                    == self.values[field]
+                if missing[field] is not None:
+                    matched &= ~missing[field][start:end, None] | self.wildcards[field]
+
+            # the winner is the last matching rule in the table
+            reversed_first = np.argmax(matched[:, ::-1], axis=1)
+            found = matched.any(axis=1)
+            winners[start:end] = np.where(
+                found, num_rules - 1 - reversed_first, -1)
+
+        return winners
+
+    def lookup_batch(self, packets: list) -> list:
+        columns = [[MISSING if value is None else value
+                    for value in (getattr(packet, field) for packet in packets)]
+                   for field in FIELDS]
+        winners = self.match_indices(*columns)
+        rules = self.compiled_rules
+        return [None if i < 0 else rules[i] for i in winners.tolist()]
+
+    def lookup(self, packet: Packet) -> Rule:
+        if self.compiled_rules is None:
+            for rule in reversed(self.rules):
+                if _matches(rule, packet):
+                    return rule
+            return None
+        return self.lookup_batch([packet])[0]
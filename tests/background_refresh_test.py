@@ -0,0 +1,49 @@
+import random
+from ipaddress import ip_network
+from rules.rule import Rule
+from rules.action import ForwardAction
+from rules.pattern import IPv4DstPattern
+from network.packet import Packet
+from switches.cache_switch import CacheSwitch
+from switches.cache_switch_config import CacheSwitchConfig
+from switches.cache_algorithm import CacheAlgorithm
+from switches.refresh_scheduler import PacketCountScheduler
+from random_rules import check_forwarding
+
+
+def test_background_refresh_forwarding():
+    for algorithm in CacheAlgorithm:
+        if algorithm == CacheAlgorithm.OPTIMAL:
+            continue
+        for seed in range(3):
+            rng = random.Random(seed)
+            config = CacheSwitchConfig(background_refresh=True,
+                                       scheduler=PacketCountScheduler(rng.choice([1, 5, 20])))
+            switch = CacheSwitch("s1", algorithm, rng.choice([3, 8, 15]), config=config)
+            check_forwarding(switch, rng, num_steps=500, update_rate=0.03, batch=seed == 1)
+            switch.close()
+
+
+def test_updates_apply_before_the_refresh_finishes():
+    switch = CacheSwitch("s1", CacheAlgorithm.DEPENDENT_SET, 4,
+                         config=CacheSwitchConfig(background_refresh=True,
+                                                  scheduler=PacketCountScheduler(1)))
+    low = Rule([IPv4DstPattern(ip_network("10.0.0.0/8"))], ForwardAction(1), 1)
+    switch.add_rule(low)
+    packet = Packet(1, "10.0.0.1", "10.0.0.2", 0, 0)
+    for _ in range(5):
+        switch.packet_in(packet, 1)
+    switch.wait_for_refresh()
+    assert low in switch.hw_switch.rules
+
+    # a new rule is served straight away, not shadowed by the cached one
+    high = Rule([IPv4DstPattern(ip_network("10.0.0.0/24"))], ForwardAction(2), 2)
+    switch.add_rule(high)
+    assert switch.packet_in(packet, 1) is high.action
+
+    # and a removed rule is no longer served from the cache
+    switch.remove_rule(high)
+    switch.remove_rule(low)
+    assert switch.packet_in(packet, 1) is None
+
+    switch.close()
@@ -0,0 +1,42 @@
+import random
+from switches.basic_switch import BasicSwitch
+from switches.cache_switch import CacheSwitch
+from switches.cache_algorithm import CacheAlgorithm
+from random_rules import random_rules, random_traffic, check_forwarding
+
+
+def test_basic_switch_batch_matches_single_packets():
+    rng = random.Random(0)
+    rules = random_rules(rng, 80)
+    single = BasicSwitch()
+    batched = BasicSwitch()
+    for rule in rules:
+        single.add_rule(rule)
+    single_actions = [single.packet_in(packet) for packet in random_traffic(rules, random.Random(1), 500)]
+    single_counters = [rule.counter for rule in rules]
+
+    for rule in rules:
+        rule.counter = 0
+        batched.add_rule(rule)
+    batched_actions = batched.packets_in(random_traffic(rules, random.Random(1), 500))
+
+    assert batched_actions == single_actions
+    assert [rule.counter for rule in rules] == single_counters
+
+
+def test_batch_sets_in_port():
+    rng = random.Random(0)
+    packets = random_traffic(random_rules(rng, 10), rng, 20)
+    BasicSwitch().packets_in(packets, 3)
+    assert all(packet.in_port == 3 for packet in packets)
+
+
+def test_cache_switch_batch_forwarding():
+    for algorithm in CacheAlgorithm:
+        rng = random.Random(2)
+        switch = CacheSwitch("s1", algorithm, 8)
+        check_forwarding(switch, rng, num_steps=300, update_rate=0.05, batch=True)
+
+        packets, hits, misses = switch.get_cache_stats()
+        assert packets == hits + misses
+        assert packets > 0
@@ -0,0 +1,57 @@
+import json
+import random
+from benchmarks.rule_generator import generate_rule_table
+from benchmarks.traffic_generator import packet_for_rule, zipf_traffic
+from benchmarks.cache_benchmark import percentile, run_suite, write_results
+from switches.cache_algorithm import CacheAlgorithm
+from switches.lookup_engine import LookupEngine
+
+
+def test_generated_tables_are_reproducible():
+    rules = generate_rule_table(200, seed=3)
+    again = generate_rule_table(200, seed=3)
+    assert len(rules) == 200
+    assert len({rule.priority for rule in rules}) == 200
+    assert [(rule.priority, len(rule.patterns)) for rule in rules] == \
+        [(rule.priority, len(rule.patterns)) for rule in again]
+
+    # priorities follow prefix length, as in a longest prefix match
+    by_priority = sorted(rules, key=lambda rule: rule.priority)
+    lengths = [rule.patterns[0].prefixlen for rule in by_priority]
+    assert lengths == sorted(lengths)
+
+
+def test_generated_traffic_matches_its_rules():
+    rng = random.Random(0)
+    for rule in generate_rule_table(100, seed=1):
+        assert rule.matches(packet_for_rule(rule, rng))
+
+    rules = generate_rule_table(100, seed=1)
+    traffic = zipf_traffic(rules, 2000, seed=1)
+    assert len(traffic) == 2000
+    assert len({id(packet) for packet in traffic}) <= 4 * len(rules)
+
+
+def test_percentile():
+    assert percentile([], 0.5) == 0
+    assert percentile([5, 1, 3, 2, 4], 0.5) == 3
+    assert percentile([5, 1, 3, 2, 4], 0.99) == 5
+
+
+def test_small_suite(tmp_path):
+    results = run_suite([100], [CacheAlgorithm.DEPENDENT_SET, CacheAlgorithm.COVER_SET],
+                        [LookupEngine.LINEAR, LookupEngine.TRIE], num_packets=2000,
+                        refresh_interval=500)
+    assert len(results["cache"]) == 2
+    assert len(results["lookup"]) == 2
+    for result in results["cache"]:
+        assert result["packets"] == 2000
+        assert result["hits"] + result["misses"] == 2000
+        assert 0 <= result["hit_rate"] <= 1
+        assert result["refreshes"] == 4
+        assert 0 < result["refresh_mean_ms"] <= result["refresh_max_ms"]
+
+    path = tmp_path / "results.json"
+    write_results(results, str(path))
+    with open(path) as f:
+        assert json.load(f)["config"]["sizes"] == [100]
@@ -0,0 +1,69 @@
+import random
+from sortedcontainers import SortedKeyList
+from rules.rule import Rule
+from switches.dependency_graph import DependencyGraph, bit_positions, to_bits
+from random_rules import random_rules
+
+
+def reachable(graph: DependencyGraph, rule: Rule) -> set:
+    """Get every rule a rule depends on by walking the direct dependencies."""
+    seen = set()
+    stack = list(graph.direct[rule])
+    while len(stack) > 0:
+        higher = stack.pop()
+        if higher not in seen:
+            seen.add(higher)
+            stack.extend(graph.direct[higher])
+    return seen
+
+
+def check_closures(graph: DependencyGraph):
+    dependency_graph, all_dependencies = graph.get_views()
+    assert list(dependency_graph) == [graph.slots[rule] for rule in graph.rules]
+    for rule in graph.rules:
+        slot = graph.slots[rule]
+        closure = reachable(graph, rule)
+        assert graph.closure[rule] == to_bits(graph.slots[r] for r in closure)
+        assert all_dependencies[slot] == graph.closure[rule]
+        assert dependency_graph[slot] == {graph.slots[r] for r in graph.direct[rule]}
+    for slot in graph.free_slots:
+        assert graph.slot_rules[slot] is None
+        assert all_dependencies[slot] == 0
+
+
+def test_bitset_round_trip():
+    rng = random.Random(0)
+    assert bit_positions(0) == [] and to_bits([]) == 0
+    for _ in range(100):
+        positions = sorted(rng.sample(range(300), rng.randrange(20)))
+        assert bit_positions(to_bits(positions)) == positions
+    assert to_bits([3, 3, 1]) == 0b1010
+
+
+def test_closures_match_transitive_closure():
+    for exact in (False, True):
+        rng = random.Random(1)
+        rules = random_rules(rng, 90)
+        table = SortedKeyList(rules[:30], key=Rule.sort_key)
+        graph = DependencyGraph(table, exact=exact)
+        check_closures(graph)
+
+        for rule in rules[30:]:
+            table.add(rule)
+            graph.add_rule(rule)
+            if rng.random() < 0.5:
+                removed = table[rng.randrange(len(table))]
+                graph.remove_rule(removed)
+                table.remove(removed)
+            check_closures(graph)
+
+
+def test_memory_stats():
+    rng = random.Random(2)
+    table = SortedKeyList(random_rules(rng, 50), key=Rule.sort_key)
+    graph = DependencyGraph(table)
+    stats = graph.get_memory_stats()
+    assert stats["rules"] == 50
+    assert stats["direct_dependencies"] == sum(len(graph.direct[rule]) for rule in table)
+    assert stats["all_dependencies"] == sum(len(reachable(graph, rule)) for rule in table)
+    assert stats["closure_bytes"] > 0
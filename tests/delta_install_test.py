@@ -0,0 +1,80 @@
+import random
+from ipaddress import ip_network
+from rules.rule import Rule
+from rules.action import ForwardAction
+from rules.pattern import IPv4DstPattern
+from network.packet import Packet
+from switches.cache_switch import CacheSwitch
+from switches.cache_switch_config import CacheSwitchConfig
+from switches.cache_algorithm import CacheAlgorithm
+from switches.refresh_scheduler import PacketCountScheduler
+from random_rules import random_rules, random_traffic, check_forwarding
+
+
+def test_unchanged_selection_sends_no_flow_mods():
+    rng = random.Random(0)
+    switch = CacheSwitch("s1", CacheAlgorithm.COVER_SET, 8,
+                         config=CacheSwitchConfig(scheduler=PacketCountScheduler(1)))
+    rules = [rule for rule in random_rules(rng, 60) if len(rule.patterns) > 0][:40]
+    for rule in rules:
+        switch.add_rule(rule)
+    switch.packets_in(random_traffic(rules, rng, 500))
+    installs, total, last = switch.get_flow_mod_stats()
+    assert total > 0
+    assert len(switch.hw_switch.rules) == len(switch.cached_rules) + len(switch.cover_rules)
+
+    # a packet matching no rule leaves the weights, and so the selection, as
+    # they were
+    switch.packet_in(Packet(9, "200.0.0.1", "200.0.0.2", 9, 9), 9)
+    assert switch.get_flow_mod_stats() == (installs + 1, total, 0)
+
+
+def test_background_updates_stay_within_the_table_size():
+    for seed in range(4):
+        rng = random.Random(seed)
+        switch = CacheSwitch("s1", CacheAlgorithm.DEPENDENT_SET, 3,
+                             config=CacheSwitchConfig(background_refresh=True,
+                                                      scheduler=PacketCountScheduler(5)))
+        rules = random_rules(rng, 80)
+        for rule in rules[:40]:
+            switch.add_rule(rule)
+        switch.packets_in(random_traffic(rules[:40], rng, 100))
+        switch.wait_for_refresh()
+
+        for rule in rules[40:]:
+            switch.add_rule(rule)
+            assert len(switch.hw_switch.rules) <= 3
+        switch.close()
+
+        rng = random.Random(seed)
+        switch = CacheSwitch("s1", CacheAlgorithm.COVER_SET, 3,
+                             config=CacheSwitchConfig(background_refresh=True,
+                                                      scheduler=PacketCountScheduler(1)))
+        check_forwarding(switch, rng, num_steps=400, update_rate=0.05)
+        assert len(switch.hw_switch.rules) <= 3
+        switch.close()
+
+
+def test_interim_flow_mods_are_counted():
+    switch = CacheSwitch("s1", CacheAlgorithm.DEPENDENT_SET, 4,
+                         config=CacheSwitchConfig(background_refresh=True,
+                                                  scheduler=PacketCountScheduler(1)))
+    low = Rule([IPv4DstPattern(ip_network("10.0.0.0/8"))], ForwardAction(1), 1)
+    switch.add_rule(low)
+    packet = Packet(1, "10.0.0.1", "10.0.0.2", 0, 0)
+    for _ in range(5):
+        switch.packet_in(packet, 1)
+    switch.wait_for_refresh()
+    assert low in switch.cached_rules
+
+    _, total_before, _ = switch.get_flow_mod_stats()
+    high = Rule([IPv4DstPattern(ip_network("10.0.0.0/24"))], ForwardAction(2), 2)
+    switch.add_rule(high)
+    assert high in switch.cover_rules
+    _, total, _ = switch.get_flow_mod_stats()
+    assert total == total_before + 1
+
+    switch.wait_for_refresh()
+    _, total, last = switch.get_flow_mod_stats()
+    assert last == total - total_before
+    switch.close()
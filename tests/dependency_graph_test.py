@@ -0,0 +1,55 @@
+import random
+from sortedcontainers import SortedKeyList
+from rules.rule import Rule
+from switches.cache_switch import CacheSwitch
+from switches.cache_algorithm import CacheAlgorithm
+from switches.dependency_graph import DependencyGraph, bit_positions
+from random_rules import random_rules, check_forwarding
+
+
+def assert_graph_matches_table(graph: DependencyGraph, table: SortedKeyList):
+    """Check the graph against dependencies computed from scratch."""
+    rules = list(table)
+    assert set(graph.direct) == set(rules)
+
+    for pos, rule in enumerate(rules):
+        direct = {higher for higher in rules[pos + 1:] if higher.intersects(rule)}
+        assert graph.direct[rule] == direct
+        for higher in direct:
+            assert rule in graph.dependents[higher]
+
+    for rule in reversed(rules):
+        closure = set(graph.direct[rule])
+        for higher in graph.direct[rule]:
+            closure |= {graph.slot_rules[slot] for slot in bit_positions(graph.closure[higher])}
+        assert {graph.slot_rules[slot] for slot in bit_positions(graph.closure[rule])} == closure
+
+
+def test_incremental_updates_match_rebuild():
+    rng = random.Random(1)
+    rules = random_rules(rng, 80)
+    table = SortedKeyList([], key=Rule.sort_key)
+    graph = DependencyGraph(table)
+
+    for rule in rules[:60]:
+        table.add(rule)
+        graph.add_rule(rule)
+    assert_graph_matches_table(graph, table)
+
+    for rule in rng.sample(rules[:60], 30):
+        graph.remove_rule(rule)
+        table.remove(rule)
+        assert_graph_matches_table(graph, table)
+
+    for rule in rules[60:]:
+        table.add(rule)
+        graph.add_rule(rule)
+    assert_graph_matches_table(graph, table)
+
+
+def test_cache_switch_forwarding_with_updates():
+    for algorithm in CacheAlgorithm:
+        for seed in range(3):
+            rng = random.Random(seed)
+            switch = CacheSwitch("s1", algorithm, rng.choice([3, 8, 15]))
+            check_forwarding(switch, rng, num_steps=300, update_rate=0.05)
@@ -0,0 +1,79 @@
+import pytest
+from ipaddress import ip_network
+from rules.rule import Rule
+from rules.action import ForwardAction
+from rules.pattern import IPv4DstPattern
+from network.event_network import EventNetwork
+from switches.basic_switch import BasicSwitch
+from switches.cache_switch import CacheSwitch
+from switches.cache_switch_config import CacheSwitchConfig
+from switches.cache_algorithm import CacheAlgorithm
+from switches.refresh_scheduler import PacketCountScheduler
+
+
+def make_network(switch, **kwargs) -> EventNetwork:
+    """Two hosts on either side of one switch."""
+    network = EventNetwork(**kwargs)
+    network.add_host("h1", ip_network("10.0.1.1"))
+    network.add_host("h2", ip_network("10.0.2.2"))
+    network.add_switch("s1", switch)
+    network.connect_host("h1", "s1", 1)
+    network.connect_host("h2", "s1", 2)
+    switch.add_rule(Rule([IPv4DstPattern(ip_network("10.0.2.0/24"))], ForwardAction(2), 1))
+    return network
+
+
+def test_latency_adds_up_along_the_path():
+    network = make_network(BasicSwitch(), default_latency=0.001, hw_time=0.0002)
+    network.send_packet("h1", 1, "h2", 1)
+    network.send_packet("h1", 1, "h2", 1, at=1.0)
+    network.run()
+
+    assert network.get_stats() == (2, 2, 0)
+    stats = network.get_latency_stats()
+    assert stats["delivered"] == 2
+    assert stats["max"] == pytest.approx(0.0022)
+    assert network.now == pytest.approx(1.0022)
+
+
+def test_packets_queue_on_links_and_switches():
+    network = make_network(BasicSwitch(), default_bandwidth=12_000_000, hw_time=0.002)
+    for _ in range(3):
+        network.send_packet("h1", 1, "h2", 1)
+    network.run()
+
+    # each packet takes 1ms on every link, and the switch 2ms, so the third
+    # waits behind the other two at the switch
+    latencies = sorted(network.latencies)
+    assert latencies == pytest.approx([0.004, 0.006, 0.008])
+
+
+def test_misses_and_refreshes_take_longer():
+    switch = CacheSwitch("s1", CacheAlgorithm.DEPENDENT_SET, 0,
+                         config=CacheSwitchConfig(scheduler=PacketCountScheduler(2)))
+    network = make_network(switch, hw_time=0.001, sw_time=0.01, refresh_time=0.1)
+
+    for i in range(4):
+        network.send_packet("h1", 1, "h2", 1, at=i)
+    network.run()
+
+    packets, hits, misses = switch.get_cache_stats()
+    assert (packets, misses) == (4, 4)
+    assert switch.scheduler.num_refreshes == 2
+    stalls = network.get_latency_stats()["refresh_stalls"]["s1"]
+    assert stalls == pytest.approx(0.1 * switch.scheduler.num_refreshes)
+    expected = 0.001 * 4 + 0.01 * misses + stalls
+    assert sum(network.latencies) == pytest.approx(expected)
+
+
+def test_latency_sample_is_bounded():
+    network = make_network(BasicSwitch(), default_latency=0.001, latency_samples=10)
+    for i in range(100):
+        network.send_packet("h1", 1, "h2", 1, at=i)
+    network.run()
+
+    assert len(network.latencies) == 10
+    stats = network.get_latency_stats()
+    assert stats["delivered"] == 100
+    assert stats["mean"] == pytest.approx(0.002)
+    assert stats["p99"] == pytest.approx(0.002)
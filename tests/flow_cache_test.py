@@ -0,0 +1,56 @@
+import random
+from network.packet import Packet
+from switches.cache_switch import CacheSwitch
+from switches.cache_switch_config import CacheSwitchConfig
+from switches.cache_algorithm import CacheAlgorithm
+from switches.flow_cache import FlowCache
+from random_rules import random_rules, random_traffic, check_forwarding
+
+
+def test_least_recently_used_flow_is_evicted():
+    flows = FlowCache(2)
+    a = FlowCache.key(Packet(1, 1, 2, 3, 4))
+    b = FlowCache.key(Packet(1, 1, 2, 3, 5))
+    c = FlowCache.key(Packet(2, 1, 2, 3, 4))
+    flows.put(a, "a")
+    flows.put(b, "b")
+    assert flows.get(a) == "a"
+    flows.put(c, "c")
+
+    assert flows.get(b) is None
+    assert flows.get(a) == "a" and flows.get(c) == "c"
+    flows.clear()
+    assert flows.get(a) is None
+    assert flows.get_stats() == (3, 2, 1, 1)
+
+
+def test_flow_cache_forwarding():
+    for algorithm in (CacheAlgorithm.DEPENDENT_SET, CacheAlgorithm.COVER_SET):
+        for seed in range(2):
+            rng = random.Random(seed)
+            switch = CacheSwitch("s1", algorithm, 8, config=CacheSwitchConfig(flow_cache_size=16))
+            check_forwarding(switch, rng, num_steps=500, update_rate=0.05, batch=seed == 1)
+
+            hits, misses, _, invalidations = switch.get_flow_cache_stats()
+            assert misses > 0 and invalidations > 0
+
+
+def test_flow_cache_does_not_change_results():
+    rng = random.Random(0)
+    rules = random_rules(rng, 30)
+    traffic = random_traffic(rules, rng, 300)
+
+    results = []
+    for flow_cache_size in (0, 64):
+        for rule in rules:
+            rule.counter = 0
+        switch = CacheSwitch("s1", CacheAlgorithm.DEPENDENT_SET, 8,
+                             config=CacheSwitchConfig(flow_cache_size=flow_cache_size))
+        for rule in rules:
+            switch.add_rule(rule)
+        actions = [switch.packet_in(packet, packet.in_port) for packet in traffic]
+        results.append((actions, switch.get_cache_stats(), [rule.counter for rule in rules]))
+
+    assert results[0] == results[1]
+    hits, _, _, _ = switch.get_flow_cache_stats()
+    assert hits > 0
@@ -0,0 +1,164 @@
+import random
+from ipaddress import ip_network
+from sortedcontainers import SortedKeyList
+from rules.rule import Rule
+from rules.action import ForwardAction
+from rules.pattern import IPv4DstPattern, IPv4SrcPattern, InPortPattern, \
+    TCPDPortPattern, TCPSPortPattern
+from rules.header_space import Ternary, FIELDS, OFFSETS, WIDTH, is_shadowed, subtract
+from network.packet import Packet
+from switches.cache_switch import CacheSwitch
+from switches.cache_switch_config import CacheSwitchConfig
+from switches.cache_algorithm import CacheAlgorithm
+from switches.refresh_scheduler import PacketCountScheduler
+from switches.dependency_graph import DependencyGraph
+from random_rules import random_rules, check_forwarding
+
+
+def packet_in(cube: Ternary, rng: random.Random) -> Packet:
+    """Get a random packet matching a vector."""
+    header = cube.value | (rng.getrandbits(WIDTH) & ~cube.mask)
+    fields = []
+    for pattern_type, _, width in FIELDS:
+        offset, _, _ = OFFSETS[pattern_type]
+        fields.append(header >> offset & ((1 << width) - 1))
+    in_port, ipv4_src, ipv4_dst, tcp_sport, tcp_dport = fields
+    return Packet(in_port, ipv4_src, ipv4_dst, tcp_sport, tcp_dport)
+
+
+def header_of(packet: Packet) -> Ternary:
+    """Get the vector matching only a packet's header."""
+    value = 0
+    for field, pattern_type in ((packet.in_port, InPortPattern), (packet.ipv4_src, IPv4SrcPattern),
+                                (packet.ipv4_dst, IPv4DstPattern), (packet.tcp_sport, TCPSPortPattern),
+                                (packet.tcp_dport, TCPDPortPattern)):
+        value |= field << OFFSETS[pattern_type][0]
+    return Ternary(value, (1 << WIDTH) - 1)
+
+
+def test_vectors_agree_with_patterns():
+    rng = random.Random(0)
+    rules = random_rules(rng, 60)
+    for rule in rules:
+        cube = Ternary.from_rule(rule)
+        for _ in range(5):
+            assert rule.matches(packet_in(cube, rng))
+        for other in rules:
+            other_cube = Ternary.from_rule(other)
+            assert cube.intersects(other_cube) == rule.intersects(other)
+            if cube.subsumes(other_cube):
+                assert rule.matches(packet_in(other_cube, rng))
+
+    contradiction = Rule([InPortPattern(1), InPortPattern(2)], ForwardAction(1), 0)
+    assert Ternary.from_rule(contradiction) is None
+
+
+def test_subtract_leaves_disjoint_pieces_outside_the_other_vector():
+    rng = random.Random(1)
+    rules = random_rules(rng, 40)
+    for rule, other in zip(rules, reversed(rules)):
+        cube = Ternary.from_rule(rule)
+        other_cube = Ternary.from_rule(other)
+        pieces = cube.subtract(other_cube)
+
+        for k, piece in enumerate(pieces):
+            assert cube.subsumes(piece)
+            assert not piece.intersects(other_cube)
+            assert not any(piece.intersects(later) for later in pieces[k + 1:])
+
+        for _ in range(20):
+            header = header_of(packet_in(cube, rng))
+            assert other_cube.subsumes(header) != any(piece.subsumes(header) for piece in pieces)
+
+
+def test_shadowing():
+    rng = random.Random(2)
+    for _ in range(200):
+        rules = random_rules(rng, 6)
+        rule, others = rules[0], rules[1:]
+        cubes = [Ternary.from_rule(other) for other in others]
+        cube = Ternary.from_rule(rule)
+
+        region = [cube]
+        for other_cube in cubes:
+            region = subtract(region, other_cube)
+
+        # the default limit on the region size may only give up on rules
+        # that are shadowed, never claim one is that is not
+        assert is_shadowed(cube, cubes, max_cubes=1 << 20) == (len(region) == 0)
+        if is_shadowed(cube, cubes):
+            assert len(region) == 0
+            assert rule.is_shadowed_by(others)
+        if len(region) == 0:
+            for _ in range(20):
+                packet = packet_in(cube, rng)
+                assert any(other.matches(packet) for other in others)
+        else:
+            witness = packet_in(region[0], rng)
+            assert rule.matches(witness)
+            assert not any(other.matches(witness) for other in others)
+
+    wide = Rule([IPv4DstPattern(ip_network("10.0.0.0/8"))], ForwardAction(1), 0)
+    narrow = Rule([IPv4DstPattern(ip_network("10.1.0.0/16"))], ForwardAction(1), 0)
+    assert wide.subsumes(narrow) and not narrow.subsumes(wide)
+    assert narrow.is_shadowed_by([wide]) and not wide.is_shadowed_by([narrow])
+
+
+def test_rules_too_wide_for_the_header_are_not_compared():
+    too_wide = Rule([TCPDPortPattern(1 << 20)], ForwardAction(1), 1)
+    everything = Rule([], ForwardAction(1), 0)
+    port = Rule([TCPDPortPattern(80)], ForwardAction(1), 2)
+
+    assert not everything.subsumes(too_wide)
+    assert not too_wide.subsumes(port)
+    assert not too_wide.is_shadowed_by([everything])
+    assert port.is_shadowed_by([too_wide, everything])
+
+
+def test_exact_dependencies():
+    rng = random.Random(3)
+    rules = random_rules(rng, 60)
+    plain = DependencyGraph(SortedKeyList(rules, key=Rule.sort_key))
+    exact = DependencyGraph(SortedKeyList(rules, key=Rule.sort_key), exact=True)
+    for rule in rules:
+        assert exact.direct[rule] <= plain.direct[rule]
+
+    for seed in range(3):
+        rng = random.Random(seed)
+        switch = CacheSwitch("s1", CacheAlgorithm.COVER_SET, rng.choice([3, 8, 15]),
+                             config=CacheSwitchConfig(exact_dependencies=True))
+        check_forwarding(switch, rng, num_steps=300, update_rate=0.05)
+
+
+def test_removing_a_rule_in_between_keeps_the_cache_correct():
+    low = Rule([IPv4DstPattern(ip_network("10.0.0.0/8"))], ForwardAction(1), 1)
+    middle = Rule([IPv4DstPattern(ip_network("10.0.0.0/16"))], ForwardAction(2), 2)
+    high = Rule([IPv4DstPattern(ip_network("10.0.0.0/24"))], ForwardAction(3), 3)
+    fillers = [Rule([IPv4DstPattern(ip_network(f"20.{i}.0.0/16"))], ForwardAction(4), 0)
+               for i in range(4)]
+    packet = Packet(1, "1.1.1.1", "10.0.0.1", 0, 0)
+
+    switch = CacheSwitch("s1", CacheAlgorithm.COVER_SET, 2,
+                         config=CacheSwitchConfig(background_refresh=True, exact_dependencies=True,
+                                                  scheduler=PacketCountScheduler(1)))
+    for rule in [low, middle, high] + fillers:
+        switch.add_rule(rule)
+    for _ in range(10):
+        switch.packet_in(Packet(1, "1.1.1.1", "10.1.0.1", 0, 0), 1)
+    switch.wait_for_refresh()
+    assert switch.cached_rules == {low} and set(switch.cover_rules) == {middle}
+
+    # the high rule was only kept clear of the cached rule by the middle one,
+    # so until the cache is recomputed its packets must not hit it
+    switch.remove_rule(middle)
+    assert switch.hw_switch.match_rule(packet) is not low
+    assert len(switch.hw_switch.rules) <= 2
+    assert switch.packet_in(packet, 1) is high.action
+    switch.close()
+
+    rng = random.Random(4)
+    switch = CacheSwitch("s1", CacheAlgorithm.COVER_SET, 8,
+                         config=CacheSwitchConfig(background_refresh=True, exact_dependencies=True,
+                                                  scheduler=PacketCountScheduler(5)))
+    check_forwarding(switch, rng, num_steps=600, update_rate=0.05)
+    switch.close()
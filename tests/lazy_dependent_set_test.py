@@ -0,0 +1,63 @@
+import random
+from rules.rule import Rule
+from switches.cache_switch import CacheSwitch
+from switches.cache_switch_config import CacheSwitchConfig
+from switches.cache_algorithm import CacheAlgorithm
+from switches.refresh_scheduler import PacketCountScheduler
+from random_rules import random_rules, random_traffic, check_forwarding
+
+
+def dependencies(rule: Rule, rules: list) -> set:
+    """Get every rule the given rule depends on, directly or not."""
+    found = set()
+    stack = [rule]
+    while len(stack) > 0:
+        lower = stack.pop()
+        for higher in rules:
+            if higher.sort_key() > lower.sort_key() and higher not in found \
+                    and higher.intersects(lower):
+                found.add(higher)
+                stack.append(higher)
+    return found
+
+
+def test_lazy_selection_is_a_valid_dependent_set():
+    for seed in range(5):
+        rng = random.Random(seed)
+        size = rng.choice([4, 8, 16])
+        switch = CacheSwitch("s1", CacheAlgorithm.LAZY_DEPENDENT_SET, size,
+                             config=CacheSwitchConfig(scheduler=PacketCountScheduler(100)))
+        rules = random_rules(rng, 60)
+        for rule in rules:
+            switch.add_rule(rule)
+        switch.packets_in(random_traffic(rules, rng, 1000))
+
+        assert 0 < len(switch.cached_rules) <= size
+        assert len(switch.cover_rules) == 0
+        for rule in switch.cached_rules:
+            assert dependencies(rule, rules) <= switch.cached_rules
+
+
+def test_lazy_selection_takes_the_densest_set_first():
+    rng = random.Random(0)
+    switch = CacheSwitch("s1", CacheAlgorithm.LAZY_DEPENDENT_SET, 8,
+                         config=CacheSwitchConfig(scheduler=PacketCountScheduler(100)))
+    rules = random_rules(rng, 60)
+    for rule in rules:
+        switch.add_rule(rule)
+    switch.packets_in(random_traffic(rules, rng, 1000))
+
+    def density(rule: Rule) -> float:
+        dependent_set = dependencies(rule, rules) | {rule}
+        return sum(r.counter for r in dependent_set) / len(dependent_set)
+
+    fitting = [rule for rule in rules if len(dependencies(rule, rules)) < 8]
+    densest = max(fitting, key=density)
+    assert densest in switch.cached_rules or density(densest) == 0
+
+
+def test_lazy_selection_forwarding():
+    for seed in range(3):
+        rng = random.Random(seed)
+        switch = CacheSwitch("s1", CacheAlgorithm.LAZY_DEPENDENT_SET, rng.choice([3, 8, 15]))
+        check_forwarding(switch, rng, num_steps=300, update_rate=0.05)
@@ -0,0 +1,66 @@
+import random
+from rules.rule import Rule
+from switches.cache_switch import CacheSwitch
+from switches.cache_switch_config import CacheSwitchConfig
+from switches.cache_algorithm import CacheAlgorithm
+from switches.metrics import Histogram, SwitchMetrics
+from switches.refresh_scheduler import PacketCountScheduler
+from random_rules import random_rules, random_traffic
+
+
+def test_histogram():
+    histogram = Histogram()
+    for value in (100, 200, 300, 5000):
+        histogram.record(value)
+    histogram.record(150, 4)
+
+    stats = histogram.get_stats()
+    assert stats["count"] == 8
+    assert stats["mean"] == (100 + 200 + 300 + 5000 + 4 * 150) / 8
+    assert stats["max"] == 5000
+    # percentiles are bounded by the power of two above them
+    assert 150 <= stats["p50"] <= 255
+    assert stats["p99"] == 5000
+    assert Histogram().get_stats()["p99"] == 0
+
+
+def test_lookups_are_sampled():
+    events = []
+    metrics = SwitchMetrics(sample_interval=10,
+                            profiler=lambda event, name, duration: events.append((event, name)))
+    rng = random.Random(0)
+    switch = CacheSwitch("s1", CacheAlgorithm.DEPENDENT_SET, 8,
+                         config=CacheSwitchConfig(metrics=metrics,
+                                                  scheduler=PacketCountScheduler(50)))
+    rules = random_rules(rng, 30)
+    for rule in rules:
+        switch.add_rule(rule)
+    for packet in random_traffic(rules, rng, 200):
+        switch.packet_in(packet, packet.in_port)
+
+    stats = switch.get_metrics()
+    assert stats["packets"] == stats["hits"] + stats["misses"] == 200
+    assert stats["hw_switch_size"] == 8
+    assert stats["hw_lookup"]["count"] == 20
+    assert 0 < stats["sw_lookup"]["count"] <= 20
+    assert stats["refresh"][CacheAlgorithm.DEPENDENT_SET.value]["count"] == \
+        stats["install"]["count"]
+
+    assert ("install", "s1") in events
+    assert len([event for event in events if event[0] == "hw_lookup"]) == 20
+
+
+def test_export_rule_counters():
+    rng = random.Random(1)
+    switch = CacheSwitch("s1", CacheAlgorithm.COVER_SET, 8)
+    rules = random_rules(rng, 30)
+    for rule in rules:
+        switch.add_rule(rule)
+    switch.packets_in(random_traffic(rules, rng, 300))
+
+    counters = switch.export_rule_counters()
+    assert [entry["id"] for entry in counters] == \
+        [rule.id for rule in sorted(rules, key=Rule.sort_key, reverse=True)]
+    assert sum(entry["counter"] for entry in counters) == sum(rule.counter for rule in rules)
+    assert sum(entry["cached"] for entry in counters) == len(switch.cached_rules)
+    assert sum(entry["covered"] for entry in counters) == len(switch.cover_rules)
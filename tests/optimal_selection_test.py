@@ -0,0 +1,74 @@
+import random
+from itertools import combinations
+from switches.cache_switch import CacheSwitch
+from switches.cache_algorithm import CacheAlgorithm
+from switches.optimal_selection import select_optimal
+from random_rules import random_rules, random_traffic, check_forwarding
+
+
+def random_graph(rng: random.Random, num_rules: int) -> dict:
+    """Get a random dependency graph, where rules only depend on rules after
+    them."""
+    return {i: {j for j in range(i + 1, num_rules) if rng.random() < 0.25}
+            for i in range(num_rules)}
+
+
+def entries(cached: set, dependency_graph: dict) -> int:
+    needed = set(cached)
+    for i in cached:
+        needed.update(dependency_graph[i])
+    return len(needed)
+
+
+def brute_force(weights: list, dependency_graph: dict, size: int) -> float:
+    best = 0
+    rules = list(dependency_graph)
+    for count in range(len(rules) + 1):
+        for cached in combinations(rules, count):
+            if entries(set(cached), dependency_graph) <= size:
+                best = max(best, sum(weights[i] for i in cached))
+    return best
+
+
+def test_optimal_matches_brute_force():
+    for seed in range(30):
+        rng = random.Random(seed)
+        num_rules = rng.randrange(4, 11)
+        dependency_graph = random_graph(rng, num_rules)
+        weights = [rng.choice([0, 1, 2, 5, 10, 30]) for _ in range(num_rules)]
+        size = rng.randrange(1, num_rules)
+
+        cached, covered, _, proven = select_optimal(weights, dependency_graph, size)
+        assert proven
+        assert sum(weights[i] for i in cached) == brute_force(weights, dependency_graph, size)
+        assert len(cached) + len(covered) == entries(cached, dependency_graph) <= size
+        assert not cached & covered
+
+
+def test_search_stops_at_the_node_limit():
+    rng = random.Random(0)
+    dependency_graph = random_graph(rng, 40)
+    weights = [rng.randrange(1, 100) for _ in range(40)]
+    cached, covered, nodes, proven = select_optimal(weights, dependency_graph, 10, max_nodes=50)
+    assert nodes <= 50 and not proven
+    assert entries(cached, dependency_graph) <= 10
+
+
+def test_selection_gap_is_never_negative():
+    rng = random.Random(1)
+    switch = CacheSwitch("s1", CacheAlgorithm.OPTIMAL, 6)
+    rules = random_rules(rng, 25)
+    for rule in rules:
+        switch.add_rule(rule)
+    switch.packets_in(random_traffic(rules, rng, 500))
+
+    report = switch.get_selection_gap()
+    assert report["proven_optimal"]
+    for algorithm in CacheAlgorithm:
+        assert report["algorithms"][algorithm.value]["gap"] >= -1e-9
+
+
+def test_optimal_forwarding():
+    rng = random.Random(2)
+    switch = CacheSwitch("s1", CacheAlgorithm.OPTIMAL, 6)
+    check_forwarding(switch, rng, num_rules=30, num_steps=200, update_rate=0.05)
@@ -0,0 +1,31 @@
+from ipaddress import IPv4Address, ip_network
+from network.packet import Packet, address_to_int
+from rules.pattern import IPv4DstPattern, IPv4SrcPattern
+
+
+def test_addresses_are_stored_as_integers():
+    packet = Packet(1, IPv4Address("10.0.1.1"), ip_network("10.0.2.2"), 80, 443)
+    assert packet.ipv4_src == int(IPv4Address("10.0.1.1"))
+    assert packet.ipv4_dst == int(IPv4Address("10.0.2.2"))
+
+    assert address_to_int(ip_network("10.0.3.0/24")) == int(IPv4Address("10.0.3.0"))
+    assert address_to_int("10.0.4.4") == int(IPv4Address("10.0.4.4"))
+    assert address_to_int(167772161) == 167772161
+    assert address_to_int(None) is None
+
+    assert "ipv4_dst: 10.0.2.2" in str(packet)
+
+
+def test_prefix_patterns_match_integer_addresses():
+    src = IPv4SrcPattern(ip_network("10.0.0.0/8"))
+    dst = IPv4DstPattern(ip_network("192.168.1.0/24"))
+    assert (src.network, src.mask, src.prefixlen) == (int(IPv4Address("10.0.0.0")), 0xff000000, 8)
+
+    inside = Packet(1, "10.200.0.1", "192.168.1.77", 0, 0)
+    outside = Packet(1, "11.0.0.1", "192.168.2.77", 0, 0)
+    assert src.matches(inside) and dst.matches(inside)
+    assert not src.matches(outside) and not dst.matches(outside)
+
+    assert dst.intersects(IPv4DstPattern(ip_network("192.168.0.0/16")))
+    assert not dst.intersects(IPv4DstPattern(ip_network("192.168.2.0/24")))
+    assert dst.intersects(src)
@@ -0,0 +1,85 @@
+import random
+from ipaddress import ip_network
+from rules.rule import Rule
+from rules.action import ForwardAction
+from rules.pattern import IPv4DstPattern, InPortPattern
+from network.packet import Packet
+from switches.cache_switch import CacheSwitch
+from switches.cache_switch_config import CacheSwitchConfig
+from switches.cache_algorithm import CacheAlgorithm
+from switches.partitioned_switch import PartitionedSwitch
+from switches.software_partition import SoftwarePartition
+from switches.lookup_engine import LookupEngine
+from benchmarks.rule_generator import generate_rule_table
+from benchmarks.traffic_generator import zipf_traffic
+from random_rules import full_table_lookup, check_forwarding
+
+
+def test_partitions_match_a_single_table():
+    rules = generate_rule_table(300, seed=2)
+    traffic = zipf_traffic(rules, 1000, seed=2)
+    for partition in SoftwarePartition:
+        switch = PartitionedSwitch(4, partition, hash_prefixlen=16)
+        for rule in rules:
+            switch.add_rule(rule)
+        for rule in rules[:100]:
+            switch.remove_rule(rule)
+
+        for packet, rule in zip(traffic, switch.match_rules(traffic)):
+            assert rule is full_table_lookup(rules[100:], packet)
+
+        stats = switch.get_backend_stats()
+        assert sum(lookups for _, lookups, _ in stats) == len(traffic)
+        assert sum(num_rules for num_rules, _, _ in stats) >= 200
+
+
+def test_rules_are_installed_where_they_can_match():
+    switch = PartitionedSwitch(4)
+    wide = Rule([IPv4DstPattern(ip_network("0.0.0.0/1"))], ForwardAction(1), 1)
+    narrow = Rule([IPv4DstPattern(ip_network("200.0.0.0/8"))], ForwardAction(2), 2)
+    anywhere = Rule([InPortPattern(1)], ForwardAction(3), 3)
+    for rule in (wide, narrow, anywhere):
+        switch.add_rule(rule)
+
+    assert switch.backend_rules[wide] == [0, 1]
+    assert switch.backend_rules[narrow] == [3]
+    assert switch.backend_rules[anywhere] == [0, 1, 2, 3]
+    assert switch.rules == [wide, narrow, anywhere]
+
+
+def test_packets_without_a_destination():
+    # the linear engine's patterns do not take missing fields, unlike the
+    # vector classifier's
+    for partition in SoftwarePartition:
+        switch = PartitionedSwitch(4, partition, LookupEngine.VECTOR)
+        dst = Rule([IPv4DstPattern(ip_network("10.0.0.0/8"))], ForwardAction(1), 2)
+        anywhere = Rule([InPortPattern(1)], ForwardAction(2), 1)
+        switch.add_rule(dst)
+        switch.add_rule(anywhere)
+
+        packet = Packet(1, "10.0.0.1", None, 1, 1)
+        assert switch.match_rule(packet) is anywhere
+        assert switch.match_rules([packet]) == [anywhere]
+
+
+def test_rules_are_only_sorted_after_changes():
+    switch = PartitionedSwitch(2)
+    rules = [Rule([InPortPattern(i)], ForwardAction(i), i) for i in range(3)]
+    for rule in rules[::-1]:
+        switch.add_rule(rule)
+    assert switch.rules == rules
+    assert switch.rules is switch.rules
+
+    switch.remove_rule(rules[1])
+    assert switch.rules == [rules[0], rules[2]]
+
+
+def test_cache_switch_with_partitioned_software_switches():
+    for partition in SoftwarePartition:
+        for seed in range(2):
+            rng = random.Random(seed)
+            switch = CacheSwitch("s1", CacheAlgorithm.COVER_SET, 8,
+                                 config=CacheSwitchConfig(num_sw_switches=3,
+                                                          sw_partition=partition))
+            check_forwarding(switch, rng, num_steps=400, update_rate=0.05, batch=seed == 1)
+            assert len(switch.get_sw_switch_stats()) == 3
@@ -0,0 +1,81 @@
+import random
+from rules.rule import Rule
+from rules.action import ForwardAction
+from switches.cache_switch import CacheSwitch
+from switches.cache_switch_config import CacheSwitchConfig
+from switches.cache_algorithm import CacheAlgorithm
+from switches.popularity import CumulativeEstimator, DecayEstimator, \
+    SlidingWindowEstimator, CountMinSketchEstimator
+from switches.refresh_scheduler import PacketCountScheduler
+from random_rules import check_forwarding
+
+
+def make_rules(num_rules: int) -> list:
+    return [Rule([], ForwardAction(1), i) for i in range(num_rules)]
+
+
+def test_decay_estimator():
+    a, b = make_rules(2)
+    estimator = DecayEstimator(0.5)
+    a.counter = 8
+    estimator.refreshed([a, b])
+    b.counter = 3
+    assert estimator.get_weights([a, b]) == [4, 3]
+
+    estimator.refreshed([a, b])
+    assert estimator.get_weights([a, b]) == [2, 1.5]
+
+
+def test_sliding_window_estimator():
+    a, b = make_rules(2)
+    estimator = SlidingWindowEstimator(window=2)
+    a.counter = 5
+    estimator.refreshed([a, b])
+    b.counter = 2
+    assert estimator.get_weights([a, b]) == [5, 2]
+
+    # the first epoch leaves the window
+    estimator.refreshed([a, b])
+    assert estimator.get_weights([a, b]) == [0, 2]
+    estimator.refreshed([a, b])
+    assert estimator.get_weights([a, b]) == [0, 0]
+    assert CumulativeEstimator().get_weights([a, b]) == [5, 2]
+
+
+def test_count_min_sketch_only_overestimates():
+    rules = make_rules(200)
+    estimator = CountMinSketchEstimator(width=64, depth=4, decay=1)
+    rng = random.Random(0)
+    counts = [0] * len(rules)
+    for _ in range(2000):
+        i = min(len(rules) - 1, int(rng.expovariate(0.05)))
+        estimator.observe(rules[i])
+        counts[i] += 1
+
+    weights = estimator.get_weights(rules)
+    assert all(weight >= count for weight, count in zip(weights, counts))
+    assert weights[0] - counts[0] <= 2000 * 2.72 / 64
+
+    estimator.decay = 0.5
+    estimator.refreshed(rules)
+    assert estimator.get_weights(rules[:1]) == [weights[0] / 2]
+
+
+def test_count_min_sketch_is_keyed_on_rule_ids():
+    estimator = CountMinSketchEstimator(width=64)
+    rule = Rule([], ForwardAction(1), 1)
+    estimator.observe(rule, 5)
+    same_id = Rule([], ForwardAction(2), 1, rule.id)
+    assert estimator.get_weights([same_id]) == [5]
+
+
+def test_estimators_in_a_cache_switch():
+    for estimator in (CumulativeEstimator, DecayEstimator, SlidingWindowEstimator,
+                      CountMinSketchEstimator):
+        rng = random.Random(0)
+        switch = CacheSwitch("s1", CacheAlgorithm.DEPENDENT_SET, 8,
+                             config=CacheSwitchConfig(popularity=estimator(),
+                                                      scheduler=PacketCountScheduler(20)))
+        check_forwarding(switch, rng, num_steps=300, update_rate=0.03, batch=True)
+        _, hits, _ = switch.get_cache_stats()
+        assert hits > 0
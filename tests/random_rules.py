@@ -0,0 +1,123 @@
+import random
+from ipaddress import ip_network
+from rules.rule import Rule
+from rules.action import ActionType, ForwardAction
+from rules.pattern import IPv4DstPattern, IPv4SrcPattern, InPortPattern, \
+    TCPDPortPattern, TCPSPortPattern
+from network.packet import Packet
+
+
+def random_address(rng: random.Random) -> int:
+    """Get an address from a small space, so that rules overlap often."""
+    return rng.randrange(4) << 24 | rng.randrange(4) << 16 | rng.randrange(256) << 8 | rng.randrange(256)
+
+
+def random_rule(rng: random.Random, max_priority: int = 20) -> Rule:
+    """Create a rule matching a random subset of the packet fields."""
+    patterns = []
+    if rng.random() < 0.7:
+        prefixlen = rng.choice([8, 16, 24, 25, 26, 32])
+        patterns.append(IPv4DstPattern(
+            ip_network((random_address(rng) >> (32 - prefixlen) << (32 - prefixlen), prefixlen))))
+    if rng.random() < 0.3:
+        prefixlen = rng.choice([8, 16, 24, 32])
+        patterns.append(IPv4SrcPattern(
+            ip_network((random_address(rng) >> (32 - prefixlen) << (32 - prefixlen), prefixlen))))
+    if rng.random() < 0.3:
+        patterns.append(InPortPattern(rng.randrange(4)))
+    if rng.random() < 0.2:
+        patterns.append(TCPSPortPattern(rng.randrange(3)))
+    if rng.random() < 0.2:
+        patterns.append(TCPDPortPattern(rng.randrange(3)))
+    return Rule(patterns, ForwardAction(rng.randrange(5)), rng.randrange(max_priority))
+
+
+def random_rules(rng: random.Random, num_rules: int, max_priority: int = 20) -> list:
+    return [random_rule(rng, max_priority) for _ in range(num_rules)]
+
+
+def random_packet(rng: random.Random) -> Packet:
+    return Packet(rng.randrange(4), random_address(rng), random_address(rng),
+                  rng.randrange(3), rng.randrange(3))
+
+
+def packet_for(rule: Rule, rng: random.Random) -> Packet:
+    """Create a random packet matching the given rule."""
+    packet = random_packet(rng)
+    for pattern in rule.patterns:
+        if type(pattern) == IPv4DstPattern:
+            packet.ipv4_dst = pattern.network | (rng.getrandbits(32) & ~pattern.mask & 0xffffffff)
+        elif type(pattern) == IPv4SrcPattern:
+            packet.ipv4_src = pattern.network | (rng.getrandbits(32) & ~pattern.mask & 0xffffffff)
+        elif type(pattern) == InPortPattern:
+            packet.in_port = pattern.in_port
+        elif type(pattern) == TCPSPortPattern:
+            packet.tcp_sport = pattern.tcp_sport
+        else:
+            packet.tcp_dport = pattern.tcp_dport
+    return packet
+
+
+def random_traffic(rules: list, rng: random.Random, num_packets: int) -> list:
+    """Create packets that mostly match one of the given rules, skewed
+    towards the first few."""
+    packets = [packet_for(rng.choice(rules), rng) if rng.random() < 0.9
+               else random_packet(rng) for _ in range(40)]
+    weights = [1 / (i + 1) for i in range(len(packets))]
+    return rng.choices(packets, weights, k=num_packets)
+
+
+def full_table_lookup(rules, packet: Packet) -> Rule:
+    """Get the rule a packet matches by checking every rule in the table."""
+    matching = [rule for rule in rules if rule.matches(packet)]
+    if len(matching) == 0:
+        return None
+    return max(matching, key=Rule.sort_key)
+
+
+def action_key(action) -> tuple:
+    """Get a comparable form of an action, as compressed rules share equal
+    actions rather than the same action objects."""
+    if action is None:
+        return None
+    if action.type == ActionType.FORWARD:
+        return action.type, action.forward_port
+    return (action.type,)
+
+
+def expected_action(rules, packet: Packet) -> tuple:
+    rule = full_table_lookup(rules, packet)
+    return action_key(None if rule is None else rule.action)
+
+
+def check_forwarding(switch, rng: random.Random, num_rules: int = 60, num_steps: int = 600,
+                     update_rate: float = 0.02, batch: bool = False):
+    """
+    Add random rules to a switch, then send it packets while adding and
+    removing rules, checking every packet gets the action of the highest
+    rule in the table that it matches. Returns the rules left in the table.
+    """
+    rules = random_rules(rng, 2 * num_rules)
+    table = rules[:num_rules]
+    for rule in table:
+        switch.add_rule(rule)
+
+    for _ in range(num_steps):
+        x = rng.random()
+        if x < update_rate and len(table) > 0:
+            switch.remove_rule(table.pop(rng.randrange(len(table))))
+        elif x < 2 * update_rate:
+            rule = rng.choice(rules[num_rules:])
+            if rule not in table:
+                switch.add_rule(rule)
+                table.append(rule)
+        else:
+            packets = random_traffic(table[:20] or rules, rng, rng.randrange(1, 8) if batch else 1)
+            if batch:
+                actions = switch.packets_in(packets)
+            else:
+                actions = [switch.packet_in(packets[0], packets[0].in_port)]
+            for packet, action in zip(packets, actions):
+                assert action_key(action) == expected_action(table, packet)
+
+    return table
@@ -0,0 +1,94 @@
+import random
+from switches.cache_switch import CacheSwitch
+from switches.cache_switch_config import CacheSwitchConfig
+from switches.cache_algorithm import CacheAlgorithm
+from switches.refresh_scheduler import PacketCountScheduler, TimeIntervalScheduler, \
+    AdaptiveScheduler
+from random_rules import random_rules, random_traffic, check_forwarding
+
+
+def make_switch(scheduler, rng: random.Random):
+    switch = CacheSwitch("s1", CacheAlgorithm.DEPENDENT_SET, 8,
+                         config=CacheSwitchConfig(scheduler=scheduler))
+    rules = random_rules(rng, 40)
+    for rule in rules:
+        switch.add_rule(rule)
+    return switch, rules
+
+
+def test_packet_count_scheduler():
+    rng = random.Random(0)
+    switch, rules = make_switch(PacketCountScheduler(25), rng)
+    for packet in random_traffic(rules, rng, 100):
+        switch.packet_in(packet, packet.in_port)
+    assert switch.get_refresh_stats() == (4, 96)
+
+    # a batch crossing two multiples of the interval refreshes once
+    switch.packets_in(random_traffic(rules, rng, 60))
+    assert switch.get_refresh_stats() == (5, 96)
+
+
+def test_time_interval_scheduler():
+    now = [0.0]
+    scheduler = TimeIntervalScheduler(5, clock=lambda: now[0])
+    rng = random.Random(0)
+    switch, rules = make_switch(scheduler, rng)
+    packets = random_traffic(rules, rng, 10)
+
+    switch.packets_in(packets)
+    assert scheduler.get_stats() == (0, 1)
+    now[0] = 6
+    switch.packets_in(packets)
+    switch.packets_in(packets)
+    assert scheduler.get_stats() == (1, 2)
+
+
+def test_adaptive_scheduler_skips_steady_traffic():
+    rng = random.Random(0)
+    scheduler = AdaptiveScheduler(check_interval=20, max_interval=1000)
+    switch, rules = make_switch(scheduler, rng)
+    traffic = random_traffic(rules, rng, 100)
+    for _ in range(20):
+        switch.packets_in(traffic)
+
+    refreshes, skipped = switch.get_refresh_stats()
+    assert skipped > refreshes
+    assert refreshes >= 1
+
+
+def test_adaptive_scheduler_drift():
+    rng = random.Random(1)
+    scheduler = AdaptiveScheduler(check_interval=1000)
+    switch, rules = make_switch(scheduler, rng)
+    switch.packets_in(random_traffic(rules, rng, 200))
+    switch._update_cache()
+    last = switch.get_rule_weights()
+    switch.packets_in(random_traffic(rules[:10], rng, 50))
+
+    # the incremental drift matches the one computed over the whole table
+    current = switch.get_rule_weights()
+    last_total = sum(last.values())
+    current_total = sum(current.values())
+    expected = sum(abs(current[rule] / current_total - last[rule] / last_total)
+                   for rule in current) / 2
+    assert abs(scheduler._drift() - expected) < 1e-9
+    assert expected > 0
+
+
+def test_adaptive_scheduler_forwarding():
+    rng = random.Random(3)
+    scheduler = AdaptiveScheduler(check_interval=5, max_interval=50)
+    switch = CacheSwitch("s1", CacheAlgorithm.MIXED_SET, 8,
+                         config=CacheSwitchConfig(scheduler=scheduler))
+    check_forwarding(switch, rng, num_steps=400)
+
+
+def test_switches_sharing_a_config_get_their_own_scheduler():
+    config = CacheSwitchConfig(exact_dependencies=True)
+    first = CacheSwitch("s1", CacheAlgorithm.COVER_SET, 8, config=config)
+    second = CacheSwitch("s2", CacheAlgorithm.COVER_SET, 8, config=config)
+    assert type(first.scheduler) == PacketCountScheduler
+    assert first.scheduler.interval == 10
+    assert first.scheduler is not second.scheduler
+    assert first.popularity is not second.popularity
+    assert first.dependencies.exact and second.dependencies.exact
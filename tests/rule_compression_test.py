@@ -0,0 +1,125 @@
+import random
+from ipaddress import ip_network
+from sortedcontainers import SortedKeyList
+from rules.rule import Rule
+from rules.action import ForwardAction
+from rules.pattern import IPv4DstPattern
+from switches.cache_switch import CacheSwitch
+from switches.cache_switch_config import CacheSwitchConfig
+from switches.cache_algorithm import CacheAlgorithm
+from switches.refresh_scheduler import PacketCountScheduler
+from switches.rule_compression import RuleCompressor
+from random_rules import random_rules, random_traffic, full_table_lookup, action_key, \
+    expected_action, check_forwarding
+
+
+def dst_rule(network: str, port: int, priority: int) -> Rule:
+    return Rule([IPv4DstPattern(ip_network(network))], ForwardAction(port), priority)
+
+
+def check_compressed(compressor: RuleCompressor, rng: random.Random):
+    """Check the compressed table forwards like the original, and every rule
+    is accounted for."""
+    table = list(compressor.rules)
+    for packet in random_traffic(table, rng, 100):
+        compressed = full_table_lookup(compressor.compressed, packet)
+        assert action_key(None if compressed is None else compressed.action) == \
+            expected_action(table, packet)
+
+    for rule in table:
+        representative = compressor.representative[rule]
+        if rule in compressor.shadowed:
+            assert representative is None
+        else:
+            assert representative in compressor.compressed
+            assert rule in representative.members or rule in representative.absorbed
+    assert sum(len(c.members) + len(c.absorbed) for c in compressor.compressed) + \
+        len(compressor.shadowed) == len(table)
+
+
+def test_compressed_table_forwards_like_the_original():
+    for seed in range(5):
+        rng = random.Random(seed)
+        rules = random_rules(rng, 120, max_priority=6)
+        table = SortedKeyList(rules[:60], key=Rule.sort_key)
+        compressor = RuleCompressor(table)
+        check_compressed(compressor, rng)
+
+        for _ in range(40):
+            before = set(compressor.compressed)
+            if rng.random() < 0.5 and len(table) > 0:
+                rule = table[rng.randrange(len(table))]
+                table.remove(rule)
+                left, joined = compressor.remove_rule(rule)
+            else:
+                rule = rng.choice(rules[60:])
+                if rule in table:
+                    continue
+                table.add(rule)
+                left, joined = compressor.add_rule(rule)
+            assert compressor.compressed == (before - left) | joined
+            check_compressed(compressor, rng)
+
+
+def test_siblings_are_merged_and_redundant_rules_dropped():
+    table = SortedKeyList([], key=Rule.sort_key)
+    compressor = RuleCompressor(table)
+    rules = [
+        dst_rule("10.0.0.0/25", 1, 2),
+        dst_rule("10.0.0.128/25", 1, 2),
+        dst_rule("10.0.0.0/8", 3, 0),
+        # covered by the rule below it with the same action
+        dst_rule("10.1.0.0/16", 3, 1),
+        # covered by the higher rule
+        dst_rule("10.0.0.0/26", 2, 1),
+    ]
+    for rule in rules:
+        table.add(rule)
+        compressor.add_rule(rule)
+
+    assert compressor.get_stats() == {"rules": 5, "compressed": 2, "shadowed": 1,
+                                      "redundant": 1, "merged": 1, "ratio": 2.5}
+    merged = compressor.representative[rules[0]]
+    assert merged is compressor.representative[rules[1]]
+    assert merged.patterns[0].prefixlen == 24
+    assert compressor.representative[rules[3]] is compressor.representative[rules[2]]
+
+    rules[0].increment_counter(2)
+    rules[1].increment_counter(3)
+    merged.increment_counter()
+    assert merged.counter == 6
+
+    # a rule between the siblings splits them up again
+    between = dst_rule("10.0.0.64/26", 4, 2)
+    table.add(between)
+    compressor.add_rule(between)
+    assert compressor.representative[rules[0]] is not compressor.representative[rules[1]]
+    check_compressed(compressor, random.Random(0))
+
+
+def test_cache_switch_forwarding():
+    for algorithm in CacheAlgorithm:
+        if algorithm == CacheAlgorithm.OPTIMAL:
+            continue
+        for seed in range(3):
+            rng = random.Random(seed)
+            config = CacheSwitchConfig(compress_rules=True, background_refresh=seed == 2,
+                                       scheduler=PacketCountScheduler(rng.choice([1, 5, 20])))
+            switch = CacheSwitch("s1", algorithm, rng.choice([3, 8, 15]), config=config)
+            check_forwarding(switch, rng, num_steps=400, update_rate=0.03, batch=seed == 1)
+            switch.close()
+
+
+def test_compression_stats():
+    switch = CacheSwitch("s1", CacheAlgorithm.DEPENDENT_SET, 4)
+    for rule in random_rules(random.Random(0), 10):
+        switch.add_rule(rule)
+    assert switch.get_compression_stats() == {"rules": 10, "compressed": 10, "shadowed": 0,
+                                              "redundant": 0, "merged": 0, "ratio": 1.0}
+
+    switch = CacheSwitch("s1", CacheAlgorithm.DEPENDENT_SET, 4,
+                         config=CacheSwitchConfig(compress_rules=True))
+    switch.add_rule(dst_rule("10.0.0.0/25", 1, 1))
+    switch.add_rule(dst_rule("10.0.0.128/25", 1, 1))
+    stats = switch.get_compression_stats()
+    assert (stats["rules"], stats["compressed"], stats["merged"]) == (2, 1, 1)
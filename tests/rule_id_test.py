@@ -0,0 +1,95 @@
+import importlib.util
+import random
+import pytest
+from ipaddress import ip_network
+from rules.rule import Rule
+from rules.action import ForwardAction, SoftwareSwitchAction
+from rules.pattern import IPv4DstPattern
+from network.packet import Packet
+from switches.basic_switch import BasicSwitch
+from switches.cache_switch import CacheSwitch
+from switches.cache_algorithm import CacheAlgorithm
+from switches.lookup_engine import LookupEngine
+from random_rules import random_rules, check_forwarding
+
+ENGINES = [LookupEngine.LINEAR, LookupEngine.TRIE]
+if importlib.util.find_spec("numpy") is not None:
+    ENGINES.append(LookupEngine.VECTOR)
+
+
+def test_ids_increase_in_order_of_creation():
+    rules = random_rules(random.Random(0), 20)
+    ids = [rule.id for rule in rules]
+    assert ids == sorted(set(ids))
+    assert rules[0].sort_key() == (rules[0].priority, rules[0].id)
+    assert Rule([], ForwardAction(1), 0, 12345).id == 12345
+
+
+def test_new_ids_skip_past_explicit_ids():
+    explicit = Rule([], ForwardAction(1), 0, Rule([], ForwardAction(1), 0).id + 100)
+    assert Rule([], ForwardAction(1), 0).id == explicit.id + 1
+
+    # lower explicit ids leave the counter alone
+    assert Rule([], ForwardAction(1), 0, 0).id == 0
+    assert Rule([], ForwardAction(1), 0).id == explicit.id + 2
+
+
+def test_ties_are_broken_by_id_in_every_engine():
+    first = Rule([IPv4DstPattern(ip_network("10.0.0.0/8"))], ForwardAction(1), 5)
+    second = Rule([IPv4DstPattern(ip_network("10.0.0.0/16"))], ForwardAction(2), 5)
+    packet = Packet(1, "10.1.0.1", "10.0.0.1", 0, 0)
+    for engine in ENGINES:
+        for order in ([first, second], [second, first]):
+            switch = BasicSwitch(engine)
+            for rule in order:
+                switch.add_rule(rule)
+            assert switch.classifier.lookup(packet) is second
+
+
+def test_get_rule_and_duplicate_ids():
+    switch = CacheSwitch("s1", CacheAlgorithm.DEPENDENT_SET, 4)
+    rule = Rule([IPv4DstPattern(ip_network("10.0.0.0/8"))], ForwardAction(1), 1)
+    switch.add_rule(rule)
+    assert switch.get_rule(rule.id) is rule
+    assert switch.get_rule(rule.id + 1000) is None
+
+    duplicate = Rule([], ForwardAction(2), 3, rule.id)
+    with pytest.raises(ValueError):
+        switch.add_rule(duplicate)
+    assert switch.get_rule(rule.id) is rule
+    assert list(switch.all_rules) == [rule]
+
+    switch.remove_rule(rule)
+    assert switch.get_rule(rule.id) is None
+    switch.add_rule(duplicate)
+    assert switch.get_rule(rule.id) is duplicate
+    assert [c["id"] for c in switch.export_rule_counters()] == [rule.id]
+
+
+def test_cover_rules_keep_the_id():
+    rule = Rule([IPv4DstPattern(ip_network("10.0.0.0/8"))], ForwardAction(1), 3)
+    cover = rule.create_cover_rule()
+    assert cover.id == rule.id
+    assert cover.sort_key() == rule.sort_key()
+    assert isinstance(cover.action, SoftwareSwitchAction)
+
+
+def test_graph_slots_are_stable_and_reused():
+    rng = random.Random(1)
+    switch = CacheSwitch("s1", CacheAlgorithm.COVER_SET, 8)
+    table = check_forwarding(switch, rng, num_steps=200, update_rate=0.05)
+    graph = switch.dependencies
+
+    slots = dict(graph.slots)
+    removed = table[:10]
+    for rule in removed:
+        switch.remove_rule(rule)
+    for rule in table[10:]:
+        assert graph.slots[rule] == slots[rule]
+        assert graph.slot_rules[graph.slots[rule]] is rule
+
+    num_slots = len(graph.slot_rules)
+    for rule in random_rules(rng, 10):
+        switch.add_rule(rule)
+    assert len(graph.slot_rules) == num_slots
+    assert sorted(graph.slots.values()) == sorted(set(graph.slots.values()))
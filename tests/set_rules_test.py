@@ -0,0 +1,93 @@
+import random
+import pytest
+from rules.rule import Rule
+from rules.rule_io import read_rules, write_rules
+from switches.cache_switch import CacheSwitch
+from switches.cache_switch_config import CacheSwitchConfig
+from switches.cache_algorithm import CacheAlgorithm
+from switches.dependency_graph import bit_positions
+from random_rules import random_rules, random_traffic, action_key, expected_action, \
+    check_forwarding
+
+
+def closures(switch: CacheSwitch) -> dict:
+    graph = switch.dependencies
+    return {rule: {graph.slot_rules[slot] for slot in bit_positions(graph.closure[rule])}
+            for rule in graph.rules}
+
+
+def test_set_rules_matches_adding_each_rule():
+    for exact in (False, True):
+        rng = random.Random(0)
+        rules = random_rules(rng, 80)
+        incremental = CacheSwitch("s1", CacheAlgorithm.COVER_SET, 10,
+                                  config=CacheSwitchConfig(exact_dependencies=exact))
+        for rule in rules:
+            incremental.add_rule(rule)
+        bulk = CacheSwitch("s2", CacheAlgorithm.COVER_SET, 10,
+                           config=CacheSwitchConfig(exact_dependencies=exact))
+        assert bulk.last_load_time is None
+        load_time = bulk.set_rules(rules)
+
+        assert load_time == bulk.last_load_time and load_time >= 0
+        assert list(bulk.all_rules) == list(incremental.all_rules)
+        assert list(bulk.sw_switch.rules) == list(incremental.sw_switch.rules)
+        assert bulk.dependencies.direct == incremental.dependencies.direct
+        assert closures(bulk) == closures(incremental)
+        for packet in random_traffic(rules, rng, 200):
+            assert action_key(bulk.packet_in(packet, packet.in_port)) == \
+                expected_action(rules, packet)
+
+
+def test_set_rules_replaces_the_table():
+    for compress_rules in (False, True):
+        rng = random.Random(1)
+        switch = CacheSwitch("s1", CacheAlgorithm.MIXED_SET, 8,
+                             config=CacheSwitchConfig(compress_rules=compress_rules))
+        check_forwarding(switch, rng, num_steps=200)
+
+        rules = random_rules(rng, 50)
+        switch.set_rules(rules)
+        assert set(switch.all_rules) == set(rules)
+        assert all(switch.get_rule(rule.id) is rule for rule in rules)
+        cached, covered, size = switch.get_occupancy()
+        assert cached + covered <= size
+        assert set(switch.cached_rules) <= set(switch.cache_table)
+        for packet in random_traffic(rules, rng, 200):
+            assert action_key(switch.packet_in(packet, packet.in_port)) == \
+                expected_action(rules, packet)
+
+
+def test_duplicate_ids_are_rejected():
+    switch = CacheSwitch("s1", CacheAlgorithm.DEPENDENT_SET, 4)
+    rules = random_rules(random.Random(2), 5)
+    switch.set_rules(rules)
+    duplicate = Rule([], rules[0].action, 1, rules[1].id)
+    with pytest.raises(ValueError):
+        switch.set_rules(random_rules(random.Random(3), 3) + [rules[1], duplicate])
+    assert set(switch.all_rules) == set(rules)
+
+
+def test_rule_files_round_trip(tmp_path):
+    rng = random.Random(4)
+    rules = random_rules(rng, 40)
+    path = str(tmp_path / "rules.json")
+    write_rules(rules, path)
+
+    loaded = read_rules(path)
+    assert len(loaded) == len(rules)
+    for rule, copy in zip(sorted(rules, key=Rule.sort_key), loaded):
+        assert copy.id != rule.id
+        assert copy.priority == rule.priority
+        assert action_key(copy.action) == action_key(rule.action)
+        assert [(type(p), vars(p)) for p in copy.patterns] == \
+            [(type(p), vars(p)) for p in rule.patterns]
+
+    # rules of equal priority keep their order
+    assert [r.priority for r in sorted(loaded, key=Rule.sort_key)] == [r.priority for r in loaded]
+
+    switch = CacheSwitch("s1", CacheAlgorithm.DEPENDENT_SET, 8)
+    assert switch.load_rules(path) == switch.last_load_time
+    for packet in random_traffic(rules, rng, 200):
+        assert action_key(switch.packet_in(packet, packet.in_port)) == \
+            expected_action(rules, packet)
@@ -0,0 +1,39 @@
+import random
+from functools import partial
+from network.packet import Packet
+from network.sharded_network import ShardedNetwork
+from switches.cache_algorithm import CacheAlgorithm
+import general_test
+
+
+def make_trace(seed: int) -> list:
+    """Get a trace of packets from h1 to the other hosts, skewed towards
+    some of them, with a few from an unknown host."""
+    rng = random.Random(seed)
+    trace = []
+    for _ in range(400):
+        dst = rng.choices(range(2, 7), [10, 30, 4, 20, 6])[0]
+        src = "10.0.1.1" if rng.random() < 0.95 else "10.0.9.9"
+        trace.append((Packet(None, src, f"10.0.{dst}.{dst}", 1, 1), None, None))
+    return trace
+
+
+def test_sharded_network_matches_single_process():
+    for algorithm in (CacheAlgorithm.DEPENDENT_SET, CacheAlgorithm.MIXED_SET):
+        network = general_test.TestNetwork(algorithm)
+        report = network.replay_trace(make_trace(0))
+
+        for num_shards in (1, 3):
+            with ShardedNetwork(partial(general_test.TestNetwork, algorithm), num_shards,
+                                batch_size=64) as sharded:
+                assert sharded.replay_trace(make_trace(0)) == report
+                assert sharded.get_stats() == network.get_stats()
+
+
+def test_switches_are_assigned_to_shards():
+    with ShardedNetwork(partial(general_test.TestNetwork, CacheAlgorithm.DEPENDENT_SET), 2,
+                        owners={"s1": 0, "s2": 1, "s3": 1, "s4": 1, "s5": 1, "s6": 1}) as sharded:
+        sharded.replay_trace(make_trace(1))
+        report = sharded.get_cache_report()
+        assert set(report) == {"s1", "s2", "s3", "s4", "s5", "s6"}
+        assert report["s1"]["packets"] > 0
@@ -0,0 +1,141 @@
+import os
+import random
+import pytest
+from rules.rule import Rule
+from rules.action import ForwardAction
+from rules.pattern import InPortPattern
+from switches.cache_switch import CacheSwitch
+from switches.cache_switch_config import CacheSwitchConfig
+from switches.cache_algorithm import CacheAlgorithm
+from switches.dependency_graph import bit_positions
+from switches.popularity import DecayEstimator, CountMinSketchEstimator
+from switches.snapshot import HEADER, MAGIC, read_snapshot
+from random_rules import random_rules, random_traffic, action_key, expected_action, check_forwarding
+
+
+def rule_key(rule: Rule) -> tuple:
+    """Get a comparable form of a rule - snapshots do not keep the order of
+    its patterns."""
+    return rule.priority, rule.counter, action_key(rule.action), \
+        sorted((type(p).__name__, sorted(vars(p).items())) for p in rule.patterns)
+
+
+def positions(switch: CacheSwitch, rules) -> list:
+    table = list(switch.all_rules)
+    return sorted(table.index(rule) for rule in rules)
+
+
+def closures(switch: CacheSwitch) -> list:
+    graph = switch.dependencies
+    table = list(switch.all_rules)
+    return [sorted(table.index(graph.slot_rules[slot]) for slot in bit_positions(graph.closure[rule]))
+            for rule in table]
+
+
+def warm_switch(seed: int, **kwargs) -> tuple:
+    rng = random.Random(seed)
+    switch = CacheSwitch("s1", CacheAlgorithm.COVER_SET, 8, config=CacheSwitchConfig(**kwargs))
+    table = check_forwarding(switch, rng, num_steps=300, update_rate=0.03)
+    return switch, table, rng
+
+
+def test_snapshot_round_trip(tmp_path):
+    for exact in (False, True):
+        switch, table, rng = warm_switch(0, exact_dependencies=exact)
+        path = str(tmp_path / "switch.snapshot")
+        switch.save_snapshot(path)
+
+        snapshot = read_snapshot(path)
+        assert snapshot.exact == exact
+        assert [rule_key(r) for r in snapshot.rules] == [rule_key(r) for r in switch.all_rules]
+        assert snapshot.cached == positions(switch, switch.cached_rules)
+        assert snapshot.covered == positions(switch, switch.cover_rules)
+
+        restored = CacheSwitch("s2", CacheAlgorithm.COVER_SET, 8,
+                               config=CacheSwitchConfig(exact_dependencies=exact))
+        assert restored.load_snapshot(path) == restored.last_load_time
+        assert [rule_key(r) for r in restored.all_rules] == [rule_key(r) for r in switch.all_rules]
+        assert positions(restored, restored.cached_rules) == positions(switch, switch.cached_rules)
+        assert positions(restored, restored.cover_rules) == positions(switch, switch.cover_rules)
+        assert closures(restored) == closures(switch)
+        assert all(restored.get_rule(rule.id) is rule for rule in restored.all_rules)
+
+        # the cache is warm from the first packet
+        rules = list(restored.all_rules)
+        for packet in random_traffic(rules, rng, 200):
+            assert action_key(restored.packet_in(packet, packet.in_port)) == \
+                expected_action(rules, packet)
+
+        # and the restored graph is updated as the table changes
+        for rule in rules[::2]:
+            restored.remove_rule(rule)
+        for rule in random_rules(rng, 20):
+            restored.add_rule(rule)
+        rules = list(restored.all_rules)
+        for packet in random_traffic(rules, rng, 200):
+            assert action_key(restored.packet_in(packet, packet.in_port)) == \
+                expected_action(rules, packet)
+
+
+def test_snapshot_loads_into_other_switches(tmp_path):
+    switch, table, rng = warm_switch(1)
+    path = str(tmp_path / "switch.snapshot")
+    switch.save_snapshot(path)
+
+    for kwargs in ({"compress_rules": True}, {"exact_dependencies": True}):
+        restored = CacheSwitch("s2", CacheAlgorithm.DEPENDENT_SET, 6,
+                               config=CacheSwitchConfig(**kwargs))
+        restored.load_snapshot(path)
+        rules = list(restored.all_rules)
+        assert [rule_key(r) for r in rules] == [rule_key(r) for r in switch.all_rules]
+        for packet in random_traffic(rules, rng, 200):
+            assert action_key(restored.packet_in(packet, packet.in_port)) == \
+                expected_action(rules, packet)
+
+    compressed, _, _ = warm_switch(2, compress_rules=True)
+    compressed.save_snapshot(path)
+    assert read_snapshot(path).direct is None
+    restored = CacheSwitch("s2", CacheAlgorithm.COVER_SET, 8)
+    restored.load_snapshot(path)
+    assert [rule_key(r) for r in restored.all_rules] == \
+        [rule_key(r) for r in compressed.all_rules]
+
+
+def test_loading_resets_the_popularity_estimator(tmp_path):
+    path = str(tmp_path / "switch.snapshot")
+    for popularity in (DecayEstimator(), CountMinSketchEstimator(width=64)):
+        switch, _, _ = warm_switch(4, popularity=popularity)
+        switch.save_snapshot(path)
+
+        switch.load_snapshot(path)
+        rules = list(switch.all_rules)
+        if isinstance(popularity, DecayEstimator):
+            # the weights fall back to the saved counters
+            assert switch.popularity.get_weights(rules) == [rule.counter for rule in rules]
+        else:
+            assert all(cell == 0 for row in switch.popularity.cells for cell in row)
+
+
+def test_unsaveable_rules_leave_the_file_alone(tmp_path):
+    switch, _, _ = warm_switch(3)
+    path = str(tmp_path / "switch.snapshot")
+    switch.save_snapshot(path)
+    with open(path, "rb") as f:
+        saved = f.read()
+
+    switch.add_rule(Rule([InPortPattern(1), InPortPattern(1)], ForwardAction(1), 5))
+    with pytest.raises(ValueError):
+        switch.save_snapshot(path)
+    with open(path, "rb") as f:
+        assert f.read() == saved
+    assert os.listdir(tmp_path) == ["switch.snapshot"]
+
+
+def test_bad_files_are_rejected(tmp_path):
+    path = str(tmp_path / "bad.snapshot")
+    for data in (b"", b"not a snapshot at all, just some bytes",
+                 HEADER.pack(MAGIC, 99, 0, 0, 0, 0, 0, 0)):
+        with open(path, "wb") as f:
+            f.write(data)
+        with pytest.raises(ValueError):
+            read_snapshot(path)
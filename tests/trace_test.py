@@ -0,0 +1,82 @@
+import struct
+from ipaddress import IPv4Address
+from network.trace import read_csv_trace, read_pcap_trace
+from switches.cache_algorithm import CacheAlgorithm
+import general_test
+
+
+def ipv4_tcp(src: str, dst: str, sport: int, dport: int) -> bytes:
+    ip = struct.pack("!BBHHHBBH4s4s", 0x45, 0, 40, 0, 0, 64, 6, 0,
+                     IPv4Address(src).packed, IPv4Address(dst).packed)
+    return ip + struct.pack("!HH", sport, dport) + bytes(16)
+
+
+def ethernet(ethertype: int, payload: bytes) -> bytes:
+    return bytes(12) + struct.pack("!H", ethertype) + payload
+
+
+def write_pcap(path, frames: list, linktype: int, endian: str = "<"):
+    with open(path, "wb") as f:
+        f.write(struct.pack(endian + "IHHiIII", 0xa1b2c3d4, 2, 4, 0, 0, 65535, linktype))
+        for frame in frames:
+            f.write(struct.pack(endian + "IIII", 0, 0, len(frame), len(frame)))
+            f.write(frame)
+
+
+def test_csv_trace(tmp_path):
+    path = tmp_path / "trace.csv"
+    path.write_text("src,dst,sport,dport,switch,port\n"
+                    "10.0.1.1,10.0.2.2,1,2,,\n"
+                    "167772417,10.0.3.3,,,s1,1\n")
+
+    rows = list(read_csv_trace(str(path)))
+    assert len(rows) == 2
+    packet, switch_name, switch_port = rows[0]
+    assert packet.ipv4_src == int(IPv4Address("10.0.1.1"))
+    assert (packet.tcp_sport, packet.tcp_dport) == (1, 2)
+    assert (switch_name, switch_port) == (None, None)
+
+    packet, switch_name, switch_port = rows[1]
+    assert packet.ipv4_src == int(IPv4Address("10.0.1.1"))
+    assert packet.tcp_sport is None
+    assert (switch_name, switch_port) == ("s1", 1)
+
+
+def test_pcap_trace(tmp_path):
+    frames = [
+        ethernet(0x0800, ipv4_tcp("10.0.1.1", "10.0.2.2", 1000, 80)),
+        ethernet(0x8100, struct.pack("!HH", 5, 0x0800) + ipv4_tcp("10.0.1.1", "10.0.3.3", 1001, 443)),
+        ethernet(0x0806, bytes(28)),
+    ]
+    path = tmp_path / "trace.pcap"
+    write_pcap(str(path), frames, 1)
+    packets = [packet for packet, _, _ in read_pcap_trace(str(path))]
+    assert [(packet.ipv4_dst, packet.tcp_sport, packet.tcp_dport) for packet in packets] == [
+        (int(IPv4Address("10.0.2.2")), 1000, 80),
+        (int(IPv4Address("10.0.3.3")), 1001, 443),
+    ]
+
+    write_pcap(str(path), [ipv4_tcp("10.0.1.1", "10.0.4.4", 7, 8)], 101, ">")
+    packets = [packet for packet, _, _ in read_pcap_trace(str(path))]
+    assert [(packet.ipv4_dst, packet.tcp_dport) for packet in packets] == \
+        [(int(IPv4Address("10.0.4.4")), 8)]
+
+
+def test_replay_matches_sending_packets(tmp_path):
+    path = tmp_path / "trace.csv"
+    rows = ["src,dst,sport,dport"]
+    for i in range(50):
+        rows.append(f"10.0.1.1,10.0.{2 + i % 5}.{2 + i % 5},1,1")
+    rows.append("10.9.9.9,10.0.2.2,1,1")
+    path.write_text("\n".join(rows) + "\n")
+
+    replayed = general_test.TestNetwork(CacheAlgorithm.DEPENDENT_SET)
+    report = replayed.replay_trace(read_csv_trace(str(path)))
+
+    sent = general_test.TestNetwork(CacheAlgorithm.DEPENDENT_SET)
+    for i in range(50):
+        sent.send_packet("h1", 1, f"h{2 + i % 5}", 1)
+
+    packets_in, arrived, dropped = replayed.get_stats()
+    assert (packets_in, arrived, dropped) == (51, sent.get_stats()[1], sent.get_stats()[2] + 1)
+    assert report == sent.get_cache_report()
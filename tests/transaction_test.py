@@ -0,0 +1,138 @@
+import random
+import threading
+import pytest
+from switches.cache_switch import CacheSwitch
+from switches.cache_switch_config import CacheSwitchConfig
+from switches.cache_algorithm import CacheAlgorithm
+from random_rules import random_rules, random_traffic, action_key, expected_action
+
+
+def count_refreshes(switch: CacheSwitch) -> list:
+    """Count the times the switch recomputes its cache."""
+    refreshes = [0]
+    update_cache = switch._update_cache
+
+    def counted():
+        refreshes[0] += 1
+        update_cache()
+
+    switch._update_cache = counted
+    return refreshes
+
+
+def check_table(switch: CacheSwitch, table: list, rng: random.Random):
+    assert set(switch.all_rules) == set(table)
+    for packet in random_traffic(table, rng, 100):
+        assert action_key(switch.packet_in(packet, packet.in_port)) == \
+            expected_action(table, packet)
+
+
+def test_commit_applies_every_update_with_one_refresh():
+    for compress_rules in (False, True):
+        rng = random.Random(0)
+        rules = random_rules(rng, 100)
+        switch = CacheSwitch("s1", CacheAlgorithm.COVER_SET, 8,
+                             config=CacheSwitchConfig(compress_rules=compress_rules))
+        table = rules[:60]
+        switch.set_rules(table)
+        refreshes = count_refreshes(switch)
+
+        for _ in range(10):
+            transaction = switch.transaction()
+            removed = rng.sample(table, 3)
+            added = [rule for rule in rng.sample(rules[60:], 3) if rule not in table]
+            for rule in removed:
+                transaction.remove_rule(rule)
+            for rule in added:
+                transaction.add_rule(rule)
+            assert set(switch.all_rules) == set(table)
+
+            before = refreshes[0]
+            transaction.commit()
+            assert refreshes[0] == before + 1
+            table = [rule for rule in table if rule not in removed] + added
+            check_table(switch, table, rng)
+
+        # a large batch rebuilds the table instead
+        with switch.transaction() as transaction:
+            for rule in table[:40]:
+                transaction.remove_rule(rule)
+        check_table(switch, table[40:], rng)
+
+
+def test_context_manager():
+    rng = random.Random(1)
+    rules = random_rules(rng, 30)
+    switch = CacheSwitch("s1", CacheAlgorithm.DEPENDENT_SET, 4)
+    switch.set_rules(rules[:20])
+
+    with switch.transaction() as transaction:
+        transaction.add_rule(rules[20])
+        transaction.remove_rule(rules[0])
+    check_table(switch, rules[1:21], rng)
+
+    with pytest.raises(RuntimeError):
+        with switch.transaction() as transaction:
+            transaction.add_rule(rules[21])
+            transaction.remove_rule(rules[1])
+            raise RuntimeError()
+    check_table(switch, rules[1:21], rng)
+    assert len(transaction.added) == 0 and len(transaction.removed) == 0
+
+
+def test_updates_cancel_out():
+    rng = random.Random(2)
+    rules = random_rules(rng, 12)
+    switch = CacheSwitch("s1", CacheAlgorithm.DEPENDENT_SET, 4)
+    switch.set_rules(rules[:10])
+
+    transaction = switch.transaction()
+    transaction.add_rule(rules[10])
+    transaction.remove_rule(rules[10])
+    transaction.remove_rule(rules[0])
+    transaction.add_rule(rules[0])
+    transaction.add_rule(rules[11])
+    assert list(transaction.added) == [rules[11]] and len(transaction.removed) == 0
+    transaction.commit()
+    check_table(switch, rules[:10] + [rules[11]], rng)
+
+
+def test_rejected_commits_change_nothing():
+    rng = random.Random(3)
+    rules = random_rules(rng, 12)
+    switch = CacheSwitch("s1", CacheAlgorithm.DEPENDENT_SET, 4)
+    switch.set_rules(rules[:10])
+
+    transaction = switch.transaction()
+    transaction.add_rule(rules[10])
+    transaction.remove_rule(rules[11])
+    with pytest.raises(ValueError):
+        transaction.commit()
+    assert list(transaction.added) == [rules[10]]
+    check_table(switch, rules[:10], rng)
+
+    with pytest.raises(ValueError):
+        switch.commit_rules([rules[0]], [])
+    check_table(switch, rules[:10], rng)
+
+
+def test_selection_gap_during_commits():
+    rng = random.Random(4)
+    rules = random_rules(rng, 40)
+    switch = CacheSwitch("s1", CacheAlgorithm.DEPENDENT_SET, 5)
+    switch.set_rules(rules[:20])
+    switch.packets_in(random_traffic(rules[:20], rng, 200))
+
+    def update():
+        for rule in rules[20:]:
+            with switch.transaction() as transaction:
+                transaction.add_rule(rule)
+
+    thread = threading.Thread(target=update)
+    thread.start()
+    while thread.is_alive():
+        report = switch.get_selection_gap()
+        for algorithm in CacheAlgorithm:
+            assert 0 <= report["algorithms"][algorithm.value]["hit_rate"] <= 1
+    thread.join()
+    check_table(switch, rules, rng)
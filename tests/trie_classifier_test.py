@@ -0,0 +1,46 @@
+import random
+from ipaddress import ip_network
+from rules.rule import Rule
+from rules.action import ForwardAction
+from rules.pattern import IPv4DstPattern
+from switches.basic_switch import BasicSwitch
+from switches.lookup_engine import LookupEngine
+from random_rules import random_rules, random_traffic, packet_for, full_table_lookup
+
+
+def assert_lookups_match(switch: BasicSwitch, table: list, packets: list):
+    for packet in packets:
+        assert switch.classifier.lookup(packet) is full_table_lookup(table, packet)
+
+
+def test_trie_matches_linear_scan():
+    for seed in range(5):
+        rng = random.Random(seed)
+        rules = random_rules(rng, 150)
+        switch = BasicSwitch(LookupEngine.TRIE)
+        table = rules[:100]
+        for rule in table:
+            switch.add_rule(rule)
+        assert_lookups_match(switch, table, random_traffic(table, rng, 300))
+
+        for rule in rng.sample(table, 40):
+            switch.remove_rule(rule)
+            table.remove(rule)
+        for rule in rules[100:]:
+            switch.add_rule(rule)
+            table.append(rule)
+        assert_lookups_match(switch, table, random_traffic(table, rng, 300))
+
+
+def test_longest_prefix_does_not_override_priority():
+    switch = BasicSwitch(LookupEngine.TRIE)
+    broad = Rule([IPv4DstPattern(ip_network("10.0.0.0/8"))], ForwardAction(1), 10)
+    narrow = Rule([IPv4DstPattern(ip_network("10.0.1.0/24"))], ForwardAction(2), 5)
+    switch.add_rule(broad)
+    switch.add_rule(narrow)
+
+    packet = packet_for(narrow, random.Random(0))
+    assert switch.classifier.lookup(packet) is broad
+
+    switch.set_rules({narrow})
+    assert switch.classifier.lookup(packet) is narrow
@@ -0,0 +1,72 @@
+import random
+import pytest
+from ipaddress import ip_network
+from rules.rule import Rule
+from rules.action import ForwardAction
+from rules.pattern import IPv4DstPattern, InPortPattern
+from network.packet import Packet
+from switches.basic_switch import BasicSwitch
+from switches.lookup_engine import LookupEngine
+from random_rules import random_rules, random_traffic, full_table_lookup
+
+np = pytest.importorskip("numpy")
+
+
+def test_vector_matches_linear_scan():
+    for seed in range(5):
+        rng = random.Random(seed)
+        rules = random_rules(rng, 150)
+        switch = BasicSwitch(LookupEngine.VECTOR)
+        table = rules[:100]
+        for rule in table:
+            switch.add_rule(rule)
+
+        packets = random_traffic(table, rng, 300)
+        for packet, rule in zip(packets, switch.classifier.lookup_batch(packets)):
+            assert rule is full_table_lookup(table, packet)
+
+        for rule in rng.sample(table, 40):
+            switch.remove_rule(rule)
+            table.remove(rule)
+        for rule in rules[100:]:
+            switch.add_rule(rule)
+            table.append(rule)
+
+        packets = random_traffic(table, rng, 300)
+        for packet, rule in zip(packets, switch.classifier.lookup_batch(packets)):
+            assert rule is full_table_lookup(table, packet)
+
+
+def test_single_lookups_do_not_recompile():
+    rng = random.Random(7)
+    rules = random_rules(rng, 60)
+    switch = BasicSwitch(LookupEngine.VECTOR)
+    table = []
+    for rule in rules:
+        switch.add_rule(rule)
+        table.append(rule)
+        for packet in random_traffic(table, rng, 3):
+            assert switch.classifier.lookup(packet) is full_table_lookup(table, packet)
+        assert switch.classifier.compiled_rules is None
+
+    packets = random_traffic(table, rng, 50)
+    switch.classifier.lookup_batch(packets)
+    assert switch.classifier.compiled_rules is not None
+
+
+def test_missing_fields_only_match_wildcards():
+    switch = BasicSwitch(LookupEngine.VECTOR)
+    all_ones = Rule([IPv4DstPattern(ip_network("255.255.255.0/24"))], ForwardAction(1), 5)
+    port = Rule([InPortPattern(1)], ForwardAction(2), 3)
+    default = Rule([], ForwardAction(3), 0)
+    for rule in (all_ones, port, default):
+        switch.add_rule(rule)
+
+    packet = Packet(1, "10.0.0.1", "10.0.0.2", 0, 0)
+    packet.ipv4_dst = None
+    assert switch.classifier.lookup(packet) is port
+    assert switch.classifier.lookup_batch([packet]) == [port]
+    assert switch.classifier.lookup(packet) is port
+
+    packet.in_port = None
+    assert switch.classifier.lookup(packet) is default